@@ -1,31 +1,257 @@
 # admin_ui.py
 import streamlit as st
-import pandas as pd
-from database import get_all_users, get_all_appointments
+import io
+from datetime import date, timedelta
+from database import (
+    APPOINTMENT_STATUSES,
+    ARCHIVE_AFTER_DAYS,
+    archive_appointments,
+    archive_stats,
+    auto_schedule,
+    get_users_page,
+    group_commit_stats,
+    get_appointment_details_page,
+    get_stats_by_day,
+    get_stats_by_doctor,
+    import_appointments_csv,
+    invalidate_user_cache,
+    pending_appointment_ids,
+    user_cache_stats,
+)
+from export import EXPORT_FORMATS, export_appointments_file, parquet_available
+import query_stats
+
+def keyset_pager(key, fetch, page_size, **filters):
+    """
+    Render Previous/Next controls for a keyset-paginated query and return the
+    current page's rows. The cursor of every visited page is kept in session
+    state; changing a filter or the page size starts again from page 1.
+    """
+    cursors_key, filters_key = f"{key}_cursors", f"{key}_filters"
+    if st.session_state.get(filters_key) != (page_size, filters):
+        st.session_state[filters_key] = (page_size, filters)
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+    rows, next_after = fetch(cursors[-1], page_size, **filters)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    if col_prev.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    col_page.write(f"Page {len(cursors)}")
+    if col_next.button("Next ▶", key=f"{key}_next", disabled=next_after is None):
+        cursors.append(next_after)
+        st.rerun()
+    return rows
 
 def admin_dashboard(user):
+    import pandas as pd  # heavy; loaded on the first render, not at import
+
     st.title("🧑‍💼 Admin Dashboard")
     st.sidebar.header(f"Admin: {user['name']}")
 
-    tabs = st.tabs(["👥 Users", "📅 Appointments"])
+    tabs = st.tabs(["👥 Users", "📅 Appointments", "📊 Analytics", "📥 Import", "⚙️ Diagnostics"])
 
     with tabs[0]:
         st.subheader("All Registered Users")
-        users = get_all_users()
+        col_role, col_search, col_size = st.columns([1, 2, 1])
+        role = col_role.selectbox("Role", ["all", "doctor", "patient", "admin"], key="users_role")
+        search = col_search.text_input("Search name or email", key="users_search")
+        page_size = col_size.selectbox("Rows per page", [25, 50, 100], index=1, key="users_page_size")
+        users = keyset_pager("users", get_users_page, page_size,
+                             role=None if role == "all" else role, search=search or None)
         if not users:
             st.info("No users found.")
         else:
-            df = pd.DataFrame([tuple(u) for u in users],
-                              columns=["id", "name", "email", "password", "role", "specialization", "experience", "contact", "photo_path"])
+            df = pd.DataFrame(users)
             st.dataframe(df[["id", "name", "email", "role", "specialization", "experience", "contact"]])
 
     with tabs[1]:
         st.subheader("All Appointments")
-        appts = get_all_appointments()
+        col_range, col_status, col_size = st.columns([2, 2, 1])
+        appt_range = col_range.date_input("Date range (leave empty for all)", value=(), key="appts_range")
+        appt_status = col_status.multiselect("Status", list(APPOINTMENT_STATUSES), key="appts_status")
+        page_size = col_size.selectbox("Rows per page", [25, 50, 100], index=1, key="appts_page_size")
+        appts = keyset_pager(
+            "appts", get_appointment_details_page, page_size,
+            start_date=appt_range[0].isoformat() if len(appt_range) > 0 else None,
+            end_date=appt_range[-1].isoformat() if len(appt_range) > 0 else None,
+            statuses=tuple(appt_status),
+        )
         if not appts:
             st.info("No appointments yet.")
         else:
-            df = pd.DataFrame([tuple(a) for a in appts],
-                              columns=["id", "doctor_id", "patient_id", "date", "time", "duration", "status", "notes"])
+            df = pd.DataFrame(appts)
             df["status_icon"] = df["status"].apply(lambda s: "🟢 Confirmed" if s=="confirmed" else "🟡 Pending" if s=="pending" else "🔴 Cancelled")
-            st.dataframe(df[["date", "time", "duration", "doctor_id", "patient_id", "status_icon", "notes"]])
+            st.dataframe(df[["date", "time", "duration", "doctor_name", "doctor_specialization", "patient_name",
+                             "status_icon", "notes"]])
+
+        st.markdown("#### 📤 Export")
+        with st.form("admin_export_form"):
+            exp_range = st.date_input("Date range (leave empty for all)", value=(), key="admin_exp_range")
+            exp_status = st.multiselect("Status", list(APPOINTMENT_STATUSES), default=list(APPOINTMENT_STATUSES))
+            exp_fmt = st.selectbox("Format", EXPORT_FORMATS if parquet_available() else ("csv",))
+            exp_archive = st.checkbox("Include archived appointments")
+            prepared = st.form_submit_button("📦 Prepare export")
+        if prepared:
+            with export_appointments_file(
+                exp_fmt,
+                start_date=exp_range[0].isoformat() if len(exp_range) > 0 else None,
+                end_date=exp_range[-1].isoformat() if len(exp_range) > 0 else None,
+                statuses=exp_status,
+                include_archive=exp_archive,
+            ) as export_file:
+                st.download_button(
+                    f"⬇️ Download {exp_fmt.upper()}",
+                    data=export_file,
+                    file_name=f"appointments_all.{exp_fmt}",
+                    mime="text/csv" if exp_fmt == "csv" else "application/octet-stream",
+                )
+
+        st.markdown("#### 🗓️ Auto-schedule pending")
+        st.caption("Confirms pending appointments in place where possible, otherwise moves them to the "
+                   "nearest free slot that day with a doctor of the same specialization.")
+        with st.form("auto_schedule_form"):
+            sched_range = st.date_input("Date range", value=(date.today(), date.today() + timedelta(days=7)),
+                                        key="sched_range")
+            keep_doctor = st.checkbox("Keep each appointment with its doctor", value=True)
+            run_schedule = st.form_submit_button("🗓️ Schedule")
+        if run_schedule and len(sched_range) == 2:
+            ids = pending_appointment_ids(sched_range[0].isoformat(), sched_range[1].isoformat())
+            result = auto_schedule(pending_ids=ids, same_doctor=keep_doctor)
+            moved = sum(1 for p in result.placed if p["moved"])
+            st.success(f"Confirmed {len(result.placed)} of {len(ids)} pending appointments ({moved} moved).")
+            if result.unplaced:
+                st.warning(f"{len(result.unplaced)} could not be placed and are still pending.")
+                st.dataframe(pd.DataFrame(result.unplaced, columns=["appointment_id", "reason"]))
+
+    with tabs[2]:
+        st.subheader("Clinic Analytics")
+        col_range, col_capacity = st.columns([3, 1])
+        today = date.today()
+        stats_range = col_range.date_input("Date range", value=(today - timedelta(days=29), today), key="stats_range")
+        capacity = col_capacity.number_input("Bookable minutes per doctor-day", min_value=30, max_value=1440,
+                                             value=480, step=30)
+        if len(stats_range) == 2:
+            start, end = stats_range[0].isoformat(), stats_range[1].isoformat()
+            days = pd.DataFrame(get_stats_by_day(start, end))
+            if days.empty:
+                st.info("No appointments in this range.")
+            else:
+                total_booked = int(days["confirmed"].sum() + days["pending"].sum())
+                total_cancelled = int(days["cancelled"].sum())
+                col_appts, col_hours, col_cancel = st.columns(3)
+                col_appts.metric("Active appointments", total_booked)
+                col_hours.metric("Booked hours", f"{days['booked_minutes'].sum() / 60:.1f}")
+                col_cancel.metric("Cancellation rate", f"{total_cancelled / max(total_booked + total_cancelled, 1):.1%}")
+
+                days = days.set_index("date")
+                days["utilization"] = days["booked_minutes"] / (days["doctors"] * capacity)
+                st.markdown("#### Utilization per day")
+                st.caption("Booked minutes over the bookable minutes of the doctors with appointments that day.")
+                st.line_chart(days[["utilization"]])
+                st.markdown("#### Appointments per day by status")
+                st.bar_chart(days[["confirmed", "pending", "cancelled"]])
+
+                doctors = pd.DataFrame(get_stats_by_doctor(start, end))
+                doctors["doctor"] = doctors["name"].fillna(doctors["doctor_id"].astype(str))
+                doctors = doctors.set_index("doctor")
+                n_days = (stats_range[1] - stats_range[0]).days + 1
+                doctors["utilization"] = doctors["booked_minutes"] / (n_days * capacity)
+                doctors["cancellation_rate"] = doctors["cancelled"] / (
+                    doctors["pending"] + doctors["confirmed"] + doctors["cancelled"]).clip(lower=1)
+                st.markdown("#### Utilization per doctor")
+                st.bar_chart(doctors[["utilization"]])
+                st.markdown("#### Cancellation rate per doctor")
+                st.bar_chart(doctors[["cancellation_rate"]])
+                st.dataframe(doctors[["specialization", "booked_minutes", "confirmed", "pending", "cancelled",
+                                      "active_days", "utilization", "cancellation_rate"]])
+
+    with tabs[3]:
+        st.subheader("Bulk Import Appointments")
+        st.caption("CSV with header: doctor_id, patient_id, date, time, duration[, status, notes, id]")
+        upload = st.file_uploader("Appointments CSV", type=["csv"])
+        respect_hours = st.checkbox("Reject rows outside doctors' schedules", value=False)
+        if upload and st.button("📥 Import"):
+            report = import_appointments_csv(io.TextIOWrapper(upload, encoding="utf-8", newline=""), respect_hours)
+            st.success(f"Imported {report.accepted} of {report.total} rows.")
+            if report.rejected:
+                st.warning(f"{len(report.rejected)} rows rejected.")
+                st.dataframe(pd.DataFrame(report.rejected, columns=["row", "reason"]))
+
+    with tabs[4]:
+        st.subheader("User Read Cache")
+        stats = user_cache_stats()
+        col_hits, col_misses, col_ratio, col_entries = st.columns(4)
+        col_hits.metric("Hits", stats["hits"])
+        col_misses.metric("Misses", stats["misses"])
+        col_ratio.metric("Hit ratio", f"{stats['hit_ratio']:.1%}")
+        col_entries.metric("Entries", stats["entries"])
+        st.caption(f"Generation {stats['generation']} · {stats['invalidations']} invalidations")
+        if st.button("🧹 Clear cache"):
+            invalidate_user_cache()
+            st.rerun()
+
+        st.markdown("---")
+        st.subheader("Group Commit")
+        group = group_commit_stats()
+        if group is None:
+            st.caption("Off: every write commits on its own. Set PORTAL_GROUP_COMMIT=1 to enable.")
+        else:
+            col_groups, col_writes, col_avg, col_largest = st.columns(4)
+            col_groups.metric("Commits", group["groups"])
+            col_writes.metric("Writes", group["writes"])
+            col_avg.metric("Writes per commit", f"{group['writes'] / group['groups']:.1f}" if group["groups"] else "—")
+            col_largest.metric("Largest group", group["largest_group"])
+            st.caption(f"{group['failed_writes']} failed writes · max {group['max_ops']} writes per group")
+
+        st.markdown("---")
+        st.subheader("Appointment Archive")
+        archive = archive_stats()
+        col_hot, col_archived, col_span = st.columns(3)
+        col_hot.metric("Hot rows", archive["hot"])
+        col_archived.metric("Archived rows", archive["archived"])
+        col_span.metric("Archived dates", f"{archive['archived_from']} → {archive['archived_to']}"
+                        if archive["archived"] else "—")
+        col_days, col_run = st.columns([2, 1])
+        archive_days = col_days.number_input("Archive confirmed/cancelled appointments older than (days)",
+                                             min_value=1, value=ARCHIVE_AFTER_DAYS, step=30)
+        if col_run.button("🗄️ Archive now"):
+            cutoff = (date.today() - timedelta(days=int(archive_days))).isoformat()
+            moved = archive_appointments(cutoff)
+            st.success(f"Archived {moved} appointments dated before {cutoff}.")
+
+        st.markdown("---")
+        st.subheader("Query Timings")
+        col_on, col_slow, col_reset = st.columns([1, 1, 1])
+        enabled = col_on.toggle("Record timings", value=query_stats.ENABLED)
+        if enabled != query_stats.ENABLED:
+            query_stats.set_enabled(enabled)
+        slow_ms = col_slow.number_input("Slow query threshold (ms)", min_value=1.0,
+                                        value=float(query_stats.SLOW_QUERY_MS), step=10.0)
+        if slow_ms != query_stats.SLOW_QUERY_MS:
+            query_stats.set_slow_threshold(slow_ms)
+        if col_reset.button("🧹 Reset timings"):
+            query_stats.reset()
+            st.rerun()
+
+        snap = query_stats.snapshot()
+        timing_columns = ["name", "calls", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_ms", "rows"]
+        for title, key in (("Per function", "functions"), ("Per statement", "statements"), ("Lock waits", "lock_waits")):
+            st.markdown(f"#### {title}")
+            if not snap[key]:
+                st.caption("Nothing recorded yet.")
+                continue
+            df = pd.DataFrame(snap[key])
+            st.dataframe(df[timing_columns], use_container_width=True)
+            pick = st.selectbox("Latency histogram for", df["name"], key=f"hist_{key}")
+            st.bar_chart(pd.Series(df.set_index("name").loc[pick, "buckets"], name="calls"))
+
+        st.markdown(f"#### Slow queries (≥ {snap['slow_query_ms']:g} ms)")
+        if not snap["slow_queries"]:
+            st.caption("None so far.")
+        for entry in snap["slow_queries"]:
+            with st.expander(f"{entry['at']} · {entry['ms']:.1f} ms · {entry['function'] or '—'} · {entry['rows']} rows"):
+                st.code(entry["sql"], language="sql")
+                if entry["plan"]:
+                    st.code("\n".join(entry["plan"]), language="text")
@@ -0,0 +1,392 @@
+# api.py
+import argparse
+import asyncio
+import json
+import os
+import secrets
+import shutil
+import signal
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import date
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import database
+from auth import login_user
+
+# Headless HTTP/JSON booking service on asyncio, next to the Streamlit UI.
+# Handlers run the blocking database.py/auth.py calls on a bounded thread pool.
+# Identical concurrent reads share one database call, bookings arriving within
+# BOOKING_BATCH_WINDOW are committed together by database.book_appointments(),
+# and requests beyond MAX_PENDING are refused with 503 rather than queued.
+# With --group-commit the remaining writes (cancellations) from all workers
+# share commits through database.start_group_commit().
+#
+#   GET  /health
+#   POST /login                        {"email", "password"} -> {"token", "user"}
+#   GET  /doctors?q=&limit=            (limit is clamped to 1..MAX_DOCTORS_LIMIT)
+#   GET  /slots?doctor_id=&date=&duration=
+#   GET  /appointments?start=&end=&history=1  (token; the caller's own appointments,
+#                                       history=1 includes archived ones)
+#   POST /appointments                 (patient token) {"doctor_id", "date", "time", "duration", "notes"}
+#   POST /appointments/<id>/cancel     (token of the appointment's patient or doctor)
+
+WORKERS = min(8, (os.cpu_count() or 1) + 4)
+MAX_PENDING = 256  # requests in flight before new ones get 503
+BOOKING_BATCH_MAX = 64
+BOOKING_BATCH_WINDOW = 0.002  # seconds to wait for more bookings after the first
+SESSION_TTL_SECONDS = 8 * 3600
+MAX_BODY_BYTES = 64 * 1024
+MAX_DOCTORS_LIMIT = 100  # largest /doctors page
+DURATIONS = (15, 20, 30, 45, 60)
+
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+            404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Optional[dict] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _plain(obj):
+    # Row records are tuples, which json would write as arrays; turn them into objects.
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if isinstance(obj, list):
+        return [_plain(item) for item in obj]
+    if isinstance(obj, dict):
+        return {key: _plain(value) for key, value in obj.items()}
+    return obj
+
+
+class BookingService:
+    """Routes, sessions, read coalescing and booking batches over one thread pool."""
+
+    def __init__(self, workers: int = WORKERS, max_pending: int = MAX_PENDING):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+        self.max_pending = max_pending
+        self.pending = 0
+        self.sessions: Dict[str, Tuple[dict, float]] = {}
+        self.inflight_reads: Dict[tuple, asyncio.Future] = {}
+        self.bookings: Optional[asyncio.Queue] = None
+        self.batcher: Optional[asyncio.Task] = None
+        self.stats = {"requests": 0, "rejected": 0, "coalesced": 0, "booking_batches": 0, "bookings": 0}
+
+    # --- plumbing ---
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def read(self, key: tuple, fn, *args):
+        """Run fn(*args) once for all concurrent callers asking for the same key."""
+        future = self.inflight_reads.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self.run(fn, *args))
+        self.inflight_reads[key] = future
+        future.add_done_callback(lambda _: self.inflight_reads.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def start(self) -> None:
+        self.bookings = asyncio.Queue()
+        self.batcher = asyncio.create_task(self._booking_batcher())
+
+    async def stop(self) -> None:
+        if self.batcher:
+            self.batcher.cancel()
+        self.executor.shutdown(wait=True)
+        await asyncio.get_running_loop().run_in_executor(None, database.close_all_conns)
+
+    async def _booking_batcher(self) -> None:
+        while True:
+            batch = [await self.bookings.get()]
+            deadline = asyncio.get_running_loop().time() + BOOKING_BATCH_WINDOW
+            while len(batch) < BOOKING_BATCH_MAX:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.bookings.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.stats["booking_batches"] += 1
+            self.stats["bookings"] += len(batch)
+            try:
+                results = await self.run(database.book_appointments, [args for args, _ in batch])
+            except Exception as e:  # the whole transaction failed; every caller gets the error
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def user_for(self, headers: dict) -> dict:
+        token = headers.get("authorization", "").removeprefix("Bearer ").strip()
+        session = self.sessions.get(token)
+        if not session or session[1] < time.time():
+            self.sessions.pop(token, None)
+            raise HTTPError(401, "missing or expired token")
+        return session[0]
+
+    # --- handlers ---
+    async def handle(self, method: str, target: str, headers: dict, body: bytes) -> Tuple[int, object]:
+        url = urlsplit(target)
+        query = dict(parse_qsl(url.query))
+        parts = [p for p in url.path.split("/") if p]
+        payload = {}
+        if body:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                raise HTTPError(400, "body is not valid JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(400, "body must be a JSON object")
+
+        if parts == ["health"] and method == "GET":
+            return 200, {"ok": True, "pending": self.pending, **self.stats,
+                         "group_commit": database.group_commit_stats()}
+        if parts == ["login"] and method == "POST":
+            user = await self.run(login_user, payload.get("email", ""), payload.get("password", ""))
+            if not user:
+                raise HTTPError(401, "invalid email or password")
+            user = {k: user[k] for k in ("id", "name", "role")}
+            if len(self.sessions) % 1024 == 1023:  # drop expired sessions now and then
+                now = time.time()
+                for old in [t for t, (_, expires) in self.sessions.items() if expires < now]:
+                    del self.sessions[old]
+            token = secrets.token_urlsafe(24)
+            self.sessions[token] = (user, time.time() + SESSION_TTL_SECONDS)
+            return 200, {"token": token, "user": user}
+        if parts == ["doctors"] and method == "GET":
+            text, limit = query.get("q", ""), _int(query.get("limit", database.DOCTOR_SEARCH_LIMIT), "limit")
+            limit = min(max(limit, 1), MAX_DOCTORS_LIMIT)
+            return 200, await self.read(("doctors", text, limit), database.search_doctors, text, limit)
+        if parts == ["slots"] and method == "GET":
+            doctor_id, day = _required(query, "doctor_id"), _date(_required(query, "date"))
+            duration = _duration(query.get("duration", 30))
+            slots = await self.read(("slots", doctor_id, day, duration),
+                                    database.available_slots, doctor_id, day, duration)
+            return 200, {"doctor_id": doctor_id, "date": day, "duration": duration,
+                         "scheduled": slots is not None, "slots": slots or []}
+        if parts == ["appointments"] and method == "GET":
+            user = self.user_for(headers)
+            start, end = query.get("start"), query.get("end")
+            if bool(start) != bool(end):
+                raise HTTPError(400, "give both start and end, or neither")
+            start, end = (_date(start), _date(end)) if start else (None, None)
+            listing = (database.get_appointments_by_doctor if user["role"] == "doctor"
+                       else database.get_appointments_by_patient)
+            history = query.get("history", "") in ("1", "true", "yes")
+            return 200, await self.run(listing, user["id"], start, end, None, history)
+        if parts == ["appointments"] and method == "POST":
+            user = self.user_for(headers)
+            if user["role"] != "patient":
+                raise HTTPError(403, "only patients can book")
+            args = (_required(payload, "doctor_id"), user["id"], _date(_required(payload, "date")),
+                    _time(_required(payload, "time")), _duration(payload.get("duration", 30)),
+                    "pending", str(payload.get("notes") or ""))
+            doctor = await self.read(("user", args[0]), database.get_user_by_id, args[0])
+            if not doctor or doctor["role"] != "doctor":
+                raise HTTPError(404, "no such doctor")
+            future = asyncio.get_running_loop().create_future()
+            await self.bookings.put((args, future))
+            result = await future
+            return (201 if result else 409), asdict(result)
+        if len(parts) == 3 and parts[0] == "appointments" and parts[2] == "cancel" and method == "POST":
+            user = self.user_for(headers)
+            return await self.run(_cancel, parts[1], user)
+        if parts and parts[0] in ("health", "login", "doctors", "slots", "appointments"):
+            raise HTTPError(405, f"{method} not allowed here")
+        raise HTTPError(404, "no such endpoint")
+
+    # --- HTTP/1.1 over asyncio streams ---
+    async def serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await _respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    # The body cannot be delimited, so the connection cannot be reused.
+                    await _respond(writer, 400, {"error": "malformed Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await _respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, result, extra = await self._dispatch(method, target, headers, body)
+                await _respond(writer, status, result, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        self.stats["requests"] += 1
+        if self.pending >= self.max_pending:
+            # Backpressure: refuse straight away instead of letting latency grow without bound.
+            self.stats["rejected"] += 1
+            return 503, {"error": "busy, retry shortly"}, {"Retry-After": "1"}
+        self.pending += 1
+        try:
+            status, result = await self.handle(method.upper(), target, headers, body)
+            return status, result, {}
+        except HTTPError as e:
+            return e.status, {"error": str(e)}, e.headers
+        except Exception as e:
+            return 500, {"error": f"{type(e).__name__}: {e}"}, {}
+        finally:
+            self.pending -= 1
+
+
+def _cancel(app_id: str, user: dict) -> Tuple[int, dict]:
+    row = database.get_conn().execute(
+        "SELECT doctor_id, patient_id, status FROM appointments WHERE id = ?", (app_id,)).fetchone()
+    if row is None:
+        raise HTTPError(404, "no such appointment")
+    if user["id"] not in (row["doctor_id"], row["patient_id"]):
+        raise HTTPError(403, "not your appointment")
+    if row["status"] != "cancelled":
+        database.update_appointment_status(app_id, "cancelled")
+    return 200, {"id": app_id, "status": "cancelled"}
+
+
+def _required(source: dict, name: str) -> str:
+    value = source.get(name)
+    if not value:
+        raise HTTPError(400, f"missing {name}")
+    return str(value)
+
+
+def _int(value, name: str) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer")
+
+
+def _duration(value) -> int:
+    duration = _int(value, "duration")
+    if duration not in DURATIONS:
+        raise HTTPError(400, f"duration must be one of {DURATIONS}")
+    return duration
+
+
+def _date(value: str) -> str:
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise HTTPError(400, "dates are YYYY-MM-DD")
+
+
+def _time(value: str) -> str:
+    try:
+        hours, minutes = (int(p) for p in value.split(":"))
+    except (AttributeError, ValueError):
+        raise HTTPError(400, "times are HH:MM")
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise HTTPError(400, "times are HH:MM")
+    return f"{hours:02d}:{minutes:02d}"
+
+
+async def _respond(writer: asyncio.StreamWriter, status: int, result, keep_alive: bool = True,
+                   extra_headers: Optional[dict] = None) -> None:
+    body = json.dumps(_plain(result), default=str).encode("utf-8")
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in (extra_headers or {}).items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(host: str = "127.0.0.1", port: int = 8080, workers: int = WORKERS,
+                max_pending: int = MAX_PENDING, ready: Optional[asyncio.Event] = None) -> None:
+    """Run the service until cancelled. database.DB_PATH must already be migrated."""
+    service = BookingService(workers, max_pending)
+    await service.start()
+    server = await asyncio.start_server(service.serve_client, host, port, backlog=1024)
+    print(f"Booking API on http://{host}:{port} ({database.DB_PATH}, {workers} workers)", flush=True)
+    if ready is not None:
+        ready.set()
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt  # same clean shutdown as Ctrl-C, so --temp-db is removed
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Headless booking API over the portal database.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="database thread pool size")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING)
+    parser.add_argument("--group-commit", action="store_true",
+                        help=f"commit concurrent writes in groups (also on when {database.GROUP_COMMIT_ENV}=1)")
+    parser.add_argument("--temp-db", choices=("small", "medium", "large"),
+                        help="serve a throwaway synthetic database of this size (removed on exit)")
+    args = parser.parse_args(argv)
+
+    temp_dir = None
+    if args.temp_db:
+        from benchmark import SIZES
+        from synthetic_data import generate_dataset
+        temp_dir = tempfile.mkdtemp(prefix="portal-api-")
+        args.db = os.path.join(temp_dir, "appointments.db")
+        print(f"Generating {args.temp_db} dataset in {args.db}; every password is 'password123'", flush=True)
+        generate_dataset(args.db, **SIZES[args.temp_db])
+    database.DB_PATH = args.db
+    database.migrate()
+    if args.group_commit or database.group_commit_requested():
+        database.start_group_commit()
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        database.stop_group_commit()
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# api_loadtest.py
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from synthetic_data import ANCHOR_DATE, DEFAULT_PASSWORD
+
+# Load generator for api.py. Simulated patients (patient<N>@example.test from
+# synthetic_data.py) log in, then loop over a weighted mix of doctor searches,
+# slot lookups, bookings and listings on keep-alive connections. Prints
+# throughput, status counts and latency percentiles per endpoint as JSON.
+#
+#   python api.py --temp-db small &
+#   python api_loadtest.py --clients 50 --seconds 20
+
+MIX = (("slots", 50), ("search", 20), ("book", 20), ("list", 10))
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Optional[dict] = None,
+                      token: Optional[str] = None) -> Tuple[int, object]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json.dumps(body).encode() if body is not None else b""
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(data)}"]
+        if token:
+            head.append(f"Authorization: Bearer {token}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length, close = 0, False
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "connection" and value.strip().lower() == "close":
+                close = True
+        payload = json.loads(await self.reader.readexactly(length)) if length else None
+        if close:
+            await self.close()
+        return status, payload
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+async def _client_loop(n: int, args, doctors: List[str], deadline: float,
+                       latencies: Dict[str, List[float]], statuses: Counter) -> None:
+    rng = random.Random(args.seed + n)
+    client = Client(args.host, args.port)
+    kinds = [k for k, _ in MIX]
+    weights = [w for _, w in MIX]
+    anchor = date.fromisoformat(ANCHOR_DATE)
+    try:
+        status, login = await client.request("POST", "/login", {
+            "email": f"patient{n % args.patients}@example.test", "password": DEFAULT_PASSWORD})
+        if status != 200:
+            statuses[("login", status)] += 1
+            return
+        token = login["token"]
+        while time.perf_counter() < deadline:
+            kind = rng.choices(kinds, weights)[0]
+            doctor = rng.choice(doctors)
+            day = (anchor + timedelta(days=rng.randint(1, 60))).isoformat()
+            if kind == "slots":
+                call = ("GET", f"/slots?doctor_id={doctor}&date={day}&duration=30", None)
+            elif kind == "search":
+                call = ("GET", f"/doctors?q={rng.choice(args.search_terms)}", None)
+            elif kind == "book":
+                minute = 9 * 60 + 15 * rng.randrange(32)
+                call = ("POST", "/appointments", {"doctor_id": doctor, "date": day,
+                                                  "time": f"{minute // 60:02d}:{minute % 60:02d}", "duration": 15})
+            else:
+                call = ("GET", "/appointments", None)
+            started = time.perf_counter()
+            status, _ = await client.request(*call, token=token)
+            latencies[kind].append(time.perf_counter() - started)
+            statuses[(kind, status)] += 1
+    finally:
+        await client.close()
+
+
+async def run(args) -> dict:
+    probe = Client(args.host, args.port)
+    _, doctors = await probe.request("GET", "/doctors?limit=200")
+    await probe.close()
+    doctor_ids = [d["id"] for d in doctors]
+    if not doctor_ids:
+        raise SystemExit("the service has no doctors; start it with --temp-db or a populated --db")
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    statuses: Counter = Counter()
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    await asyncio.gather(*(_client_loop(n, args, doctor_ids, deadline, latencies, statuses)
+                           for n in range(args.clients)))
+    elapsed = time.perf_counter() - started
+    total = sum(len(v) for v in latencies.values())
+
+    def summary(values: List[float]) -> dict:
+        values = sorted(values)
+        pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+        return {"requests": len(values), "mean_ms": round(statistics.fmean(values) * 1000, 2),
+                "p50_ms": pick(0.5), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": pick(1.0)}
+
+    return {
+        "clients": args.clients,
+        "seconds": round(elapsed, 2),
+        "requests": total,
+        "requests_per_second": round(total / elapsed, 1),
+        "statuses": {f"{kind} {status}": n for (kind, status), n in sorted(statuses.items())},
+        "endpoints": {kind: summary(values) for kind, values in sorted(latencies.items())},
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Load test a running api.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--clients", type=int, default=50, help="concurrent simulated patients")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--patients", type=int, default=2000, help="patient<N> accounts to log in as")
+    parser.add_argument("--search-terms", nargs="+", default=["car", "derm", "ped", "general", "clinic"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 import hashlib
 import uuid
 from typing import Optional
-from database import add_user, get_user_by_email, get_user_by_id
+from database import add_user, get_user_by_email, get_user_by_id, transaction
 
 # Demo static salt — replace with env secret in production
 SALT = "__static_salt_demo_2025__"
@@ -32,11 +32,14 @@ def register_user(
     """
     if not name or not email or not password or not role:
         return False, "Missing required fields"
-    if get_user_by_email(email):
-        return False, "Email already registered"
     uid = str(uuid.uuid4())
     hashed = hash_password(password)
-    add_user(uid, name, email, hashed, role.lower(), specialization, experience, contact, photo_path)
+    # Lookup and insert in one transaction, so two signups with the same email
+    # cannot both pass the check.
+    with transaction():
+        if get_user_by_email(email):
+            return False, "Email already registered"
+        add_user(uid, name, email, hashed, role.lower(), specialization, experience, contact, photo_path)
     return True, uid
 
 
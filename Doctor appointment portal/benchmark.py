@@ -0,0 +1,477 @@
+# benchmark.py
+import argparse
+import csv
+import importlib.util
+import inspect
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable, List, Optional
+
+import database
+import utils
+from synthetic_data import ANCHOR_DATE, FUTURE_DAYS, generate_dataset
+
+# Times the public functions of database.py and utils.py against synthetic
+# datasets of several sizes and writes the results as JSON. Pass a previous
+# run as --baseline to fail (exit 1) when a case's median got slower than
+# --tolerance allows.
+
+SIZES = {
+    "small": {"doctors": 50, "patients": 2000, "appointments": 20000},
+    "medium": {"doctors": 500, "patients": 50000, "appointments": 500000},
+    "large": {"doctors": 10000, "patients": 1000000, "appointments": 10000000},
+}
+DEFAULT_SIZES = ("small", "medium")
+DATA_DIR = "data/bench"
+TARGET_SECONDS = 0.2  # measuring time per case
+REPEAT = 5  # samples per case
+MAX_CALLS = 10000
+FULL_LIST_MAX_ROWS = 2000000  # get_all_* above this many rows is skipped, not timed
+IMPORT_BATCH_ROWS = 1000
+SCHEDULE_BATCH_REQUESTS = 200
+CONCURRENT_WRITES = 16
+
+# Public functions deliberately without a case of their own.
+NOT_TIMED = {
+    "database.record_factory": "row factory; exercised by every read",
+    "database.record_type": "row factory; exercised by every read",
+    "database.get_conn": "connection setup",
+    "database.close_conn": "connection setup",
+    "database.close_all_conns": "connection setup",
+    "database.migrate": "startup only",
+    "database.init_db": "startup only",
+    "database.schema_version": "startup only",
+    "database.pending_migrations": "startup only",
+    "database.invalidate_user_cache": "cache control; used to time cold reads",
+    "database.reset_interval_index": "cache control; used to time cold reads",
+    "database.user_cache_stats": "diagnostics",
+    "database.query_plans": "diagnostics; timed through query_plan_scans",
+    "database.stop_group_commit": "startup only",
+    "database.group_commit_requested": "startup only",
+    "database.group_commit_stats": "diagnostics",
+}
+
+
+def public_functions() -> List[str]:
+    """'module.function' for every public function (and DayIntervals method) of database.py and utils.py."""
+    names = []
+    for module in (database, utils):
+        for name, obj in inspect.getmembers(module):
+            if name.startswith("_") or getattr(obj, "__module__", None) != module.__name__:
+                continue
+            if inspect.isfunction(obj):
+                names.append(f"{module.__name__}.{name}")
+    for name, obj in vars(utils.DayIntervals).items():
+        if not name.startswith("_") and (inspect.isfunction(obj) or isinstance(obj, (classmethod, property))):
+            names.append(f"utils.DayIntervals.{name}")
+    return sorted(names)
+
+
+def _measure(fn: Callable, setup: Optional[Callable] = None) -> dict:
+    """Per-call seconds: min/median/mean/max over REPEAT samples (batched when there is no setup)."""
+    samples = []
+    if setup is None:
+        number = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            elapsed = time.perf_counter() - started
+            if elapsed >= TARGET_SECONDS / REPEAT or number >= MAX_CALLS:
+                break
+            number = min(MAX_CALLS, number * 10 if elapsed < TARGET_SECONDS / REPEAT / 10 else number * 2)
+        samples.append(elapsed / number)
+        for _ in range(REPEAT - 1):
+            started = time.perf_counter()
+            for _ in range(number):
+                fn()
+            samples.append((time.perf_counter() - started) / number)
+        calls = number * REPEAT
+    else:
+        spent = 0.0
+        while len(samples) < REPEAT or (spent < TARGET_SECONDS and len(samples) < MAX_CALLS):
+            setup()
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+            spent += samples[-1]
+        calls = len(samples)
+    return {
+        "calls": calls,
+        "min_us": round(min(samples) * 1e6, 2),
+        "median_us": round(statistics.median(samples) * 1e6, 2),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 2),
+        "max_us": round(max(samples) * 1e6, 2),
+    }
+
+
+def _dataset(size: str, seed: int, data_dir: str) -> str:
+    params = SIZES[size]
+    path = os.path.join(data_dir, "bench_{doctors}d_{patients}p_{appointments}a_s{seed}.db".format(seed=seed, **params))
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"[{size}] generating {path}", file=sys.stderr)
+        generate_dataset(path, seed=seed, progress=lambda m: print(f"[{size}]   {m}", file=sys.stderr), **params)
+    return path
+
+
+def _context() -> dict:
+    """Ids, dates and rows the cases work on, taken from the current dataset."""
+    conn = database.get_conn()
+    doctor_id = conn.execute("""
+        SELECT doctor_id FROM appointment_daily_stats GROUP BY doctor_id
+        ORDER BY SUM(pending + confirmed) DESC LIMIT 1
+    """).fetchone()["doctor_id"]
+    busy_day = conn.execute("""
+        SELECT date FROM appointment_daily_stats WHERE doctor_id = ? ORDER BY booked_minutes DESC LIMIT 1
+    """, (doctor_id,)).fetchone()["date"]
+    day_rows = database.get_appointments_on(doctor_id, busy_day)
+    # First Monday after the generated range: bookable and empty.
+    free_day = date.fromisoformat(ANCHOR_DATE) + timedelta(days=FUTURE_DAYS + 7)
+    free_day += timedelta(days=-free_day.weekday() % 7)
+    range_end = date.fromisoformat(busy_day)
+    counts = conn.execute("""
+        SELECT (SELECT COUNT(*) FROM users) AS users, (SELECT COUNT(*) FROM appointments) AS appointments
+    """).fetchone()
+    return {
+        "doctor": database.get_user_by_id(doctor_id),
+        "patient_id": day_rows[0]["patient_id"],
+        "busy_day": busy_day,
+        "free_day": free_day.isoformat(),
+        "range_start": (range_end - timedelta(days=29)).isoformat(),
+        "range_end": busy_day,
+        "day_rows": day_rows,
+        "appointment_id": day_rows[0]["id"],
+        "users": counts["users"],
+        "appointments": counts["appointments"],
+    }
+
+
+def _read_cases(ctx: dict) -> List[tuple]:
+    """(function, case, fn, setup) for the read-only functions."""
+    db, u = database, utils
+    doctor = ctx["doctor"]
+    did, pid, day = doctor["id"], ctx["patient_id"], ctx["busy_day"]
+    start, end = ctx["range_start"], ctx["range_end"]
+    rows = ctx["day_rows"]
+    intervals = u.DayIntervals.from_rows(rows)
+    minute_rows = [(r["id"], u.time_str_to_minutes(r["time"]), int(r["duration"])) for r in rows]
+    first = rows[0]["time"]
+    cases = [
+        ("utils.minutes_to_time_str", "", lambda: u.minutes_to_time_str(615), None),
+        ("utils.time_str_to_minutes", "", lambda: u.time_str_to_minutes("10:15"), None),
+        ("utils.generate_slots", "09:00-17:00/15", lambda: u.generate_slots("09:00", "17:00", 15), None),
+        ("utils.overlaps", "", lambda: u.overlaps(600, 30, 615, 30), None),
+        ("utils.minute_mask", "", lambda: u.minute_mask(600, 30), None),
+        ("utils.epoch_day", "", lambda: u.epoch_day("2025-06-02"), None),
+        ("utils.epoch_day_to_date", "", lambda: u.epoch_day_to_date(20241), None),
+        ("utils.epoch_minute", "", lambda: u.epoch_minute("2025-06-02", "10:15"), None),
+        ("utils.DayIntervals.from_minutes", "busiest day", lambda: u.DayIntervals.from_minutes(minute_rows), None),
+        ("utils.fit_starts", "45 min", lambda: u.fit_starts(~intervals.busy_mask & u.minute_mask(540, 480), 45), None),
+        ("utils.grid_mask", "cached", lambda: u.grid_mask(540, 1020, 15), None),
+        ("utils.can_book", "rows", lambda: u.can_book(rows, first, 30), None),
+        ("utils.can_book", "intervals", lambda: u.can_book(intervals, first, 30), None),
+        ("utils.nearest_free_slot", "", lambda: u.nearest_free_slot(intervals, first, 30), None),
+        ("utils.DayIntervals.from_rows", "busiest day", lambda: u.DayIntervals.from_rows(rows), None),
+        ("utils.DayIntervals.add", "", lambda: intervals.add("bench", 1000, 15),
+         lambda: intervals.remove("bench")),
+        ("utils.DayIntervals.remove", "", lambda: intervals.remove("bench"),
+         lambda: intervals.add("bench", 1000, 15)),
+        ("utils.DayIntervals.busy_mask", "", lambda: intervals.busy_mask, None),
+        ("utils.DayIntervals.conflicts", "", lambda: intervals.conflicts(600, 30), None),
+        ("utils.DayIntervals.is_free", "", lambda: intervals.is_free(600, 30), None),
+        ("utils.DayIntervals.nearest_free", "", lambda: intervals.nearest_free(600, 30, 540, 1020), None),
+
+        ("database.get_user_by_email", "warm", lambda: db.get_user_by_email(doctor["email"]), None),
+        ("database.get_user_by_email", "cold", lambda: db.get_user_by_email(doctor["email"]), db.invalidate_user_cache),
+        ("database.get_user_by_id", "warm", lambda: db.get_user_by_id(did), None),
+        ("database.get_user_by_id", "cold", lambda: db.get_user_by_id(did), db.invalidate_user_cache),
+        ("database.search_doctors", "warm", lambda: db.search_doctors("car"), None),
+        ("database.search_doctors", "cold", lambda: db.search_doctors("car"), db.invalidate_user_cache),
+        ("database.list_doctors", "all", lambda: db.list_doctors(), None),
+        ("database.list_doctors", "filter", lambda: db.list_doctors("car"), None),
+        ("database.get_all_doctors", "warm", lambda: db.get_all_doctors(), None),
+        ("database.get_all_doctors", "cold", lambda: db.get_all_doctors(), db.invalidate_user_cache),
+        ("database.get_users_page", "first page", lambda: db.get_users_page(), None),
+        ("database.get_users_page", "patients", lambda: db.get_users_page(role="patient"), None),
+
+        ("database.get_day_intervals", "warm", lambda: db.get_day_intervals(did, day), None),
+        ("database.get_day_intervals", "cold", lambda: db.get_day_intervals(did, day), db.reset_interval_index),
+        ("database.get_weekly_availability", "", lambda: db.get_weekly_availability(did), None),
+        ("database.get_availability_exceptions", "", lambda: db.get_availability_exceptions(did, start, end), None),
+        ("database.get_day_hours", "", lambda: db.get_day_hours(did, day), None),
+        ("database.get_free_mask", "", lambda: db.get_free_mask(did, day), None),
+        ("database.is_slot_available", "", lambda: db.is_slot_available(did, day, first, 30), None),
+        ("database.available_slots", "warm", lambda: db.available_slots(did, day, 30), None),
+        ("database.available_slots", "cold", lambda: db.available_slots(did, day, 30), db.reset_interval_index),
+
+        ("database.get_appointments_on", "", lambda: db.get_appointments_on(did, day), None),
+        ("database.get_doctor_calendar", "30 days", lambda: db.get_doctor_calendar(did, start, end), None),
+        # The same month read a day at a time, as a calendar without the range query would.
+        ("database.get_appointments_on", "30 days one by one", lambda: [
+            db.get_appointments_on(did, (date.fromisoformat(start) + timedelta(days=i)).isoformat())
+            for i in range(30)], None),
+        ("database.get_patient_calendar", "30 days", lambda: db.get_patient_calendar(pid, start, end), None),
+        ("database.get_patient_calendar", "30 days + archive", lambda: db.get_patient_calendar(
+            pid, start, end, include_archive=True), None),
+        ("database.get_appointments_overlapping", "doctor, 1 day", lambda: db.get_appointments_overlapping(
+            day, "00:00", day, "23:59", did), None),
+        ("database.get_appointments_overlapping", "all doctors, 2 hours", lambda: db.get_appointments_overlapping(
+            day, "10:00", day, "12:00"), None),
+        ("database.find_conflicts", "", lambda: db.find_conflicts(did, day, first, 30), None),
+        ("database.get_appointments_by_doctor", "30 days", lambda: db.get_appointments_by_doctor(did, start, end), None),
+        ("database.get_appointments_by_doctor", "all", lambda: db.get_appointments_by_doctor(did), None),
+        ("database.get_appointments_by_patient", "all", lambda: db.get_appointments_by_patient(pid), None),
+        ("database.get_appointments_by_patient", "all + archive", lambda: db.get_appointments_by_patient(
+            pid, include_archive=True), None),
+        ("database.archive_stats", "", db.archive_stats, None),
+        ("database.get_appointments_page", "first page", lambda: db.get_appointments_page(), None),
+        ("database.get_appointments_page", "30 days", lambda: db.get_appointments_page(start_date=start, end_date=end), None),
+        ("database.get_appointment_details", "doctor, 1 day", lambda: db.get_appointment_details(
+            did, start_date=day, end_date=day), None),
+        ("database.get_appointment_details", "patient, all", lambda: db.get_appointment_details(patient_id=pid), None),
+        ("database.get_appointment_details_page", "500 rows", lambda: db.get_appointment_details_page(limit=500), None),
+        # What the admin page would cost without the join: two user lookups per row.
+        ("database.get_appointments_page", "500 rows + names", lambda: [
+            (db.get_user_by_id(r["doctor_id"]), db.get_user_by_id(r["patient_id"]))
+            for r in db.get_appointments_page(limit=500)[0]], db.invalidate_user_cache),
+        ("database.fetch_columns", "30 days", lambda: db.fetch_columns(
+            "SELECT date, duration, status FROM appointments WHERE date BETWEEN ? AND ?", (start, end)), None),
+        ("database.iter_appointment_chunks", "doctor, all", lambda: sum(
+            len(chunk) for chunk in db.iter_appointment_chunks(doctor_id=did)), None),
+        ("database.pending_appointment_ids", "30 days", lambda: db.pending_appointment_ids(start, end), None),
+        ("database.get_daily_stats", "doctor, 30 days", lambda: db.get_daily_stats(start, end, did), None),
+        ("database.get_stats_by_day", "30 days", lambda: db.get_stats_by_day(start, end), None),
+        ("database.get_stats_by_doctor", "30 days", lambda: db.get_stats_by_doctor(start, end), None),
+        ("database.query_plan_scans", "", db.query_plan_scans, None),
+    ]
+    if ctx["users"] <= FULL_LIST_MAX_ROWS:
+        cases.append(("database.get_all_users", "", db.get_all_users, None))
+    if ctx["appointments"] <= FULL_LIST_MAX_ROWS:
+        cases.append(("database.get_all_appointments", "", db.get_all_appointments, None))
+    if importlib.util.find_spec("pandas") is not None:
+        day_records = db.get_appointments_by_doctor(did, start, end)
+        cases += [
+            ("database.export_appointments_df", "doctor, 30 days", lambda: db.export_appointments_df(day_records), None),
+            ("database.fetch_frame", "30 days", lambda: db.fetch_frame(
+                "SELECT date, duration, status FROM appointments WHERE date BETWEEN ? AND ?", (start, end)), None),
+        ]
+    return cases
+
+
+def _write_cases(ctx: dict) -> List[tuple]:
+    """Cases that change data; run last, against a scratch copy of the dataset."""
+    db = database
+    did, pid, free_day = ctx["doctor"]["id"], ctx["patient_id"], ctx["free_day"]
+    state = {"booked": None, "n": 0}
+
+    def drop_booked():
+        if state["booked"]:
+            db.delete_appointment(state["booked"])
+            state["booked"] = None
+
+    def book():
+        state["booked"] = db.book_appointment(did, pid, free_day, "10:00", 30).appointment_id
+
+    def create():
+        state["booked"] = str(uuid.uuid4())
+        db.create_appointment(state["booked"], did, pid, free_day, "10:00", 30)
+
+    def make_one():
+        drop_booked()
+        create()
+
+    def delete():
+        db.delete_appointment(state["booked"])
+        state["booked"] = None
+
+    def add_user():
+        state["n"] += 1
+        db.add_user(str(uuid.uuid4()), "Bench User", f"bench{state['n']}@example.test", "x", "patient")
+
+    def status_unit():
+        with db.transaction():
+            for i in range(CONCURRENT_WRITES):
+                db.update_appointment_status(ctx["appointment_id"], "confirmed" if i % 2 else "pending")
+
+    # One status update from each of CONCURRENT_WRITES threads at once; with
+    # group commit on they share commits.
+    pool = ThreadPoolExecutor(CONCURRENT_WRITES, thread_name_prefix="bench-writer")
+
+    def concurrent_updates():
+        list(pool.map(lambda i: db.update_appointment_status(
+            ctx["appointment_id"], "confirmed" if i % 2 else "pending"), range(CONCURRENT_WRITES)))
+
+    def book_batch():
+        state["batch"] = [r.appointment_id for r in db.book_appointments(
+            [(did, pid, free_day, utils.minutes_to_time_str(540 + 15 * i), 15, "pending", "") for i in range(16)])]
+
+    def drop_batch():
+        for app_id in state.pop("batch", None) or ():
+            db.delete_appointment(app_id)
+
+    def prepare_schedule():
+        drop_batch()
+        state["requests"] = [db.ScheduleRequest(pid, ctx["doctor"]["specialization"], free_day, duration=15)
+                             for _ in range(SCHEDULE_BATCH_REQUESTS)]
+
+    def schedule():
+        state["batch"] = [p["appointment_id"] for p in db.auto_schedule(state["requests"]).placed]
+
+    def import_rows(as_csv: bool):
+        # 32 quarter-hour visits a day, each batch on days no earlier batch used.
+        span = -(-IMPORT_BATCH_ROWS // 32)
+        state["n"] += 1
+        first = date.fromisoformat(free_day) + timedelta(days=1 + span * state["n"])
+        rows = [{"doctor_id": did, "patient_id": pid,
+                 "date": (first + timedelta(days=i // 32)).isoformat(),
+                 "time": utils.minutes_to_time_str(540 + (i % 32) * 15), "duration": 15}
+                for i in range(IMPORT_BATCH_ROWS)]
+        if not as_csv:
+            return lambda: db.import_appointments(rows)
+        out = io.StringIO()
+        writer = csv.DictWriter(out, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+        text = out.getvalue()
+        return lambda: db.import_appointments_csv(io.StringIO(text))
+
+    pending = {}
+
+    def prepare_import(as_csv: bool):
+        def setup():
+            pending["fn"] = import_rows(as_csv)
+        return setup
+
+    return [
+        ("database.book_appointment", "free slot", book, drop_booked),
+        ("database.book_appointment", "conflict", lambda: db.book_appointment(did, pid, free_day, "10:00", 30),
+         lambda: None if state["booked"] else book()),
+        ("database.create_appointment", "", create, drop_booked),
+        ("database.book_appointments", "16 bookings", book_batch, lambda: (drop_booked(), drop_batch())),
+        ("database.auto_schedule", f"{SCHEDULE_BATCH_REQUESTS} requests", schedule, prepare_schedule),
+        ("database.update_appointment_status", "", lambda: db.update_appointment_status(
+            ctx["appointment_id"], "confirmed" if state["n"] % 2 else "pending"),
+         lambda: state.__setitem__("n", state["n"] + 1)),
+        ("database.update_appointment_status", f"{CONCURRENT_WRITES} concurrent", concurrent_updates, None),
+        ("database.transaction", f"{CONCURRENT_WRITES} status updates", status_unit, None),
+        ("database.delete_appointment", "", delete, make_one),
+        ("database.add_user", "", add_user, None),
+        ("database.set_weekly_availability", "", lambda: db.set_weekly_availability(did, 0, "09:00", "17:00", 30), None),
+        ("database.clear_weekly_availability", "", lambda: db.clear_weekly_availability(did, 6), None),
+        ("database.set_availability_exception", "", lambda: db.set_availability_exception(did, free_day), None),
+        ("database.delete_availability_exception", "", lambda: db.delete_availability_exception(did, free_day),
+         lambda: db.set_availability_exception(did, free_day)),
+        ("database.import_appointments", f"{IMPORT_BATCH_ROWS} rows", lambda: pending["fn"](), prepare_import(False)),
+        ("database.import_appointments_csv", f"{IMPORT_BATCH_ROWS} rows", lambda: pending["fn"](), prepare_import(True)),
+        # Each call moves the next oldest batch; the history outlasts the samples.
+        ("database.archive_appointments", f"{db.ARCHIVE_BATCH_ROWS} rows", lambda: db.archive_appointments(
+            ctx["range_start"], max_batches=1), None),
+        # Last: once started, every later write would go through the writer.
+        ("database.start_group_commit", f"{CONCURRENT_WRITES} concurrent updates", concurrent_updates,
+         db.start_group_commit),
+    ]
+
+
+def run_size(size: str, seed: int, data_dir: str, only: Optional[List[str]] = None) -> List[dict]:
+    """Time every case on one dataset size; returns one result dict per case."""
+    path = _dataset(size, seed, data_dir)
+    scratch = path + ".scratch"
+    previous_path = database.DB_PATH
+    results = []
+    try:
+        for phase in ("read", "write"):
+            if phase == "write":
+                database.close_all_conns()
+                shutil.copyfile(path, scratch)
+                database.DB_PATH = scratch
+            else:
+                database.DB_PATH = path
+            database.invalidate_user_cache()
+            database.reset_interval_index()
+            ctx = _context()
+            cases = _read_cases(ctx) if phase == "read" else _write_cases(ctx)
+            for function, case, fn, setup in cases:
+                if only and not any(pattern in function for pattern in only):
+                    continue
+                stats = _measure(fn, setup)
+                results.append({"size": size, "function": function, "case": case, **stats})
+                print(f"[{size}] {function:<42} {case:<16} {stats['median_us']:>12.1f} us", file=sys.stderr)
+    finally:
+        database.stop_group_commit()
+        database.close_all_conns()
+        database.DB_PATH = previous_path
+        if os.path.exists(scratch):
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(scratch + suffix):
+                    os.remove(scratch + suffix)
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], tolerance: float) -> List[dict]:
+    """Cases whose median is more than `tolerance` (0.25 = 25%) slower than in baseline."""
+    before = {(r["size"], r["function"], r["case"]): r["median_us"] for r in baseline}
+    slower = []
+    for r in results:
+        old = before.get((r["size"], r["function"], r["case"]))
+        if old and r["median_us"] > old * (1 + tolerance):
+            slower.append({**r, "baseline_median_us": old, "ratio": round(r["median_us"] / old, 2)})
+    return slower
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark database.py and utils.py on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(DEFAULT_SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated datasets are kept (default: %(default)s)")
+    parser.add_argument("--only", nargs="+", help="time only functions whose name contains one of these")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed median slowdown (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        results += run_size(size, args.seed, args.data_dir, args.only)
+    timed = {r["function"] for r in results}
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "sizes": {size: SIZES[size] for size in args.sizes},
+        },
+        "results": results,
+        "not_timed": {name: NOT_TIMED.get(name, "no case") for name in public_functions()
+                      if name not in timed and not args.only},
+    }
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f)["results"], args.tolerance)
+        for r in report["regressions"]:
+            print(f"SLOWER [{r['size']}] {r['function']} {r['case']}: x{r['ratio']}", file=sys.stderr)
+        status = 1 if report["regressions"] else 0
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
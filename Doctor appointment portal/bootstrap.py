@@ -0,0 +1,72 @@
+# bootstrap.py
+import argparse
+import os
+import threading
+from datetime import date, timedelta
+
+import database
+
+# Set to 1/true/yes to load the demo accounts from sample_data.py on startup.
+SAMPLE_DATA_ENV = "PORTAL_SAMPLE_DATA"
+
+_bootstrapped = set()
+_bootstrap_lock = threading.Lock()
+
+
+def sample_data_requested() -> bool:
+    return os.environ.get(SAMPLE_DATA_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def bootstrap(load_samples: bool = False) -> None:
+    """
+    Migrate database.DB_PATH to the latest schema, start the group-commit
+    writer if PORTAL_GROUP_COMMIT is set and optionally load the sample
+    accounts, once per process and database. Streamlit re-executes main.py on
+    every interaction; later calls return straight away.
+    """
+    key = database.DB_PATH
+    if key in _bootstrapped:
+        return
+    with _bootstrap_lock:
+        if key in _bootstrapped:
+            return
+        database.migrate()
+        if database.group_commit_requested():
+            database.start_group_commit()
+        if load_samples:
+            from sample_data import insert_samples
+            insert_samples()
+        _bootstrapped.add(key)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Create or upgrade the appointment portal database.")
+    parser.add_argument("--db", default=database.DB_PATH, help="database file (default: %(default)s)")
+    parser.add_argument("--target", type=int, help="stop after this migration version")
+    parser.add_argument("--samples", action="store_true", help="also load the sample accounts")
+    parser.add_argument("--status", action="store_true", help="show the schema version and pending migrations only")
+    parser.add_argument("--archive", type=int, metavar="DAYS",
+                        help="then archive confirmed/cancelled appointments older than DAYS days")
+    args = parser.parse_args(argv)
+
+    database.DB_PATH = args.db
+    if args.status:
+        print(f"{args.db}: schema version {database.schema_version()}")
+        for version, description in database.pending_migrations():
+            print(f"  pending {version}: {description}")
+        if not database.pending_migrations():
+            print(f"  appointments: {database.archive_stats()}")
+        return
+    applied = database.migrate(args.target)
+    print(f"{args.db}: applied {applied or 'nothing'}, now at version {database.schema_version()}")
+    if args.samples:
+        from sample_data import insert_samples
+        insert_samples()
+        print("Inserted sample users (if not already present).")
+    if args.archive is not None:
+        cutoff = (date.today() - timedelta(days=args.archive)).isoformat()
+        print(f"Archived {database.archive_appointments(cutoff)} appointments dated before {cutoff}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# calendar_ui.py
+import calendar
+import html
+from datetime import date, timedelta
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import streamlit as st
+
+# Week/month grids shared by the doctor and patient dashboards. The caller
+# fetches the whole range with one query (database.get_doctor_calendar /
+# get_patient_calendar) and passes the per-day values in; nothing here touches
+# the database. Day details are loaded by the caller for the day picked with
+# pick_day(), so a closed calendar never reads appointment rows.
+
+CALENDAR_VIEWS = ("Week", "Month")
+WEEKDAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+OFF_COLOR = "#f1f3f5"
+
+
+def calendar_range(anchor: date, view: str) -> Tuple[date, date]:
+    """First and last date of the Monday-based week, or the month, holding anchor."""
+    if view == "Week":
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=6)
+    last = calendar.monthrange(anchor.year, anchor.month)[1]
+    return anchor.replace(day=1), anchor.replace(day=last)
+
+
+def heat_color(level: Optional[float]) -> str:
+    """Green (idle) through amber to red (full) for 0..1; grey for None (day off)."""
+    if level is None:
+        return OFF_COLOR
+    level = min(max(level, 0.0), 1.0)
+    hue = 120 * (1 - level)
+    return f"hsl({hue:.0f}, 70%, {92 - 22 * level:.0f}%)"
+
+
+def render_heatmap(start: date, end: date, level: Callable[[str], Optional[float]],
+                   label: Callable[[str], str]) -> None:
+    """
+    Draw start..end as a Monday-first grid. level(date_str) picks each cell's
+    colour (see heat_color) and label(date_str) its caption.
+    """
+    first = start - timedelta(days=start.weekday())
+    cells = []
+    day = first
+    while day <= end or day.weekday() != 0:
+        if start <= day <= end:
+            key = day.isoformat()
+            cells.append(
+                f"<td style='background:{heat_color(level(key))}; padding:6px; border-radius:8px; "
+                f"vertical-align:top; width:14%;'><b>{day.day}</b><br>"
+                f"<small>{html.escape(label(key))}</small></td>")
+        else:
+            cells.append("<td></td>")
+        day += timedelta(days=1)
+    rows = ["<tr>" + "".join(cells[i:i + 7]) + "</tr>" for i in range(0, len(cells), 7)]
+    header = "<tr>" + "".join(f"<th>{name}</th>" for name in WEEKDAY_NAMES) + "</tr>"
+    st.markdown(f"<table style='width:100%; border-spacing:4px; border-collapse:separate;'>"
+                f"{header}{''.join(rows)}</table>", unsafe_allow_html=True)
+
+
+def pick_day(key: str, days: Iterable[str], describe: Dict[str, str]) -> Optional[str]:
+    """Select box over the given dates; returns the chosen 'YYYY-MM-DD' or None."""
+    options = [None] + list(days)
+    return st.selectbox(
+        "Day details", options, key=key,
+        format_func=lambda d: "— pick a day —" if d is None else f"{d} · {describe.get(d, 'nothing booked')}",
+    )
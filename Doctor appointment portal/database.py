@@ -1,27 +1,406 @@
 import sqlite3
+import csv
+import inspect
 import os
-from typing import Optional, List, Tuple
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from dataclasses import dataclass, field
+from datetime import date as date_type, datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional, List, Tuple, Union
 import uuid
 
+import query_stats
+from utils import (DayIntervals, EPOCH_ORDINAL, MINUTES_PER_DAY, epoch_day, epoch_minute, fit_starts,
+                   generate_slots, grid_mask, minute_mask, minutes_to_time_str, time_str_to_minutes)
+
 DB_PATH = "data/appointments.db"
 
-# --- Dict factory (makes rows behave like real dicts) ---
-def dict_factory(cursor, row):
-    return {col[0]: row[idx] for idx, col in enumerate(cursor.description)}
+# SQLite tuning applied to every connection. WAL lets readers run alongside the
+# single writer; busy_timeout makes a writer wait for the lock instead of failing.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -16000,  # negative = KiB, ~16 MB page cache per connection
+    "temp_store": "MEMORY",
+}
+
+# --- Row records ---
+# Rows come back as immutable records: one namedtuple class per column list, so
+# a row is a plain tuple of values plus a shared field table. They keep the dict
+# read API the UI uses (row["name"], row.get(...), keys()), while tuple(row) and
+# pd.DataFrame(rows) see the values and field names as expected.
+@lru_cache(maxsize=256)
+def record_type(columns: Tuple[str, ...]) -> type:
+    base = namedtuple("Record", columns, rename=True)
+    index = {name: i for i, name in enumerate(columns)}
+
+    class Record(base):
+        __slots__ = ()
+        _index = index
+
+        def __getitem__(self, key):
+            if key.__class__ is str:
+                return tuple.__getitem__(self, self._index[key])
+            return tuple.__getitem__(self, key)
+
+        def get(self, key, default=None):
+            i = self._index.get(key)
+            return default if i is None else tuple.__getitem__(self, i)
+
+        def keys(self):
+            return list(self._index)
+
+        def values(self):
+            return list(self)
+
+        def items(self):
+            return list(zip(self._index, self))
+
+        def to_dict(self) -> dict:
+            return dict(zip(self._index, self))
+
+    return Record
 
-# --- Connection helper ---
-def get_conn():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = dict_factory  # ✅ now returns dicts
+
+_last_record_type: Tuple[Optional[tuple], Optional[type]] = (None, None)
+
+
+def record_factory(cursor, row):
+    # cursor.description is one tuple object per executed statement, so checking
+    # its identity against the last one seen skips rebuilding the column list for
+    # every row. The pair is swapped in with a single assignment (thread-safe).
+    global _last_record_type
+    last = _last_record_type
+    desc = cursor.description
+    if last[0] is not desc:
+        last = _last_record_type = (desc, record_type(tuple(col[0] for col in desc)))
+    return tuple.__new__(last[1], row)
+
+# --- Connection manager ---
+# Each thread (one per Streamlit session run) gets its own connection, so reads
+# never share cursors or transactions with another session's writes.
+_local = threading.local()
+_all_conns: Dict[threading.Thread, sqlite3.Connection] = {}  # thread -> its connection
+_registry_lock = threading.Lock()
+_generation = 0  # bumped by close_all_conns so threads reopen lazily
+
+
+def _prune_dead_threads() -> None:
+    # Connections of finished threads are unreachable through _local; close them here.
+    # Keyed by Thread object, not ident: a new thread may reuse a dead one's ident.
+    for thread in [t for t in _all_conns if not t.is_alive()]:
+        _all_conns.pop(thread).close()
+
+
+def _open_conn(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=PRAGMAS["busy_timeout"] / 1000, check_same_thread=False,
+                           factory=query_stats.InstrumentedConnection)
+    conn.row_factory = record_factory  # dict-style access, tuple storage
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    with _registry_lock:
+        _prune_dead_threads()
+        _all_conns[threading.current_thread()] = conn
     return conn
 
-# Global connection
-_conn = get_conn()
 
-# --- Initialize DB ---
-def init_db():
-    cur = _conn.cursor()
+def get_conn() -> sqlite3.Connection:
+    """Return this thread's connection to DB_PATH, opening it on first use."""
+    conn = getattr(_local, "conn", None)
+    key = (DB_PATH, _generation)
+    if conn is None or _local.key != key:
+        if conn is not None:
+            close_conn()
+        conn = _open_conn(DB_PATH)
+        _local.conn = conn
+        _local.key = key
+    return conn
+
+
+def close_conn() -> None:
+    """Close the calling thread's connection (e.g. when a worker thread exits)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _registry_lock:
+        _all_conns.pop(threading.current_thread(), None)
+    conn.close()
+
+
+def close_all_conns() -> None:
+    """Close every connection opened by this process (shutdown / DB_PATH switch)."""
+    global _generation
+    with _registry_lock:
+        conns = list(_all_conns.values())
+        _all_conns.clear()
+        _generation += 1
+    for conn in conns:
+        conn.close()
+    _local.conn = None
+
+# --- Units of work ---
+# transaction() groups several write helpers into one BEGIN IMMEDIATE ... COMMIT
+# on this thread's connection: one commit, and all of it or none of it. Helpers
+# called inside join the open transaction instead of committing themselves.
+# Doctor-days and working hours cached while the unit is open may hold its
+# uncommitted rows, so they are evicted if it rolls back; user cache
+# invalidation waits for the commit, and user reads skip the cache meanwhile.
+_unit = threading.local()
+
+
+class _Unit:
+    __slots__ = ("days", "doctors", "after_commit")
+
+    def __init__(self):
+        self.days = set()  # interval index keys loaded or changed inside the unit
+        self.doctors = set()  # doctors whose cached working hours were touched
+        self.after_commit = []
+
+
+def _current_unit() -> Optional[_Unit]:
+    return getattr(_unit, "state", None)
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    # Inside transaction() the unit commits once, at its end.
+    if _current_unit() is None:
+        conn.commit()
+
+
+def _discard_unit_caches(unit: _Unit) -> None:
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for key in unit.days:
+            _interval_index.pop(key, None)
+        for key in [k for k in _hours_cache if k[1] in unit.doctors]:
+            del _hours_cache[key]
+
+
+@contextmanager
+def transaction():
+    """
+    Run the enclosed write helpers as one unit of work with a single commit:
+
+        with database.transaction():
+            if not database.get_user_by_email(email):
+                database.add_user(...)
+
+    Holds the process write lock and SQLite's write lock until the block
+    ends; an exception rolls everything back. Nested calls join the
+    outermost unit. Yields this thread's connection.
+    """
+    if _current_unit() is not None:
+        yield get_conn()
+        return
+    conn = get_conn()
+    unit = _Unit()
+    with _write_lock:
+        try:
+            with _immediate_transaction(conn):
+                _unit.state = unit
+                try:
+                    yield conn
+                finally:
+                    _unit.state = None
+        except BaseException:
+            _discard_unit_caches(unit)
+            raise
+    for fn in unit.after_commit:
+        fn()
+
+# --- Group commit ---
+# With many sessions writing at once, commits (one fsync each) rather than CPU
+# cap throughput. A GroupCommitWriter runs writes submitted from any thread on
+# its own thread, a group at a time, each group in one transaction(). A group is
+# whatever queued up while the previous one was committing (up to max_ops), so
+# a lone write is not held back; max_delay > 0 additionally waits that long for
+# company. Callers are answered only after their group has committed. Each write
+# runs under its own savepoint, so one that raises is undone alone. Off unless
+# start_group_commit() is called; the write helpers marked @_grouped then route
+# through it.
+GROUP_COMMIT_ENV = "PORTAL_GROUP_COMMIT"
+GROUP_COMMIT_MAX_OPS = 128
+GROUP_COMMIT_MAX_DELAY = 0.0  # seconds
+GROUP_COMMIT_MAX_PENDING = 4096  # queued writes before submit() blocks
+
+
+class GroupCommitWriter:
+    """Background thread that commits submitted write calls in groups."""
+
+    def __init__(self, max_ops: int = GROUP_COMMIT_MAX_OPS, max_delay: float = GROUP_COMMIT_MAX_DELAY,
+                 max_pending: int = GROUP_COMMIT_MAX_PENDING):
+        self.max_ops = max_ops
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue(max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"groups": 0, "writes": 0, "failed_writes": 0, "largest_group": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Commit everything already submitted, then stop the thread."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """Queue fn(*args, **kwargs); the future resolves once its group has committed."""
+        future = Future()
+        self._queue.put((future, fn, args, kwargs))
+        return future
+
+    def _run(self) -> None:
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is None:
+                    break
+                group = [first]
+                deadline = time.monotonic() + self.max_delay
+                while len(group) < self.max_ops:
+                    timeout = deadline - time.monotonic()
+                    try:
+                        item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        break
+                    group.append(item)
+                self._commit_group(group)
+        finally:
+            close_conn()
+
+    def _commit_group(self, group: List[tuple]) -> None:
+        outcomes = []
+        try:
+            with transaction() as conn:
+                for future, fn, args, kwargs in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT group_write")
+                    try:
+                        outcome = (True, fn(*args, **kwargs))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO group_write")
+                        # Days it touched reload from the DB, which no longer has its rows.
+                        _discard_unit_caches(_current_unit())
+                        outcome = (False, e)
+                    conn.execute("RELEASE group_write")
+                    outcomes.append((future, outcome))
+        except Exception as e:
+            # BEGIN, a savepoint or the commit failed: nobody's write is durable. Fail
+            # every caller, including those the loop had not reached yet.
+            for future, _, _, _ in group:
+                if future.running() or (not future.done() and future.set_running_or_notify_cancel()):
+                    future.set_exception(e)
+            return
+        self.stats["groups"] += 1
+        self.stats["writes"] += len(outcomes)
+        self.stats["largest_group"] = max(self.stats["largest_group"], len(outcomes))
+        for future, (ok, value) in outcomes:
+            if ok:
+                future.set_result(value)
+            else:
+                self.stats["failed_writes"] += 1
+                future.set_exception(value)
+
+
+_group_writer: Optional[GroupCommitWriter] = None
+_group_writer_lock = threading.Lock()
+
+
+def start_group_commit(max_ops: int = GROUP_COMMIT_MAX_OPS,
+                       max_delay: float = GROUP_COMMIT_MAX_DELAY) -> GroupCommitWriter:
+    """Route the @_grouped write helpers through a background group-commit writer."""
+    global _group_writer
+    with _group_writer_lock:
+        if _group_writer is None:
+            _group_writer = GroupCommitWriter(max_ops, max_delay)
+            _group_writer.start()
+        return _group_writer
+
+
+def stop_group_commit() -> None:
+    """Flush and stop the group-commit writer; writes commit individually again."""
+    global _group_writer
+    with _group_writer_lock:
+        writer, _group_writer = _group_writer, None
+    if writer is not None:
+        writer.stop()
+
+
+def group_commit_requested() -> bool:
+    return os.environ.get(GROUP_COMMIT_ENV, "").strip().lower() in ("1", "true", "yes")
+
+
+def group_commit_stats() -> Optional[dict]:
+    """Counters of the running group-commit writer, or None when it is off."""
+    writer = _group_writer
+    return dict(writer.stats, max_ops=writer.max_ops, max_delay=writer.max_delay) if writer else None
+
+
+def _grouped(fn):
+    # Calls inside a unit of work (including the writer's own groups) run in place.
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        writer = _group_writer
+        if writer is None or _current_unit() is not None:
+            return fn(*args, **kwargs)
+        return writer.submit(fn, *args, **kwargs).result()
+
+    return wrapper
+
+# Secondary indexes: every per-doctor / per-patient listing filters on the id and
+# orders by (date, time), so these serve both the WHERE and the ORDER BY. The
+# table-wide orderings carry id as a tiebreaker for keyset pagination, also
+# within one status for pages filtered by status.
+INDEXES = {
+    "idx_appointments_doctor_date_time": "appointments(doctor_id, date, time)",
+    "idx_appointments_patient_date_time": "appointments(patient_id, date, time)",
+    "idx_appointments_date_time_id": "appointments(date, time, id)",
+    "idx_appointments_status_date_time_id": "appointments(status, date, time, id)",
+    "idx_users_role_name_id": "users(role, name, id)",
+    "idx_daily_stats_date": "appointment_daily_stats(date)",
+}
+ARCHIVE_INDEXES = {
+    "idx_archive_doctor_date_time": "appointments_archive(doctor_id, date, time)",
+    "idx_archive_patient_date_time": "appointments_archive(patient_id, date, time)",
+    "idx_archive_date_time_id": "appointments_archive(date, time, id)",
+}
+# start_min/end_min (see _add_minute_columns) turn overlap and range tests into
+# integer comparisons: per doctor, and across all doctors.
+MINUTE_INDEXES = {
+    "idx_appointments_doctor_start": "appointments(doctor_id, start_min, end_min)",
+    "idx_appointments_start": "appointments(start_min, end_min)",
+    "idx_archive_doctor_start": "appointments_archive(doctor_id, start_min, end_min)",
+    "idx_archive_start": "appointments_archive(start_min, end_min)",
+}
+# Superseded by a wider index above; dropped by the index migration.
+OBSOLETE_INDEXES = ("idx_appointments_date_time", "idx_users_role_name")
+
+APPOINTMENT_COLUMNS = ("id", "doctor_id", "patient_id", "date", "time", "duration", "status", "notes")
+MINUTE_COLUMNS = ("start_min", "end_min")
+
+# --- Schema ---
+# Table and index creation, run as ordered steps by migrate() below.
+def _create_core_tables(cur) -> None:
     cur.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id TEXT PRIMARY KEY,
@@ -50,37 +429,635 @@ def init_db():
             FOREIGN KEY(patient_id) REFERENCES users(id)
         )
     """)
-    _conn.commit()
+
+
+def _create_availability_tables(cur) -> None:
+    # Weekly template (one window per weekday) and per-date overrides.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS availability (
+            doctor_id TEXT NOT NULL,
+            weekday INTEGER NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            slot_minutes INTEGER NOT NULL,
+            PRIMARY KEY (doctor_id, weekday),
+            FOREIGN KEY(doctor_id) REFERENCES users(id)
+        )
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS availability_exceptions (
+            doctor_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            start_time TEXT,
+            end_time TEXT,
+            slot_minutes INTEGER,
+            PRIMARY KEY (doctor_id, date),
+            FOREIGN KEY(doctor_id) REFERENCES users(id)
+        )
+    """)
+
+
+def _create_indexes(cur) -> None:
+    for name, target in INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    for name in OBSOLETE_INDEXES:
+        cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+# --- Appointment statistics ---
+# appointment_daily_stats holds one row per doctor per day: minutes booked by
+# non-cancelled appointments and a count per status. Triggers on appointments
+# apply each insert, update and delete as a delta, so every write path (booking,
+# status changes, bulk import) keeps it current and analytics never scan
+# appointments.
+_DAILY_STATS_ADD = """
+    INSERT INTO appointment_daily_stats (doctor_id, date, booked_minutes, pending, confirmed, cancelled)
+    VALUES ({r}.doctor_id, {r}.date,
+            CASE WHEN {r}.status != 'cancelled' THEN {r}.duration ELSE 0 END,
+            {r}.status = 'pending', {r}.status = 'confirmed', {r}.status = 'cancelled')
+    ON CONFLICT(doctor_id, date) DO UPDATE SET
+        booked_minutes = booked_minutes + excluded.booked_minutes,
+        pending = pending + excluded.pending,
+        confirmed = confirmed + excluded.confirmed,
+        cancelled = cancelled + excluded.cancelled;"""
+
+_DAILY_STATS_SUBTRACT = """
+    UPDATE appointment_daily_stats SET
+        booked_minutes = booked_minutes - CASE WHEN {r}.status != 'cancelled' THEN {r}.duration ELSE 0 END,
+        pending = pending - ({r}.status = 'pending'),
+        confirmed = confirmed - ({r}.status = 'confirmed'),
+        cancelled = cancelled - ({r}.status = 'cancelled')
+    WHERE doctor_id = {r}.doctor_id AND date = {r}.date;"""
+
+_DAILY_STATS_TRIGGERS = {
+    "appointments_stats_insert": "AFTER INSERT ON appointments BEGIN" + _DAILY_STATS_ADD.format(r="new") + " END",
+    "appointments_stats_delete": "AFTER DELETE ON appointments BEGIN" + _DAILY_STATS_SUBTRACT.format(r="old") + " END",
+    "appointments_stats_update": (
+        "AFTER UPDATE OF doctor_id, date, duration, status ON appointments BEGIN"
+        + _DAILY_STATS_SUBTRACT.format(r="old") + _DAILY_STATS_ADD.format(r="new") + " END"
+    ),
+}
+
+
+def _init_daily_stats(cur) -> None:
+    existed = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'appointment_daily_stats'").fetchone()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointment_daily_stats (
+            doctor_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            booked_minutes INTEGER NOT NULL DEFAULT 0,
+            pending INTEGER NOT NULL DEFAULT 0,
+            confirmed INTEGER NOT NULL DEFAULT 0,
+            cancelled INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (doctor_id, date)
+        )
+    """)
+    for name, body in _DAILY_STATS_TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    if not existed:
+        cur.execute("""
+            INSERT INTO appointment_daily_stats (doctor_id, date, booked_minutes, pending, confirmed, cancelled)
+            SELECT doctor_id, date,
+                   SUM(CASE WHEN status != 'cancelled' THEN duration ELSE 0 END),
+                   SUM(status = 'pending'), SUM(status = 'confirmed'), SUM(status = 'cancelled')
+            FROM appointments GROUP BY doctor_id, date
+        """)
+
+
+def get_daily_stats(start_date: str, end_date: str, doctor_id: Optional[str] = None):
+    """Per doctor per day summary rows between two dates (inclusive)."""
+    conn = get_conn()
+    if doctor_id:
+        return conn.execute("""
+            SELECT * FROM appointment_daily_stats
+            WHERE doctor_id = ? AND date BETWEEN ? AND ? ORDER BY date
+        """, (doctor_id, start_date, end_date)).fetchall()
+    return conn.execute("""
+        SELECT * FROM appointment_daily_stats WHERE date BETWEEN ? AND ? ORDER BY date
+    """, (start_date, end_date)).fetchall()
+
+
+def get_stats_by_day(start_date: str, end_date: str):
+    """Clinic-wide totals per day, summed from the daily summaries."""
+    conn = get_conn()
+    return conn.execute("""
+        SELECT date, SUM(booked_minutes) AS booked_minutes, SUM(pending) AS pending,
+               SUM(confirmed) AS confirmed, SUM(cancelled) AS cancelled,
+               COUNT(*) AS doctors
+        FROM appointment_daily_stats WHERE date BETWEEN ? AND ?
+        GROUP BY date ORDER BY date
+    """, (start_date, end_date)).fetchall()
+
+
+def get_stats_by_doctor(start_date: str, end_date: str):
+    """Totals per doctor over a date range, with the doctor's name and specialization."""
+    conn = get_conn()
+    return conn.execute(f"""
+        SELECT {TEMP_SORT_OK} s.doctor_id, u.name, u.specialization,
+               SUM(s.booked_minutes) AS booked_minutes, SUM(s.pending) AS pending,
+               SUM(s.confirmed) AS confirmed, SUM(s.cancelled) AS cancelled,
+               COUNT(*) AS active_days
+        FROM appointment_daily_stats s LEFT JOIN users u ON u.id = s.doctor_id
+        WHERE s.date BETWEEN ? AND ?
+        GROUP BY s.doctor_id ORDER BY booked_minutes DESC
+    """, (start_date, end_date)).fetchall()
+
+# --- Calendar ranges ---
+# Week and month views need per-day totals for a whole range, and each range is
+# one statement. For a doctor, a recursive CTE lists every date of the range and
+# is joined with appointment_daily_stats (which also counts archived rows) and
+# with the doctor's weekly template and exceptions, so working hours come back
+# with the counts. For a patient, their appointments are grouped by date in
+# index order. Day details are loaded separately, for the day the user opens.
+CALENDAR_MAX_DAYS = 62
+
+
+def _calendar_span(start_date: str, end_date: str) -> int:
+    days = (date_type.fromisoformat(end_date) - date_type.fromisoformat(start_date)).days + 1
+    if not 0 < days <= CALENDAR_MAX_DAYS:
+        raise ValueError(f"calendar range must cover 1 to {CALENDAR_MAX_DAYS} days")
+    return days
+
+
+def get_doctor_calendar(doctor_id: str, start_date: str, end_date: str) -> List[dict]:
+    """
+    One dict per date from start_date to end_date (inclusive, at most
+    CALENDAR_MAX_DAYS) with the day's pending/confirmed/cancelled counts,
+    booked_minutes, working_minutes (0 on a day off), slots (visits of the
+    doctor's slot length that fit those hours), free_minutes and occupancy
+    (booked / working minutes, None on a day off). Doctors without a weekly
+    schedule are counted as working SCHEDULE_DEFAULT_HOURS with no slot grid.
+    """
+    _calendar_span(start_date, end_date)
+    rows = get_conn().execute("""
+        WITH RECURSIVE days(date) AS (
+            SELECT date(?) UNION ALL SELECT date(date, '+1 day') FROM days WHERE date < ?
+        )
+        SELECT days.date,
+               COALESCE(s.booked_minutes, 0) AS booked_minutes, COALESCE(s.pending, 0) AS pending,
+               COALESCE(s.confirmed, 0) AS confirmed, COALESCE(s.cancelled, 0) AS cancelled,
+               CASE WHEN e.date IS NULL THEN w.start_time ELSE e.start_time END AS start_time,
+               CASE WHEN e.date IS NULL THEN w.end_time ELSE e.end_time END AS end_time,
+               CASE WHEN e.date IS NULL THEN w.slot_minutes ELSE e.slot_minutes END AS slot_minutes,
+               e.date IS NOT NULL AS has_exception,
+               (SELECT COUNT(*) FROM availability WHERE doctor_id = ?) AS weekly_days
+        FROM days
+        LEFT JOIN appointment_daily_stats s ON s.doctor_id = ? AND s.date = days.date
+        LEFT JOIN availability_exceptions e ON e.doctor_id = ? AND e.date = days.date
+        LEFT JOIN availability w ON w.doctor_id = ?
+                                AND w.weekday = (CAST(strftime('%w', days.date) AS INTEGER) + 6) % 7
+    """, (start_date, end_date, doctor_id, doctor_id, doctor_id, doctor_id)).fetchall()
+    default_start, default_end = (time_str_to_minutes(t) for t in SCHEDULE_DEFAULT_HOURS)
+    calendar = []
+    for r in rows:
+        # Same precedence as _load_day_hours(): exception, then template, else unrestricted.
+        if not r["has_exception"] and not r["weekly_days"]:
+            working, slot = default_end - default_start, None
+        elif r["start_time"] and r["end_time"]:
+            working = max(time_str_to_minutes(r["end_time"]) - time_str_to_minutes(r["start_time"]), 0)
+            slot = r["slot_minutes"]
+        else:
+            working, slot = 0, None  # day off
+        booked = r["booked_minutes"]
+        calendar.append({
+            "date": r["date"],
+            "pending": r["pending"],
+            "confirmed": r["confirmed"],
+            "cancelled": r["cancelled"],
+            "booked_minutes": booked,
+            "working_minutes": working,
+            "slots": working // slot if slot else None,
+            "free_minutes": max(working - booked, 0),
+            "occupancy": booked / working if working else None,
+        })
+    return calendar
+
+
+def get_patient_calendar(patient_id: str, start_date: str, end_date: str, include_archive: bool = False):
+    """
+    Per-date totals of a patient's appointments between two dates (inclusive,
+    at most CALENDAR_MAX_DAYS): date, appointments, pending, confirmed,
+    cancelled and booked_minutes. Dates without appointments are left out.
+    """
+    _calendar_span(start_date, end_date)
+    source = "appointments WHERE patient_id = ? AND date BETWEEN ? AND ?"
+    params = [patient_id, start_date, end_date]
+    if include_archive:
+        # The union comes back unordered; a patient's month is a handful of rows to group.
+        source = (f"(SELECT date, status, duration FROM {source} UNION ALL "
+                  f"SELECT date, status, duration FROM appointments_archive "
+                  f"WHERE patient_id = ? AND date BETWEEN ? AND ?)")
+        params *= 2
+    return get_conn().execute(f"""
+        SELECT {TEMP_SORT_OK if include_archive else ""} date, COUNT(*) AS appointments,
+               SUM(status = 'pending') AS pending, SUM(status = 'confirmed') AS confirmed,
+               SUM(status = 'cancelled') AS cancelled,
+               SUM(CASE WHEN status != 'cancelled' THEN duration ELSE 0 END) AS booked_minutes
+        FROM {source}
+        GROUP BY date ORDER BY date
+    """, params).fetchall()
+
+# --- Doctor full-text search ---
+# doctors_fts indexes doctors' name, specialization and contact straight from the
+# users table (external content, keyed by users.rowid); the triggers keep it in
+# step with every insert, update and delete. Builds of SQLite without FTS5 fall
+# back to LIKE matching.
+FTS_ENABLED = True
+DOCTOR_SEARCH_LIMIT = 20
+DOCTOR_SEARCH_COLUMNS = ("id", "name", "specialization", "experience", "contact", "photo_path")
+
+_DOCTOR_FTS_TRIGGERS = {
+    "users_fts_insert": """
+        AFTER INSERT ON users WHEN new.role = 'doctor' BEGIN
+            INSERT INTO doctors_fts(rowid, name, specialization, contact)
+            VALUES (new.rowid, new.name, new.specialization, new.contact);
+        END""",
+    "users_fts_delete": """
+        AFTER DELETE ON users WHEN old.role = 'doctor' BEGIN
+            INSERT INTO doctors_fts(doctors_fts, rowid, name, specialization, contact)
+            VALUES ('delete', old.rowid, old.name, old.specialization, old.contact);
+        END""",
+    # One trigger so the old entry is always removed before the new one is added.
+    "users_fts_update": """
+        AFTER UPDATE OF name, specialization, contact, role ON users BEGIN
+            INSERT INTO doctors_fts(doctors_fts, rowid, name, specialization, contact)
+            SELECT 'delete', old.rowid, old.name, old.specialization, old.contact WHERE old.role = 'doctor';
+            INSERT INTO doctors_fts(rowid, name, specialization, contact)
+            SELECT new.rowid, new.name, new.specialization, new.contact WHERE new.role = 'doctor';
+        END""",
+}
+
+
+def _init_doctor_search(cur) -> None:
+    global FTS_ENABLED
+    existed = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doctors_fts'").fetchone()
+    try:
+        cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS doctors_fts USING fts5(
+                name, specialization, contact,
+                content='users', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        FTS_ENABLED = False  # no fts5 module in this SQLite build
+        return
+    # Default ranking: a name hit weighs most, then specialization, then contact.
+    # Ordering by the built-in rank column lets FTS5 sort without a temp b-tree.
+    cur.execute("INSERT INTO doctors_fts(doctors_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 1.0)')")
+    for name, body in _DOCTOR_FTS_TRIGGERS.items():
+        cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    if not existed:
+        cur.execute("""
+            INSERT INTO doctors_fts(rowid, name, specialization, contact)
+            SELECT rowid, name, specialization, contact FROM users WHERE role = 'doctor'
+        """)
+
+
+def _fts_query(text: str) -> str:
+    # Every word must match as a prefix; quoting keeps words like OR/NOT literal.
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", text))
+
+
+def search_doctors(text: Optional[str], limit: int = DOCTOR_SEARCH_LIMIT):
+    """
+    Doctors whose name, specialization or contact contain words starting with
+    each word of `text`, best match first (name weighs most). An empty query
+    lists doctors by name. Password hashes are never selected. Results are
+    served from the user read cache.
+    """
+    return _cached_user_read(("search", (text or "").strip().lower(), limit),
+                             lambda: _search_doctors(text, limit))
+
+
+def _search_doctors(text: Optional[str], limit: int):
+    conn = get_conn()
+    cols = ", ".join(f"u.{c}" for c in DOCTOR_SEARCH_COLUMNS)
+    query = _fts_query(text or "")
+    if not query:
+        return conn.execute(f"""
+            SELECT {cols} FROM users u WHERE u.role = 'doctor' ORDER BY u.name, u.id LIMIT ?
+        """, (limit,)).fetchall()
+    if not FTS_ENABLED:
+        like = f"%{text.strip()}%"
+        return conn.execute(f"""
+            SELECT {cols} FROM users u
+            WHERE u.role = 'doctor' AND (u.name LIKE ? OR u.specialization LIKE ? OR u.contact LIKE ?)
+            ORDER BY u.name, u.id LIMIT ?
+        """, (like, like, like, limit)).fetchall()
+    return conn.execute(f"""
+        SELECT {cols} FROM doctors_fts f JOIN users u ON u.rowid = f.rowid
+        WHERE doctors_fts MATCH ?
+        ORDER BY f.rank LIMIT ?
+    """, (query, limit)).fetchall()
+
+# --- Schema migrations ---
+# Ordered steps; schema_version records which ones a database has had, so
+# migrate() only runs what is new. Every step is idempotent, which also lets
+# databases created before versioning existed upgrade in place. New steps go
+# at the end with the next version number; never renumber or edit an applied one.
+def _move_photos_to_store(cur) -> None:
+    # Photos uploaded before photos.py existed sit at data/photos/<random>_<name>.
+    # Copy each into the store (the old file is left in place) and repoint the user.
+    from photos import is_stored, store_photo
+    for row in cur.execute("SELECT id, photo_path FROM users WHERE photo_path IS NOT NULL").fetchall():
+        if is_stored(row["photo_path"]) or not os.path.exists(row["photo_path"]):
+            continue
+        with open(row["photo_path"], "rb") as f:
+            path = store_photo(f.read(), row["photo_path"])
+        cur.execute("UPDATE users SET photo_path = ? WHERE id = ?", (path, row["id"]))
+
+
+def _create_archive(cur) -> None:
+    # Same columns as appointments, no foreign keys (rows only ever arrive by
+    # archive_appointments()), and the listing indexes so read-through queries
+    # merge both tables in index order. The stats triggers add archived rows back
+    # as they land, so moving a row leaves appointment_daily_stats unchanged.
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS appointments_archive (
+            id TEXT PRIMARY KEY,
+            doctor_id TEXT NOT NULL,
+            patient_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            time TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            notes TEXT
+        )
+    """)
+    for name, target in ARCHIVE_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS appointments_archive_stats_insert AFTER INSERT ON "
+                "appointments_archive BEGIN" + _DAILY_STATS_ADD.format(r="new") + " END")
+    cur.execute("CREATE TRIGGER IF NOT EXISTS appointments_archive_stats_delete AFTER DELETE ON "
+                "appointments_archive BEGIN" + _DAILY_STATS_SUBTRACT.format(r="old") + " END")
+
+
+# Integer twins of date/time/duration: start_min and end_min are minutes since
+# 1970-01-01 00:00 (utils.epoch_minute). Triggers derive them whenever a row is
+# inserted without them or its date, time or duration changes, so every write
+# path keeps them in step; bulk writers that already know them may supply them.
+# An appointment never runs past midnight, so anything overlapping [a, b)
+# starts in (a - MINUTES_PER_DAY, b): a bounded index range on start_min.
+BACKFILL_BATCH_ROWS = 20000
+_EPOCH_MINUTE_SQL = ("(CAST(julianday({r}.date) - 2440587.5 AS INTEGER) * 1440"
+                     " + CAST(substr({r}.time, 1, instr({r}.time, ':') - 1) AS INTEGER) * 60"
+                     " + CAST(substr({r}.time, instr({r}.time, ':') + 1) AS INTEGER))")
+
+
+def _minute_triggers(table: str) -> Dict[str, str]:
+    start = _EPOCH_MINUTE_SQL.format(r="new")
+    body = f"BEGIN UPDATE {table} SET start_min = {start}, end_min = {start} + new.duration WHERE rowid = new.rowid; END"
+    return {
+        f"{table}_minutes_insert": f"AFTER INSERT ON {table} WHEN new.start_min IS NULL {body}",
+        f"{table}_minutes_update": f"AFTER UPDATE OF date, time, duration ON {table} {body}",
+    }
+
+
+def _add_minute_columns(cur) -> None:
+    # Existing rows are filled by the _backfill_minute_columns() step, in
+    # batches, so this migration only touches the schema.
+    for table in ("appointments", "appointments_archive"):
+        have = {row["name"] for row in cur.execute(f"PRAGMA table_info({table})").fetchall()}
+        for column in MINUTE_COLUMNS:
+            if column not in have:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+        for name, body in _minute_triggers(table).items():
+            cur.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+    for name, target in MINUTE_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+def _backfill_minute_columns(conn: sqlite3.Connection) -> int:
+    """
+    Fill start_min/end_min of rows written before they existed, at most
+    BACKFILL_BATCH_ROWS per write transaction, walking the NULLs in rowid
+    order. Rows whose date or time cannot be parsed stay NULL and are not
+    counted. Returns the number of rows filled.
+    """
+    filled = 0
+    for table in ("appointments", "appointments_archive"):
+        start = _EPOCH_MINUTE_SQL.format(r=table)
+        last = -1
+        while True:
+            with _write_lock, _immediate_transaction(conn):
+                rowids = [r[0] for r in conn.execute(f"""
+                    SELECT rowid FROM {table} WHERE start_min IS NULL AND rowid > ?
+                    ORDER BY rowid LIMIT ?
+                """, (last, BACKFILL_BATCH_ROWS))]
+                if rowids:
+                    span = (rowids[0], rowids[-1])
+                    conn.execute(f"""
+                        UPDATE {table} SET start_min = {start}, end_min = {start} + duration
+                        WHERE rowid BETWEEN ? AND ? AND start_min IS NULL
+                    """, span)
+                    unparsed = conn.execute(f"""
+                        SELECT COUNT(*) FROM {table} WHERE rowid BETWEEN ? AND ? AND start_min IS NULL
+                    """, span).fetchone()[0]
+                    filled += len(rowids) - unparsed
+            if len(rowids) < BACKFILL_BATCH_ROWS:
+                break
+            last = rowids[-1]
+    return filled
+
+
+MIGRATIONS = (
+    (1, "users and appointments tables", _create_core_tables),
+    (2, "availability schedules", _create_availability_tables),
+    (3, "daily appointment stats", _init_daily_stats),
+    (4, "listing indexes", _create_indexes),
+    (5, "doctor full-text search", _init_doctor_search),
+    (6, "move profile photos into the photo store", _move_photos_to_store),
+    (7, "appointment archive", _create_archive),
+    (8, "integer start/end minute columns", _add_minute_columns),
+    (9, "status listing index", _create_indexes),
+    (10, "fill start/end minutes of existing appointments", _backfill_minute_columns),
+)
+# Steps that take the connection and commit in batches of their own. They must
+# be safe to rerun: an interrupted one is recorded only once it has finished.
+_BATCHED_STEPS = (_backfill_minute_columns,)
+
+
+def _applied_versions(conn: sqlite3.Connection) -> set:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    return {row["version"] for row in conn.execute("SELECT version FROM schema_version").fetchall()}
+
+
+def schema_version() -> int:
+    """Highest migration version applied to DB_PATH (0 for an empty database)."""
+    return max(_applied_versions(get_conn()), default=0)
+
+
+def pending_migrations() -> List[Tuple[int, str]]:
+    """(version, description) of the migrations DB_PATH has not had yet."""
+    applied = _applied_versions(get_conn())
+    return [(version, description) for version, description, _ in MIGRATIONS if version not in applied]
+
+
+def migrate(target: Optional[int] = None) -> List[int]:
+    """
+    Apply pending migrations in order, up to and including `target` (default:
+    all). Each runs in its own transaction together with its schema_version row,
+    so a failure leaves the database at the last good version; _BATCHED_STEPS
+    record their row after their last batch. Returns the versions applied by
+    this call.
+    """
+    global FTS_ENABLED
+    conn = get_conn()
+    applied = []
+    with _write_lock:
+        done = _applied_versions(conn)
+        conn.commit()
+        for version, description, step in MIGRATIONS:
+            if target is not None and version > target:
+                break
+            if version in done:
+                continue
+            if step in _BATCHED_STEPS:
+                step(conn)
+                with _immediate_transaction(conn):
+                    conn.execute("INSERT OR IGNORE INTO schema_version (version, description, applied_at) "
+                                 "VALUES (?, ?, datetime('now'))", (version, description))
+                applied.append(version)
+                continue
+            with _immediate_transaction(conn):
+                # Another process may have applied it since we looked.
+                if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                    continue
+                step(conn.cursor())
+                conn.execute("INSERT INTO schema_version (version, description, applied_at) "
+                             "VALUES (?, ?, datetime('now'))", (version, description))
+            applied.append(version)
+        if applied:
+            invalidate_user_cache()
+        FTS_ENABLED = bool(conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'doctors_fts'").fetchone())
+    return applied
+
+
+def init_db():
+    """Bring DB_PATH up to the latest schema (see migrate())."""
+    migrate()
+
+# --- User read cache ---
+# Users change rarely but are read on every rerun, so lookups by id/email, the
+# doctor list and doctor searches are served from a bounded LRU with a TTL.
+# Every write to users bumps _users_generation after committing; entries from an
+# older generation are never returned. The TTL bounds staleness from writes made
+# by other processes, which this process cannot see.
+USER_CACHE_MAX_ENTRIES = 2048
+USER_CACHE_TTL_SECONDS = 300.0
+_users_generation = 0
+_user_cache: "OrderedDict[tuple, Tuple[int, float, object]]" = OrderedDict()
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _copy_rows(value):
+    # Records are immutable; only the list holding them needs copying.
+    return list(value) if isinstance(value, list) else value
+
+
+def _cached_user_read(key: tuple, loader):
+    if _current_unit() is not None:
+        return loader()  # may see the unit's uncommitted rows; keep them out of the cache
+    key = (DB_PATH,) + key
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(key)
+        if entry is not None and entry[0] == _users_generation and entry[1] > now:
+            _user_cache.move_to_end(key)
+            _user_cache_stats["hits"] += 1
+            return _copy_rows(entry[2])
+        generation = _users_generation
+        _user_cache_stats["misses"] += 1
+    value = loader()
+    with _user_cache_lock:
+        if generation == _users_generation:  # no write committed while loading
+            _user_cache[key] = (generation, now + USER_CACHE_TTL_SECONDS, value)
+            _user_cache.move_to_end(key)
+            while len(_user_cache) > USER_CACHE_MAX_ENTRIES:
+                _user_cache.popitem(last=False)
+    return _copy_rows(value)
+
+
+def invalidate_user_cache() -> None:
+    """Call after any committed change to the users table."""
+    global _users_generation
+    with _user_cache_lock:
+        _users_generation += 1
+        _user_cache.clear()
+        _user_cache_stats["invalidations"] += 1
+
+
+def user_cache_stats() -> dict:
+    with _user_cache_lock:
+        stats = dict(_user_cache_stats)
+        stats["entries"] = len(_user_cache)
+        stats["generation"] = _users_generation
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
 
 # --- User CRUD ---
+@_grouped
 def add_user(user_id: str, name: str, email: str, password_hash: str, role: str,
              specialization: Optional[str] = None, experience: Optional[int] = None,
              contact: Optional[str] = None, photo_path: Optional[str] = None) -> None:
-    cur = _conn.cursor()
+    conn = get_conn()
+    cur = conn.cursor()
     cur.execute("""
         INSERT INTO users (id, name, email, password, role, specialization, experience, contact, photo_path)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     """, (user_id, name, email, password_hash, role, specialization, experience, contact, photo_path))
-    _conn.commit()
+    unit = _current_unit()
+    if unit is None:
+        conn.commit()
+        invalidate_user_cache()
+    elif invalidate_user_cache not in unit.after_commit:
+        unit.after_commit.append(invalidate_user_cache)
 
 def get_user_by_email(email: str):
-    cur = _conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email = ?", (email,))
-    return cur.fetchone()
+    def load():
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM users WHERE email = ?", (email,))
+        return cur.fetchone()
+    return _cached_user_read(("email", email), load)
 
 def get_user_by_id(uid: str):
-    cur = _conn.cursor()
-    cur.execute("SELECT * FROM users WHERE id = ?", (uid,))
-    return cur.fetchone()
+    def load():
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM users WHERE id = ?", (uid,))
+        return cur.fetchone()
+    return _cached_user_read(("id", uid), load)
 
 def get_all_users():
-    cur = _conn.cursor()
-    cur.execute("SELECT * FROM users ORDER BY role, name")
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute(f"SELECT {FULL_SCAN_OK} * FROM users ORDER BY role, name")
     return cur.fetchall()
 
 def list_doctors(filter_text: Optional[str] = None):
-    cur = _conn.cursor()
-    if filter_text:
+    conn = get_conn()
+    cur = conn.cursor()
+    if filter_text and FTS_ENABLED and _fts_query(filter_text):
+        cur.execute("""
+            SELECT u.* FROM doctors_fts f JOIN users u ON u.rowid = f.rowid
+            WHERE doctors_fts MATCH ?
+            ORDER BY f.rank
+        """, (_fts_query(filter_text),))
+    elif filter_text:
         like = f"%{filter_text}%"
         cur.execute("""
             SELECT * FROM users
@@ -92,78 +1069,1409 @@ def list_doctors(filter_text: Optional[str] = None):
     return cur.fetchall()
 
 def get_all_doctors():
-    return list_doctors(None)
+    return _cached_user_read(("all_doctors",), lambda: list_doctors(None))
+
+# --- Per-day interval index ---
+# (DB_PATH, doctor_id, date) -> DayIntervals of non-cancelled appointments, loaded lazily
+# from the DB and kept current by the write helpers below. _write_lock serializes
+# writers in this process. _cache_lock guards only the index and the hours cache
+# for the dict operations themselves, never across a query, so readers wait
+# neither for writers nor for each other's loads. A cached DayIntervals is never
+# changed in place; writers publish an updated copy and bump _cache_generation,
+# and a reader publishes a day it loaded only if the generation has not moved
+# meanwhile (otherwise its load may predate the write and is returned uncached).
+# Days loaded or changed inside an open transaction() may show its bookings to
+# other readers before the commit; a rollback evicts them. Writes from other
+# processes are not seen here, so book_appointments() confirms a free slot
+# against the database inside its write transaction before inserting; call
+# reset_interval_index() to refresh suggestions and views after something else
+# writes to the file.
+INTERVAL_INDEX_MAX_DAYS = 4096
+_interval_index: "OrderedDict[Tuple[str, str, str], DayIntervals]" = OrderedDict()
+_write_lock = query_stats.TimedLock("write lock")
+_cache_lock = threading.Lock()
+_cache_generation = 0
+
+
+def reset_interval_index() -> None:
+    _evict_days(lambda key: True)
+
+
+def _evict_days(match) -> None:
+    """Drop the cached doctor-days whose key satisfies match(key)."""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for key in [k for k in _interval_index if match(k)]:
+            del _interval_index[key]
+
+
+def get_day_intervals(doctor_id: str, date_str: str) -> DayIntervals:
+    """Sorted interval index of a doctor's non-cancelled appointments on date_str."""
+    key = (DB_PATH, doctor_id, date_str)
+    with _cache_lock:
+        day = _interval_index.get(key)
+        if day is not None:
+            _interval_index.move_to_end(key)
+            return day
+        generation = _cache_generation
+    day = _load_day_intervals(doctor_id, date_str)
+    with _cache_lock:
+        if generation == _cache_generation:
+            day = _interval_index.setdefault(key, day)
+            if len(_interval_index) > INTERVAL_INDEX_MAX_DAYS:
+                _interval_index.popitem(last=False)
+    _unit_touch_day(key)
+    return day
+
+
+def _load_day_intervals(doctor_id: str, date_str: str) -> DayIntervals:
+    base = epoch_day(date_str) * MINUTES_PER_DAY
+    rows = get_conn().execute("""
+        SELECT id, start_min - ? AS start, end_min - start_min AS duration FROM appointments
+        WHERE doctor_id = ? AND start_min >= ? AND start_min < ? AND status != 'cancelled'
+    """, (base, doctor_id, base, base + MINUTES_PER_DAY)).fetchall()
+    return DayIntervals.from_minutes(rows)
+
+
+def _unit_touch_day(key: Tuple[str, str, str]) -> None:
+    unit = _current_unit()
+    if unit is not None:
+        unit.days.add(key)
+
+
+def _index_add(doctor_id: str, date_str: str, app_id: str, time_str: str, duration: int, status: str) -> None:
+    if status == 'cancelled':
+        _index_update(doctor_id, date_str, lambda day: day.remove(app_id))
+    else:
+        _index_update(doctor_id, date_str,
+                      lambda day: day.add(app_id, time_str_to_minutes(time_str), int(duration)))
+
+
+def _index_remove(doctor_id: str, date_str: str, app_id: str) -> None:
+    _index_update(doctor_id, date_str, lambda day: day.remove(app_id))
+
+
+def _index_update(doctor_id: str, date_str: str, change) -> None:
+    # Readers may hold the cached day, so change a copy and publish that.
+    global _cache_generation
+    key = (DB_PATH, doctor_id, date_str)
+    _unit_touch_day(key)
+    with _cache_lock:
+        _cache_generation += 1
+        day = _interval_index.get(key)
+        if day is None:
+            return  # not loaded; the next get_day_intervals() reads it from the DB
+        day = day.copy()
+        change(day)
+        _interval_index[key] = day
+
+
+# --- Availability schedules ---
+# A doctor with no weekly template is bookable at any time (the pre-schedule
+# behaviour). Once a template exists, weekdays without a row are days off. An
+# exception row replaces the template for one date; NULL times mean "day off".
+# Working hours per doctor-day are cached as a minute bitmap next to the busy
+# bitmap of DayIntervals, so a slot test is two AND operations.
+UNRESTRICTED_HOURS = (0, MINUTES_PER_DAY, None)
+_hours_cache: "OrderedDict[Tuple[str, str, str], Tuple[Optional[Tuple[int, int, Optional[int]]], int]]" = OrderedDict()
+
+
+def _invalidate_hours(doctor_id: str) -> None:
+    unit = _current_unit()
+    if unit is not None:
+        unit.doctors.add(doctor_id)  # in-unit reloads may see uncommitted hours
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        for key in [k for k in _hours_cache if k[1] == doctor_id]:
+            del _hours_cache[key]
+
+
+@_grouped
+def set_weekly_availability(doctor_id: str, weekday: int, start_time: str, end_time: str,
+                            slot_minutes: int) -> None:
+    """weekday: 0 = Monday … 6 = Sunday; times 'HH:MM'."""
+    conn = get_conn()
+    conn.execute("""
+        INSERT OR REPLACE INTO availability (doctor_id, weekday, start_time, end_time, slot_minutes)
+        VALUES (?, ?, ?, ?, ?)
+    """, (doctor_id, weekday, start_time, end_time, slot_minutes))
+    _commit(conn)
+    _invalidate_hours(doctor_id)
+
+@_grouped
+def clear_weekly_availability(doctor_id: str, weekday: int) -> None:
+    conn = get_conn()
+    conn.execute("DELETE FROM availability WHERE doctor_id = ? AND weekday = ?", (doctor_id, weekday))
+    _commit(conn)
+    _invalidate_hours(doctor_id)
+
+def get_weekly_availability(doctor_id: str):
+    conn = get_conn()
+    cur = conn.cursor()
+    cur.execute("SELECT * FROM availability WHERE doctor_id = ? ORDER BY weekday", (doctor_id,))
+    return cur.fetchall()
+
+@_grouped
+def set_availability_exception(doctor_id: str, date_str: str, start_time: Optional[str] = None,
+                               end_time: Optional[str] = None, slot_minutes: Optional[int] = None) -> None:
+    """Override one date. Leave start_time/end_time as None to mark a day off."""
+    conn = get_conn()
+    conn.execute("""
+        INSERT OR REPLACE INTO availability_exceptions (doctor_id, date, start_time, end_time, slot_minutes)
+        VALUES (?, ?, ?, ?, ?)
+    """, (doctor_id, date_str, start_time, end_time, slot_minutes))
+    _commit(conn)
+    _invalidate_hours(doctor_id)
+
+@_grouped
+def delete_availability_exception(doctor_id: str, date_str: str) -> None:
+    conn = get_conn()
+    conn.execute("DELETE FROM availability_exceptions WHERE doctor_id = ? AND date = ?", (doctor_id, date_str))
+    _commit(conn)
+    _invalidate_hours(doctor_id)
+
+def get_availability_exceptions(doctor_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    conn = get_conn()
+    cur = conn.cursor()
+    if start_date and end_date:
+        cur.execute("""
+            SELECT * FROM availability_exceptions
+            WHERE doctor_id = ? AND date BETWEEN ? AND ?
+            ORDER BY date
+        """, (doctor_id, start_date, end_date))
+    else:
+        cur.execute("SELECT * FROM availability_exceptions WHERE doctor_id = ? ORDER BY date", (doctor_id,))
+    return cur.fetchall()
+
+
+def _load_day_hours(doctor_id: str, date_str: str) -> Optional[Tuple[int, int, Optional[int]]]:
+    conn = get_conn()
+    exc = conn.execute("SELECT * FROM availability_exceptions WHERE doctor_id = ? AND date = ?",
+                       (doctor_id, date_str)).fetchone()
+    if exc:
+        if not exc["start_time"] or not exc["end_time"]:
+            return None
+        return (time_str_to_minutes(exc["start_time"]), time_str_to_minutes(exc["end_time"]),
+                exc["slot_minutes"])
+    weekly = get_weekly_availability(doctor_id)
+    if not weekly:
+        return UNRESTRICTED_HOURS
+    weekday = date_type.fromisoformat(date_str).weekday()
+    for row in weekly:
+        if row["weekday"] == weekday:
+            return (time_str_to_minutes(row["start_time"]), time_str_to_minutes(row["end_time"]),
+                    row["slot_minutes"])
+    return None
+
+
+def _day_hours_entry(doctor_id: str, date_str: str):
+    key = (DB_PATH, doctor_id, date_str)
+    with _cache_lock:
+        entry = _hours_cache.get(key)
+        if entry is not None:
+            _hours_cache.move_to_end(key)
+            return entry
+        generation = _cache_generation
+    hours = _load_day_hours(doctor_id, date_str)
+    mask = minute_mask(hours[0], max(hours[1] - hours[0], 0)) if hours else 0
+    entry = (hours, mask)
+    with _cache_lock:
+        if generation == _cache_generation:
+            entry = _hours_cache.setdefault(key, entry)
+            if len(_hours_cache) > INTERVAL_INDEX_MAX_DAYS:
+                _hours_cache.popitem(last=False)
+    return entry
+
+
+def get_day_hours(doctor_id: str, date_str: str) -> Optional[Tuple[int, int, Optional[int]]]:
+    """
+    (start_minute, end_minute, slot_minutes) the doctor works on date_str, or None
+    for a day off. slot_minutes is None when no schedule has been set up.
+    """
+    return _day_hours_entry(doctor_id, date_str)[0]
+
+
+def get_free_mask(doctor_id: str, date_str: str) -> int:
+    """Minute bitmap of the doctor's bookable (working and not booked) time that day."""
+    return _day_hours_entry(doctor_id, date_str)[1] & ~get_day_intervals(doctor_id, date_str).busy_mask
+
+
+def is_slot_available(doctor_id: str, date_str: str, time_str: str, duration: int) -> bool:
+    want = minute_mask(time_str_to_minutes(time_str), duration)
+    return get_free_mask(doctor_id, date_str) & want == want
+
+
+def available_slots(doctor_id: str, date_str: str, duration: int) -> Optional[List[str]]:
+    """
+    Free 'HH:MM' starts on the doctor's slot grid that fit `duration`, or None
+    when the doctor has no schedule (any time may be requested).
+    """
+    hours = get_day_hours(doctor_id, date_str)
+    if hours is None:
+        return []
+    start, end, slot = hours
+    if slot is None:
+        return None
+    free = get_free_mask(doctor_id, date_str)
+    want = minute_mask(0, duration)
+    slots = []
+    for t in generate_slots(minutes_to_time_str(start), minutes_to_time_str(end), slot):
+        if (free >> time_str_to_minutes(t)) & want == want:
+            slots.append(t)
+    return slots
+
 
 # --- Appointment CRUD ---
+@_grouped
 def create_appointment(app_id: str, doctor_id: str, patient_id: str, date: str, time: str,
                        duration: int, status: str = 'pending', notes: str = '') -> None:
-    cur = _conn.cursor()
-    cur.execute("""
-        INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (app_id, doctor_id, patient_id, date, time, duration, status, notes))
-    _conn.commit()
+    with _write_lock:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (app_id, doctor_id, patient_id, date, time, duration, status, notes))
+        _commit(conn)
+        _index_add(doctor_id, date, app_id, time, duration, status)
 
+@_grouped
 def update_appointment_status(app_id: str, status: str) -> None:
-    cur = _conn.cursor()
-    cur.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, app_id))
-    _conn.commit()
+    with _write_lock:
+        conn = get_conn()
+        cur = conn.cursor()
+        cur.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, app_id))
+        row = cur.execute("SELECT doctor_id, date, time, duration FROM appointments WHERE id = ?",
+                          (app_id,)).fetchone()
+        _commit(conn)
+        if row:
+            _index_add(row["doctor_id"], row["date"], app_id, row["time"], row["duration"], status)
 
+@_grouped
 def delete_appointment(app_id: str) -> None:
-    cur = _conn.cursor()
-    cur.execute("DELETE FROM appointments WHERE id = ?", (app_id,))
-    _conn.commit()
+    with _write_lock:
+        conn = get_conn()
+        cur = conn.cursor()
+        row = cur.execute("SELECT doctor_id, date FROM appointments WHERE id = ?", (app_id,)).fetchone()
+        cur.execute("DELETE FROM appointments WHERE id = ?", (app_id,))
+        _commit(conn)
+        if row:
+            _index_remove(row["doctor_id"], row["date"], app_id)
+
+def _projection(columns: Optional[Iterable[str]]) -> str:
+    """SELECT list for an appointments query; only known column names are accepted."""
+    if not columns:
+        return "*"
+    unknown = [c for c in columns if c not in APPOINTMENT_COLUMNS and c not in MINUTE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown appointment columns: {unknown}")
+    return ", ".join(columns)
+
+def _appointments_query(columns: Optional[Iterable[str]], where: str, params: Iterable, order: str,
+                        include_archive: bool) -> Tuple[str, list]:
+    """
+    SELECT over the hot table, or with include_archive a UNION ALL with
+    appointments_archive that SQLite merges in index order. A compound ORDER BY
+    must name result columns, so the sort columns are then always selected.
+    """
+    params = list(params)
+    if not include_archive:
+        return f"SELECT {_projection(columns)} FROM appointments {where} ORDER BY {order}", params
+    if columns:
+        columns = list(columns)
+        columns += [c for c in (key.strip() for key in order.split(",")) if c not in columns]
+    select = _projection(columns)
+    return (f"SELECT {select} FROM appointments {where} UNION ALL "
+            f"SELECT {select} FROM appointments_archive {where} ORDER BY {order}", params + params)
 
-def get_appointments_by_doctor(doctor_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
-    cur = _conn.cursor()
+def get_appointments_by_doctor(doctor_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                               columns: Optional[Iterable[str]] = None, include_archive: bool = False):
     if start_date and end_date:
-        cur.execute("""
-            SELECT * FROM appointments
-            WHERE doctor_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date, time
-        """, (doctor_id, start_date, end_date))
+        sql, params = _appointments_query(columns, "WHERE doctor_id = ? AND date BETWEEN ? AND ?",
+                                          (doctor_id, start_date, end_date), "date, time", include_archive)
     else:
-        cur.execute("SELECT * FROM appointments WHERE doctor_id = ? ORDER BY date, time", (doctor_id,))
-    return cur.fetchall()
+        sql, params = _appointments_query(columns, "WHERE doctor_id = ?", (doctor_id,), "date, time", include_archive)
+    return get_conn().execute(sql, params).fetchall()
 
-def get_appointments_by_patient(patient_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None):
-    cur = _conn.cursor()
+def get_appointments_by_patient(patient_id: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                columns: Optional[Iterable[str]] = None, include_archive: bool = False):
     if start_date and end_date:
-        cur.execute("""
-            SELECT * FROM appointments
-            WHERE patient_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date, time
-        """, (patient_id, start_date, end_date))
+        sql, params = _appointments_query(columns, "WHERE patient_id = ? AND date BETWEEN ? AND ?",
+                                          (patient_id, start_date, end_date), "date, time", include_archive)
     else:
-        cur.execute("SELECT * FROM appointments WHERE patient_id = ? ORDER BY date, time", (patient_id,))
-    return cur.fetchall()
+        sql, params = _appointments_query(columns, "WHERE patient_id = ?", (patient_id,), "date, time",
+                                          include_archive)
+    return get_conn().execute(sql, params).fetchall()
 
-def get_appointments_on(doctor_id: str, date_str: str):
-    cur = _conn.cursor()
-    cur.execute("SELECT * FROM appointments WHERE doctor_id = ? AND date = ? ORDER BY time", (doctor_id, date_str))
-    return cur.fetchall()
+def get_appointments_on(doctor_id: str, date_str: str, columns: Optional[Iterable[str]] = None,
+                        include_archive: bool = False):
+    sql, params = _appointments_query(columns, "WHERE doctor_id = ? AND date = ?", (doctor_id, date_str), "time",
+                                      include_archive)
+    return get_conn().execute(sql, params).fetchall()
+
+def get_all_appointments(columns: Optional[Iterable[str]] = None, include_archive: bool = False):
+    sql, params = _appointments_query(columns, FULL_SCAN_OK, (), "date, time", include_archive)
+    return get_conn().execute(sql, params).fetchall()
+
+def get_appointments_overlapping(start_date: str, start_time: str, end_date: str, end_time: str,
+                                 doctor_id: Optional[str] = None, columns: Optional[Iterable[str]] = None,
+                                 include_archive: bool = False):
+    """
+    Appointments of any status that overlap [start, end), optionally for one
+    doctor, ordered by start. An index range on start_min, no string parsing.
+    """
+    lo, hi = epoch_minute(start_date, start_time), epoch_minute(end_date, end_time)
+    where = "WHERE start_min > ? AND start_min < ? AND end_min > ?"
+    params = [lo - MINUTES_PER_DAY, hi, lo]
+    if doctor_id:
+        where = "WHERE doctor_id = ? AND " + where[len("WHERE "):]
+        params.insert(0, doctor_id)
+    sql, params = _appointments_query(columns, where, params, "start_min", include_archive)
+    return get_conn().execute(sql, params).fetchall()
+
+def find_conflicts(doctor_id: str, date_str: str, time_str: str, duration: int,
+                   exclude_id: Optional[str] = None) -> List[str]:
+    """Ids of the doctor's non-cancelled appointments overlapping the given slot, read from the database."""
+    lo = epoch_minute(date_str, time_str)
+    rows = get_conn().execute("""
+        SELECT id FROM appointments
+        WHERE doctor_id = ? AND start_min > ? AND start_min < ? AND end_min > ? AND status != 'cancelled'
+        ORDER BY start_min
+    """, (doctor_id, lo - MINUTES_PER_DAY, lo + int(duration), lo)).fetchall()
+    return [r["id"] for r in rows if r["id"] != exclude_id]
+
+
+# --- Appointment archive ---
+# Settled appointments (confirmed or cancelled) dated before a cutoff move to
+# appointments_archive in batches, so the hot table and its indexes stay small
+# enough to live in the page cache. The listing and export helpers read the hot
+# table unless asked for include_archive; analytics read appointment_daily_stats,
+# which counts both. Pending rows are never archived, and archived rows are not
+# seen by conflict checks, so the cutoff may not be in the future.
+ARCHIVE_AFTER_DAYS = 90
+ARCHIVE_BATCH_ROWS = 1000
+ARCHIVE_PAUSE_SECONDS = 0.005  # between batches, so queued writers get the lock
+ARCHIVED_STATUSES = ("confirmed", "cancelled")
+
+
+def archive_appointments(before_date: Optional[str] = None, batch_rows: int = ARCHIVE_BATCH_ROWS,
+                         max_batches: Optional[int] = None) -> int:
+    """
+    Move settled appointments dated before `before_date` (default:
+    ARCHIVE_AFTER_DAYS ago) to the archive, oldest first, `batch_rows` per
+    write transaction. The write lock is released for ARCHIVE_PAUSE_SECONDS
+    between batches, so a booking waits for at most one batch. Returns the
+    number of rows moved.
+    """
+    today = date_type.today()
+    before_date = before_date or (today - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    if before_date > today.isoformat():
+        raise ValueError("archive cutoff must not be in the future")
+    columns = ", ".join(APPOINTMENT_COLUMNS + MINUTE_COLUMNS)
+    # Both statements pick the same oldest batch_rows rows inside one transaction.
+    settled = f"""
+        FROM appointments WHERE date < ? AND status IN ({",".join("?" * len(ARCHIVED_STATUSES))})
+        ORDER BY date, time, id LIMIT ?
+    """
+    params = (before_date, *ARCHIVED_STATUSES, batch_rows)
+    conn = get_conn()
+    moved = batches = 0
+    while True:
+        with _write_lock, _immediate_transaction(conn):
+            count = conn.execute(f"INSERT INTO appointments_archive ({columns}) SELECT {columns} {settled}",
+                                 params).rowcount
+            conn.execute(f"DELETE FROM appointments WHERE id IN (SELECT id {settled})", params)
+            _commit(conn)
+            # Cached doctor-days before the cutoff reload from the hot table.
+            _evict_days(lambda key: key[0] == DB_PATH and key[2] < before_date)
+        moved += count
+        batches += 1
+        if count < batch_rows or batches == max_batches:
+            break
+        time.sleep(ARCHIVE_PAUSE_SECONDS)
+    return moved
+
+
+def archive_stats() -> dict:
+    """Row counts of the hot and archive tables and the archive's date range."""
+    conn = get_conn()
+    hot = conn.execute("SELECT COUNT(*) AS n FROM appointments").fetchone()["n"]
+    row = conn.execute("SELECT COUNT(*) AS n, MIN(date) AS first, MAX(date) AS last "
+                       "FROM appointments_archive").fetchone()
+    return {"hot": hot, "archived": row["n"], "archived_from": row["first"], "archived_to": row["last"]}
+
+# --- Columnar fetch ---
+def fetch_columns(sql: str, params: Iterable = (), as_arrays: bool = False) -> Dict[str, list]:
+    """
+    Run a query and return {column: values} straight from tuple rows, with no
+    per-row record. as_arrays=True returns NumPy arrays instead of lists.
+    """
+    cur = get_conn().cursor()
+    cur.row_factory = None
+    cur.execute(sql, tuple(params))
+    names = [col[0] for col in cur.description]
+    rows = cur.fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    if as_arrays:
+        import numpy as np
+        return {name: np.array(col) for name, col in zip(names, columns)}
+    return {name: list(col) for name, col in zip(names, columns)}
+
+
+def fetch_frame(sql: str, params: Iterable = ()):
+    """Run a query into a pandas DataFrame holding only the selected columns."""
+    import pandas as pd
+    cur = get_conn().cursor()
+    cur.row_factory = None
+    cur.execute(sql, tuple(params))
+    names = [col[0] for col in cur.description]
+    return pd.DataFrame.from_records(cur.fetchall(), columns=names)
+
+# --- Keyset pagination ---
+# Pages are addressed by the sort key of the last row shown, so fetching page N
+# is an index seek plus LIMIT no matter how many rows precede it. The first page
+# seeks from _KEY_START, which sorts before every key, so all pages of a
+# listing run the same statement.
+PAGE_SIZE = 50
+_KEY_START = ("", "", "")
+USER_LIST_COLUMNS = ("id", "name", "email", "role", "specialization", "experience", "contact")
+
+
+def get_users_page(after: Optional[Tuple[str, str, str]] = None, limit: int = PAGE_SIZE,
+                   role: Optional[str] = None, search: Optional[str] = None):
+    """
+    One page of users ordered by (role, name, id), without password hashes.
+    after: (role, name, id) of the last row of the previous page.
+    Returns (rows, next_after) where next_after is None on the last page.
+    """
+    clauses, params = [], []
+    if role:
+        clauses.append("role = ?")
+        params.append(role)
+    if search:
+        like = f"%{search}%"
+        clauses.append("(name LIKE ? OR email LIKE ?)")
+        params.extend([like, like])
+    after = after or _KEY_START
+    if role:
+        # role is fixed, so seek on the rest of the key to stay within the role's index range
+        clauses.append("(name, id) > (?, ?)")
+        params.extend(after[1:])
+    else:
+        clauses.append("(role, name, id) > (?, ?, ?)")
+        params.extend(after)
+    conn = get_conn()
+    rows = conn.execute(f"""
+        SELECT {', '.join(USER_LIST_COLUMNS)} FROM users WHERE {' AND '.join(clauses)}
+        ORDER BY role, name, id LIMIT ?
+    """, (*params, limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (last["role"], last["name"], last["id"])
+
+
+def _appointment_filters(doctor_id: Optional[str] = None, patient_id: Optional[str] = None,
+                         start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         statuses: Optional[Iterable[str]] = None, prefix: str = "") -> Tuple[List[str], list]:
+    """WHERE clauses and parameters for the optional listing filters; dates are inclusive."""
+    clauses, params = [], []
+    for column, value in (("doctor_id", doctor_id), ("patient_id", patient_id)):
+        if value:
+            clauses.append(f"{prefix}{column} = ?")
+            params.append(value)
+    if start_date:
+        clauses.append(f"{prefix}date >= ?")
+        params.append(start_date)
+    if end_date:
+        clauses.append(f"{prefix}date <= ?")
+        params.append(end_date)
+    statuses = list(statuses or [])
+    if statuses:
+        clauses.append(f"{prefix}status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    return clauses, params
+
+
+def _status_branches(statuses: Optional[Iterable[str]], prefix: str = "") -> List[Tuple[List[str], list]]:
+    """
+    One (clauses, params) pair per requested status, for pages merged from a
+    UNION ALL of index ranges on (status, date, time, id): a status IN (...)
+    filter would walk the (date, time, id) index past every other status.
+    No filter, or every status, is a single branch without clauses.
+    """
+    statuses = list(dict.fromkeys(statuses or []))
+    if not statuses or set(APPOINTMENT_STATUSES) <= set(statuses):
+        return [([], [])]
+    return [([f"{prefix}status = ?"], [status]) for status in statuses]
+
+
+def get_appointments_page(after: Optional[Tuple[str, str, str]] = None, limit: int = PAGE_SIZE,
+                          start_date: Optional[str] = None, end_date: Optional[str] = None,
+                          statuses: Optional[Iterable[str]] = None):
+    """
+    One page of appointments ordered by (date, time, id).
+    after: (date, time, id) of the last row of the previous page.
+    Returns (rows, next_after) where next_after is None on the last page.
+    """
+    clauses, params = _appointment_filters(start_date=start_date, end_date=end_date)
+    clauses.append("(date, time, id) > (?, ?, ?)")
+    params.extend(after or _KEY_START)
+    selects, all_params = [], []
+    for status_clauses, status_params in _status_branches(statuses):
+        selects.append(f"SELECT * FROM appointments WHERE {' AND '.join(clauses + status_clauses)}")
+        all_params += params + status_params
+    rows = get_conn().execute(" UNION ALL ".join(selects) + " ORDER BY date, time, id LIMIT ?",
+                              (*all_params, limit + 1)).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (last["date"], last["time"], last["id"])
+
+
+# --- Joined appointment views ---
+# Dashboards show who an appointment is with, not user ids. These queries join
+# users for the doctor and the patient (a primary-key lookup per row, only for
+# the sides whose fields are selected), so a page of N appointments is one
+# statement instead of 1 + 2N get_user_by_id() calls. The appointments side is
+# filtered and ordered through the same indexes as the plain listings.
+APPOINTMENT_DETAIL_FIELDS = {
+    "doctor_name": "d.name",
+    "doctor_specialization": "d.specialization",
+    "doctor_contact": "d.contact",
+    "patient_name": "p.name",
+    "patient_contact": "p.contact",
+}
+APPOINTMENT_DETAIL_COLUMNS = APPOINTMENT_COLUMNS + tuple(APPOINTMENT_DETAIL_FIELDS)
+
+
+def _details_query(columns: Optional[Iterable[str]], clauses: List[str], params: list, order: Tuple[str, ...],
+                   include_archive: bool = False, limit: Optional[int] = None,
+                   statuses: Optional[Iterable[str]] = None) -> Tuple[str, list]:
+    columns = list(columns or APPOINTMENT_DETAIL_COLUMNS)
+    unknown = [c for c in columns if c not in APPOINTMENT_DETAIL_FIELDS
+               and c not in APPOINTMENT_COLUMNS and c not in MINUTE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown appointment columns: {unknown}")
+    tables = ("appointments", "appointments_archive") if include_archive else ("appointments",)
+    branches = [(table, clauses + status_clauses, params + status_params)
+                for table in tables for status_clauses, status_params in _status_branches(statuses, "a.")]
+    compound = len(branches) > 1
+    if compound:
+        columns += [c for c in order if c not in columns]  # a compound ORDER BY names result columns
+    # Aliased so a compound ORDER BY can name id, which the joined users have too.
+    select = ", ".join(f"{APPOINTMENT_DETAIL_FIELDS.get(c, 'a.' + c)} AS {c}" for c in columns)
+    joins = "".join(f" LEFT JOIN users {alias} ON {alias}.id = a.{side}_id"
+                    for side, alias in (("doctor", "d"), ("patient", "p"))
+                    if any(c.startswith(side + "_") and c in APPOINTMENT_DETAIL_FIELDS for c in columns))
+    sql = " UNION ALL ".join(
+        f"SELECT {select} FROM {table} a{joins}" + (f" WHERE {' AND '.join(where)}" if where else "")
+        for table, where, _ in branches)
+    sql += " ORDER BY " + ", ".join(order if compound else [f"a.{c}" for c in order])
+    params = [p for _, _, branch_params in branches for p in branch_params]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+
+def get_appointment_details(doctor_id: Optional[str] = None, patient_id: Optional[str] = None,
+                            start_date: Optional[str] = None, end_date: Optional[str] = None,
+                            statuses: Optional[Iterable[str]] = None, columns: Optional[Iterable[str]] = None,
+                            include_archive: bool = False):
+    """
+    Appointments ordered by date and time, with the doctor's and patient's
+    display fields (APPOINTMENT_DETAIL_FIELDS) joined in. Every filter is
+    optional; dates are inclusive 'YYYY-MM-DD' bounds. `columns` picks from
+    APPOINTMENT_DETAIL_COLUMNS (default: all of them).
+    """
+    clauses, params = _appointment_filters(doctor_id, patient_id, start_date, end_date, statuses, prefix="a.")
+    sql, params = _details_query(columns, clauses, params, ("date", "time"), include_archive)
+    return get_conn().execute(sql, params).fetchall()
+
+
+def get_appointment_details_page(after: Optional[Tuple[str, str, str]] = None, limit: int = PAGE_SIZE,
+                                 start_date: Optional[str] = None, end_date: Optional[str] = None,
+                                 statuses: Optional[Iterable[str]] = None,
+                                 columns: Optional[Iterable[str]] = None):
+    """
+    get_appointments_page() with the joined display fields of
+    get_appointment_details(). Returns (rows, next_after).
+    """
+    clauses, params = _appointment_filters(start_date=start_date, end_date=end_date, prefix="a.")
+    clauses.append("(a.date, a.time, a.id) > (?, ?, ?)")
+    params.extend(after or _KEY_START)
+    columns = list(columns or APPOINTMENT_DETAIL_COLUMNS)
+    columns += [c for c in ("date", "time", "id") if c not in columns]  # the page cursor
+    sql, params = _details_query(columns, clauses, params, ("date", "time", "id"), limit=limit + 1,
+                                 statuses=statuses)
+    rows = get_conn().execute(sql, params).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (last["date"], last["time"], last["id"])
 
-def get_all_appointments():
-    cur = _conn.cursor()
-    cur.execute("SELECT * FROM appointments ORDER BY date, time")
-    return cur.fetchall()
 
 # --- Export helper ---
+EXPORT_CHUNK_ROWS = 5000
+
+
+def iter_appointment_chunks(doctor_id: Optional[str] = None, patient_id: Optional[str] = None,
+                            start_date: Optional[str] = None, end_date: Optional[str] = None,
+                            statuses: Optional[Iterable[str]] = None,
+                            chunk_size: int = EXPORT_CHUNK_ROWS, include_archive: bool = False):
+    """
+    Yield lists of appointment tuples (APPOINTMENT_COLUMNS order, sorted by date
+    and time) fetched with fetchmany, so callers can stream any history size.
+    Every filter is optional; dates are inclusive 'YYYY-MM-DD' bounds.
+    include_archive also reads archived appointments.
+    """
+    clauses, params = _appointment_filters(doctor_id, patient_id, start_date, end_date, statuses)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = get_conn().cursor()
+    cur.row_factory = None  # plain tuples: no per-row dict for bulk output
+    sql, params = _appointments_query(APPOINTMENT_COLUMNS, where, params, "date, time", include_archive)
+    cur.execute(sql, params)
+    try:
+        while True:
+            chunk = cur.fetchmany(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        cur.close()
+
+
 def export_appointments_df(appointments_rows):
     import pandas as pd
     if not appointments_rows:
         return pd.DataFrame()
     cols = list(appointments_rows[0].keys())
-    df = pd.DataFrame(appointments_rows, columns=cols)
+    df = pd.DataFrame.from_records(appointments_rows, columns=cols)
     return df
 
 # --- Booking wrapper ---
+@dataclass
+class BookingResult:
+    """Outcome of book_appointment(). Truthy only when the appointment was created."""
+    ok: bool
+    appointment_id: Optional[str] = None
+    reason: str = ""  # "booked", "conflict", "unavailable" (outside working hours) or "invalid"
+    suggested_time: Optional[str] = None  # nearest free start on that day, if any
+
+    def __bool__(self) -> bool:
+        return self.ok
+
+
+@contextmanager
+def _immediate_transaction(conn: sqlite3.Connection):
+    # BEGIN IMMEDIATE takes the write lock up front, so no other connection can
+    # insert between our conflict check and our insert. Inside transaction() the
+    # unit's transaction is already immediate; join it.
+    if _current_unit() is not None:
+        yield conn
+        return
+    if conn.in_transaction:
+        conn.commit()
+    started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    query_stats.record_lock_wait("sqlite write lock", time.perf_counter() - started)
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        if conn.in_transaction:
+            conn.commit()
+
+
+def _booking_slot(date_str: str, time_str: str, duration) -> Optional[Tuple[str, int, int]]:
+    """(date, start minute, duration) of a well-formed slot that ends within its day, else None."""
+    try:
+        day = date_type.fromisoformat(date_str).isoformat()
+        clock = datetime.strptime(time_str, "%H:%M")
+        duration = int(duration)
+    except (TypeError, ValueError):
+        return None
+    start = clock.hour * 60 + clock.minute
+    if not 0 < duration <= MINUTES_PER_DAY - start:
+        return None
+    return day, start, duration
+
+
 def book_appointment(doctor_id: str, patient_id: str, date_str: str, time_str: str, duration: int,
-                     status: str = 'pending', notes: str = '') -> bool:
-    from utils import can_book
-    existing = get_appointments_on(doctor_id, date_str)
-    if not can_book(existing, time_str, duration):
-        return False
-    app_id = str(uuid.uuid4())
-    create_appointment(app_id, doctor_id, patient_id, date_str, time_str, duration, status, notes)
-    return True
+                     status: str = 'pending', notes: str = '') -> BookingResult:
+    """
+    Check the doctor's working hours and existing bookings and insert in a single
+    write transaction, so two concurrent bookings of the same slot cannot both
+    succeed. Both checks are bitmap tests against the cached doctor-day.
+    """
+    return book_appointments([(doctor_id, patient_id, date_str, time_str, duration, status, notes)])[0]
+
+
+@_grouped
+def book_appointments(bookings: Iterable[tuple]) -> List[BookingResult]:
+    """
+    Book a batch of (doctor_id, patient_id, date, time, duration, status, notes)
+    tuples in one write transaction with a single commit. Each booking is
+    checked as in book_appointment(), and also against the bookings accepted
+    earlier in the same batch. A slot the cached day shows as free is confirmed
+    with find_conflicts() before the insert, so bookings made by other
+    processes are never overlapped. A malformed date or time, or a duration that is
+    not positive or runs past midnight, is rejected as "invalid" without a
+    lookup. Returns one BookingResult per input, in order.
+    """
+    results: List[BookingResult] = []
+    inserted = []
+    added: Dict[Tuple[str, str], int] = {}  # (doctor_id, date) -> minutes taken by this batch
+    stale = set()  # cached days another process has written to
+    conn = get_conn()
+    with _write_lock, _immediate_transaction(conn):
+        for doctor_id, patient_id, date_str, time_str, duration, status, notes in bookings:
+            slot = _booking_slot(date_str, time_str, duration)
+            if slot is None:
+                results.append(BookingResult(False, reason="invalid"))
+                continue
+            date_str, start, duration = slot
+            time_str = minutes_to_time_str(start)
+            want = minute_mask(start, duration)
+            existing = get_day_intervals(doctor_id, date_str)
+            hours, hours_mask = _day_hours_entry(doctor_id, date_str)
+            taken = added.get((doctor_id, date_str), 0)
+            fits = hours_mask & want == want
+            free = not (existing.busy_mask | taken) & want
+            if fits and free and find_conflicts(doctor_id, date_str, time_str, duration):
+                # Booked through another connection since the day was cached; the
+                # database decides, and the cached day is dropped after the commit.
+                stale.add((DB_PATH, doctor_id, date_str))
+                existing = _load_day_intervals(doctor_id, date_str)
+                free = False
+            if not (fits and free):
+                suggested = None
+                if hours:
+                    best = existing.nearest_free(start, duration, hours[0], hours[1])
+                    if best is not None and not taken & minute_mask(best, duration):
+                        suggested = minutes_to_time_str(best)
+                reason = "conflict" if fits else "unavailable"
+                results.append(BookingResult(False, reason=reason, suggested_time=suggested))
+                continue
+            app_id = str(uuid.uuid4())
+            start_min = epoch_day(date_str) * MINUTES_PER_DAY + start
+            conn.execute("""
+                INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes,
+                                          start_min, end_min)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (app_id, doctor_id, patient_id, date_str, time_str, duration, status, notes,
+                  start_min, start_min + duration))
+            added[(doctor_id, date_str)] = taken | want
+            inserted.append((doctor_id, date_str, app_id, time_str, duration, status))
+            results.append(BookingResult(True, appointment_id=app_id, reason="booked"))
+        _commit(conn)
+        if stale:
+            _evict_days(stale.__contains__)
+        for args in inserted:
+            _index_add(*args)
+    return results
+
+# --- Batch scheduling ---
+# Morning intake produces thousands of requests at once. auto_schedule() places a
+# whole batch against per doctor-day free-minute bitmaps and confirms everything
+# in one write transaction, instead of one booking (and one dashboard rerun) per
+# request.
+SCHEDULE_GRID_MINUTES = 15  # start grid for doctors without a published slot length
+SCHEDULE_DEFAULT_HOURS = ("09:00", "17:00")  # assumed for doctors without a schedule
+SCHEDULE_MAX_DAYS = 62
+
+
+@dataclass
+class ScheduleRequest:
+    """
+    A patient's request for a `duration`-minute visit with any doctor of
+    `specialization`, on a day from earliest_date to latest_date (default: the
+    same day), inside window_start–window_end ('HH:MM'; default: the doctor's
+    hours). A preferred doctor_id is used whenever they have room on a day.
+    """
+    patient_id: str
+    specialization: str
+    earliest_date: str
+    latest_date: Optional[str] = None
+    duration: int = 30
+    window_start: Optional[str] = None
+    window_end: Optional[str] = None
+    doctor_id: Optional[str] = None
+    notes: str = ""
+
+
+@dataclass
+class ScheduleReport:
+    """
+    Result of auto_schedule(). Entries are keyed by appointment id for pending
+    appointments and by position (from 0) for ScheduleRequests.
+    """
+    placed: List[dict] = field(default_factory=list)  # key, appointment_id, doctor_id, date, time, moved
+    unplaced: List[Tuple[object, str]] = field(default_factory=list)  # (key, reason)
+
+
+# One unit of work for the scheduler. target is the preferred start minute (the
+# booked time of a pending row; None = as early as possible) and original the
+# pending row's current (doctor_id, date, start).
+_ScheduleJob = namedtuple("_ScheduleJob", "key app_id patient_id doctors days duration window preferred "
+                                          "target notes original")
+
+
+def pending_appointment_ids(start_date: str, end_date: str, doctor_id: Optional[str] = None) -> List[str]:
+    """Ids of pending appointments between two dates (inclusive), earliest first."""
+    conn = get_conn()
+    if doctor_id:
+        rows = conn.execute("""
+            SELECT id FROM appointments
+            WHERE doctor_id = ? AND date BETWEEN ? AND ? AND status = 'pending'
+            ORDER BY date, time
+        """, (doctor_id, start_date, end_date))
+    else:
+        rows = conn.execute("""
+            SELECT id FROM appointments
+            WHERE date BETWEEN ? AND ? AND status = 'pending'
+            ORDER BY date, time, id
+        """, (start_date, end_date))
+    return [r["id"] for r in rows]
+
+
+def auto_schedule(requests: Iterable[ScheduleRequest] = (), pending_ids: Iterable[str] = (),
+                  same_doctor: bool = False, keep_times: bool = False) -> ScheduleReport:
+    """
+    Place a batch of pending appointments and new ScheduleRequests in
+    conflict-free slots and confirm them all in one transaction.
+
+    A pending appointment is confirmed where it is when it fits the doctor's
+    hours and clashes with nothing outside the batch or kept before it;
+    otherwise it moves to the free slot nearest its booked time that day, with
+    its own doctor if possible, else another doctor of the same
+    specialization (never another doctor with same_doctor). With keep_times,
+    pending appointments are only ever confirmed where they are; one that
+    does not fit stays pending and is reported. Requests become new confirmed
+    appointments at the earliest free slot in their window. Nothing is
+    placed on top of another non-cancelled appointment of the same patient.
+    Jobs are placed most constrained first (fewest candidate doctor-days),
+    and ties between doctors go to the one with the most free time that day.
+    Anything that cannot be placed is left untouched and reported.
+    """
+    report = ScheduleReport()
+    requests = list(requests)
+    pending_ids = list(dict.fromkeys(pending_ids))
+    conn = get_conn()
+    with _write_lock, _immediate_transaction(conn):
+        doctors_by_spec: Dict[str, List[str]] = {}
+        spec_of: Dict[str, str] = {}
+        for r in conn.execute("SELECT id, specialization FROM users WHERE role = 'doctor'"):
+            spec = (r["specialization"] or "").strip().lower()
+            doctors_by_spec.setdefault(spec, []).append(r["id"])
+            spec_of[r["id"]] = spec
+
+        rows = {}
+        for i in range(0, len(pending_ids), 500):
+            part = pending_ids[i:i + 500]
+            marks = ",".join("?" * len(part))
+            for r in conn.execute(f"""
+                SELECT id, doctor_id, patient_id, date, time, duration, status
+                FROM appointments WHERE id IN ({marks})
+            """, part):
+                rows[r["id"]] = r
+        jobs: List[_ScheduleJob] = []
+        for app_id in pending_ids:
+            r = rows.get(app_id)
+            if r is None or r["status"] != "pending":
+                report.unplaced.append((app_id, "not pending" if r else "not found"))
+                continue
+            doctor_id = r["doctor_id"]
+            doctors = [doctor_id] if same_doctor else doctors_by_spec.get(spec_of.get(doctor_id), [doctor_id])
+            start = time_str_to_minutes(r["time"])
+            jobs.append(_ScheduleJob(app_id, app_id, r["patient_id"], doctors, [r["date"]], int(r["duration"]),
+                                     None, doctor_id, start, None, (doctor_id, r["date"], start)))
+        for n, req in enumerate(requests):
+            try:
+                first = date_type.fromisoformat(req.earliest_date)
+                last = date_type.fromisoformat(req.latest_date or req.earliest_date)
+                duration = int(req.duration)
+                window = (time_str_to_minutes(req.window_start) if req.window_start else 0,
+                          time_str_to_minutes(req.window_end) if req.window_end else MINUTES_PER_DAY)
+            except (AttributeError, TypeError, ValueError) as e:
+                report.unplaced.append((n, f"invalid: {e}"))
+                continue
+            if not 0 < duration <= MINUTES_PER_DAY or not 0 <= (last - first).days < SCHEDULE_MAX_DAYS:
+                report.unplaced.append((n, "invalid: duration or date range out of range"))
+                continue
+            doctors = doctors_by_spec.get((req.specialization or "").strip().lower())
+            if not doctors:
+                report.unplaced.append((n, "no doctor with that specialization"))
+                continue
+            days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+            jobs.append(_ScheduleJob(n, None, req.patient_id, doctors, days, duration,
+                                     window if req.window_start or req.window_end else None,
+                                     req.doctor_id, None, req.notes or "", None))
+        if not jobs:
+            return report
+
+        # Free minutes per doctor-day: working hours minus every non-cancelled
+        # booking outside the batch. Bookings are read one doctor at a time, over
+        # the batch's whole date span, on first touch.
+        epoch_days = {d: epoch_day(d) for job in jobs for d in job.days}
+        lo_min = min(epoch_days.values()) * MINUTES_PER_DAY
+        hi_min = (max(epoch_days.values()) + 1) * MINUTES_PER_DAY
+        batch_ids = {job.app_id for job in jobs if job.app_id}
+        busy: Dict[Tuple[str, int], int] = {}  # (doctor_id, epoch day) -> busy minute bitmap
+        free: Dict[Tuple[str, str], int] = {}
+        loaded = set()
+        patient_busy: Dict[Tuple[str, str], int] = {}  # (patient_id, date) -> busy minute bitmap
+        loaded_patients = set()
+        whole_day = minute_mask(0, MINUTES_PER_DAY)
+        first_date, last_date = min(epoch_days, key=epoch_days.get), max(epoch_days, key=epoch_days.get)
+        default_lo, default_hi = map(time_str_to_minutes, SCHEDULE_DEFAULT_HOURS)
+
+        def day_free(doctor_id: str, date_str: str) -> int:
+            key = (doctor_id, date_str)
+            mask = free.get(key)
+            if mask is None:
+                if doctor_id not in loaded:
+                    loaded.add(doctor_id)
+                    for app_id, start_min, end_min in conn.execute("""
+                        SELECT id, start_min, end_min FROM appointments
+                        WHERE doctor_id = ? AND start_min >= ? AND start_min < ? AND status != 'cancelled'
+                    """, (doctor_id, lo_min, hi_min)):
+                        if app_id not in batch_ids:
+                            k = (doctor_id, start_min // MINUTES_PER_DAY)
+                            busy[k] = busy.get(k, 0) | minute_mask(start_min % MINUTES_PER_DAY, end_min - start_min)
+                busy_mask = busy.get((doctor_id, epoch_days[date_str]), 0)
+                mask = free[key] = _day_hours_entry(doctor_id, date_str)[1] & ~busy_mask
+            return mask
+
+        def patient_free(patient_id: Optional[str], date_str: str) -> int:
+            # The patient's own bookings outside the batch, with any doctor.
+            if not patient_id:
+                return whole_day
+            if patient_id not in loaded_patients:
+                loaded_patients.add(patient_id)
+                for app_id, day, start_min, end_min in conn.execute("""
+                    SELECT id, date, start_min, end_min FROM appointments
+                    WHERE patient_id = ? AND date BETWEEN ? AND ? AND status != 'cancelled'
+                """, (patient_id, first_date, last_date)):
+                    if app_id not in batch_ids and start_min is not None:
+                        k = (patient_id, day)
+                        patient_busy[k] = (patient_busy.get(k, 0)
+                                           | minute_mask(start_min % MINUTES_PER_DAY, end_min - start_min))
+            return whole_day & ~patient_busy.get((patient_id, date_str), 0)
+
+        def best_slot(job: _ScheduleJob) -> Optional[Tuple[str, str, int]]:
+            for date_str in job.days:
+                best, best_rank = None, None
+                for doctor_id in job.doctors:
+                    mask = day_free(doctor_id, date_str) & patient_free(job.patient_id, date_str)
+                    if not mask:
+                        continue
+                    lo, hi, step = _day_hours_entry(doctor_id, date_str)[0]
+                    if (lo, hi, step) == UNRESTRICTED_HOURS:
+                        lo, hi = default_lo, default_hi
+                    origin, step = lo, step or SCHEDULE_GRID_MINUTES
+                    if job.window:
+                        lo, hi = max(lo, job.window[0]), min(hi, job.window[1])
+                    if hi - lo < job.duration:
+                        continue
+                    starts = (fit_starts(mask & minute_mask(lo, hi - lo), job.duration)
+                              & grid_mask(origin, hi, step))
+                    if not starts:
+                        continue
+                    if job.target is None:
+                        start = (starts & -starts).bit_length() - 1
+                        distance = start
+                    else:
+                        # Nearest fitting start on either side of the booked time.
+                        after = starts >> job.target
+                        before = starts & ((1 << job.target) - 1)
+                        options = []
+                        if after:
+                            options.append(job.target + (after & -after).bit_length() - 1)
+                        if before:
+                            options.append(before.bit_length() - 1)
+                        start = min(options, key=lambda s: (abs(s - job.target), s))
+                        distance = abs(start - job.target)
+                    rank = (doctor_id != job.preferred, distance, -mask.bit_count(), doctor_id)
+                    if best_rank is None or rank < best_rank:
+                        best, best_rank = (doctor_id, date_str, start), rank
+                if best:
+                    return best
+            return None
+
+        def take(doctor_id: str, date_str: str, start: int, duration: int, patient_id: Optional[str]) -> None:
+            want = minute_mask(start, duration)
+            free[(doctor_id, date_str)] = day_free(doctor_id, date_str) & ~want
+            if patient_id:
+                patient_free(patient_id, date_str)  # load before marking
+                patient_busy[(patient_id, date_str)] = patient_busy.get((patient_id, date_str), 0) | want
+
+        placements = []  # (job, doctor_id, date, start)
+        to_place = []
+        for job in jobs:
+            if job.original:
+                doctor_id, date_str, start = job.original
+                want = minute_mask(start, job.duration)
+                if day_free(doctor_id, date_str) & patient_free(job.patient_id, date_str) & want == want:
+                    take(doctor_id, date_str, start, job.duration, job.patient_id)
+                    placements.append((job, doctor_id, date_str, start))
+                    continue
+            to_place.append(job)
+        # A pending row that has to move keeps holding its old slot for the rest
+        # of the batch, so nothing is confirmed on top of it if it stays unplaced.
+        # (The patient's time is not held: they may move to another doctor at it.)
+        for job in to_place:
+            if job.original:
+                take(*job.original, job.duration, None)
+        to_place.sort(key=lambda job: (len(job.doctors) * len(job.days), job.days[-1]))
+        for job in to_place:
+            if keep_times and job.original:
+                report.unplaced.append((job.key, "clashes where booked"))
+                continue
+            slot = best_slot(job)
+            if slot is None:
+                report.unplaced.append((job.key, "no free slot"))
+                continue
+            take(*slot, job.duration, job.patient_id)
+            placements.append((job, *slot))
+
+        updates, inserts, moved_from, indexed = [], [], [], []
+        for job, doctor_id, date_str, start in placements:
+            time_str = minutes_to_time_str(start)
+            if job.app_id:
+                app_id = job.app_id
+                updates.append((doctor_id, date_str, time_str, app_id))
+                moved_from.append((job.original[0], job.original[1], app_id))
+            else:
+                app_id = str(uuid.uuid4())
+                start_min = epoch_days[date_str] * MINUTES_PER_DAY + start
+                inserts.append((app_id, doctor_id, job.patient_id, date_str, time_str, job.duration,
+                                "confirmed", job.notes, start_min, start_min + job.duration))
+            report.placed.append({"key": job.key, "appointment_id": app_id, "doctor_id": doctor_id,
+                                  "date": date_str, "time": time_str,
+                                  "moved": bool(job.original) and job.original != (doctor_id, date_str, start)})
+            indexed.append((doctor_id, date_str, app_id, time_str, job.duration, "confirmed"))
+        conn.executemany("""
+            UPDATE appointments SET doctor_id = ?, date = ?, time = ?, status = 'confirmed'
+            WHERE id = ?
+        """, updates)
+        conn.executemany("""
+            INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes,
+                                      start_min, end_min)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, inserts)
+        _commit(conn)
+        for args in moved_from:
+            _index_remove(*args)
+        for args in indexed:
+            _index_add(*args)
+    return report
+
+# --- Bulk import ---
+IMPORT_CHUNK_ROWS = 10000
+IMPORT_CACHE_SIZE = -256000  # ~256 MB page cache while importing, so index pages stay hot
+APPOINTMENT_STATUSES = ("pending", "confirmed", "cancelled")
+
+
+@dataclass
+class ImportReport:
+    """Result of import_appointments(). Rows are numbered from 1 in input order."""
+    total: int = 0
+    accepted: int = 0
+    rejected: List[Tuple[int, str]] = field(default_factory=list)  # (row number, reason)
+
+    def status_of(self, row_number: int) -> str:
+        """'accepted' or the rejection reason for one input row."""
+        for n, reason in self.rejected:
+            if n == row_number:
+                return reason
+        return "accepted" if 1 <= row_number <= self.total else "missing"
+
+
+def _parse_import_row(rec) -> Tuple[Optional[tuple], Optional[str]]:
+    try:
+        doctor_id = rec["doctor_id"]
+        patient_id = rec["patient_id"]
+        day = date_type.fromisoformat(rec["date"])
+        start = time_str_to_minutes(rec["time"])
+        duration = int(rec["duration"])
+    except (KeyError, TypeError, ValueError) as e:
+        return None, f"invalid: {e}"
+    if not doctor_id or not patient_id:
+        return None, "invalid: missing doctor_id or patient_id"
+    if not 0 <= start < MINUTES_PER_DAY or not 0 < duration <= MINUTES_PER_DAY - start:
+        return None, "invalid: time/duration out of range"
+    status = rec.get("status") or "pending"
+    if status not in APPOINTMENT_STATUSES:
+        return None, f"invalid: unknown status {status!r}"
+    app_id = rec.get("id") or str(uuid.uuid4())
+    start_min = (day.toordinal() - EPOCH_ORDINAL) * MINUTES_PER_DAY + start
+    return (app_id, doctor_id, patient_id, day.isoformat(), minutes_to_time_str(start), duration, status,
+            rec.get("notes") or "", start_min, start_min + duration), None
+
+
+def import_appointments(records: Iterable[dict], respect_hours: bool = False) -> ImportReport:
+    """
+    Validate and insert a stream of appointment records.
+
+    Each record needs doctor_id, patient_id, date ('YYYY-MM-DD'), time ('HH:MM')
+    and duration; status, notes and id are optional. Non-cancelled rows are
+    checked for overlap against existing appointments and against earlier rows of
+    the same import; a rejected row never blocks a later one. With respect_hours,
+    rows outside the doctor's published schedule are rejected too.
+    Rows are inserted with executemany in chunks of IMPORT_CHUNK_ROWS, each in
+    its own write transaction, and the write lock is released between chunks
+    so bookings are not held up by a long import. An error rolls back only the
+    chunk in progress; earlier chunks stay committed. Inside transaction() the
+    whole import joins the unit and commits with it.
+    """
+    report = ImportReport()
+    busy: Dict[Tuple[str, int], int] = {}  # (doctor_id, epoch day) -> busy minute bitmap
+    loaded_doctors = set()
+    seen_ids = set()
+    conn = get_conn()
+    has_rows = False
+    version = None  # (PRAGMA data_version, total_changes) as of our last chunk
+
+    def day_mask(doctor_id: str, day: int) -> int:
+        # Existing bookings are read one doctor at a time on first touch,
+        # before any of this import's rows for that doctor are inserted.
+        if has_rows and doctor_id not in loaded_doctors:
+            loaded_doctors.add(doctor_id)
+            for start_min, end_min in conn.execute("""
+                SELECT start_min, end_min FROM appointments
+                WHERE doctor_id = ? AND status != 'cancelled' AND start_min IS NOT NULL
+            """, (doctor_id,)):
+                key = (doctor_id, start_min // MINUTES_PER_DAY)
+                busy[key] = busy.get(key, 0) | minute_mask(start_min % MINUTES_PER_DAY, end_min - start_min)
+        return busy.get((doctor_id, day), 0)
+
+    def flush(chunk: List[Tuple[int, tuple, bool]]) -> None:
+        nonlocal has_rows, version
+        touched = set()  # (doctor_id, date) of accepted rows
+        with _write_lock, _immediate_transaction(conn):
+            current = (conn.execute("PRAGMA data_version").fetchone()[0], conn.total_changes)
+            if current != version:
+                # First chunk, or something else wrote since our last one (another
+                # connection, or this one between chunks): the bitmaps may be stale.
+                busy.clear()
+                loaded_doctors.clear()
+                has_rows = conn.execute("SELECT 1 FROM appointments LIMIT 1").fetchone() is not None
+            explicit = [row[0] for _, row, has_id in chunk if has_id]
+            taken = set()
+            if has_rows:
+                for i in range(0, len(explicit), 500):
+                    part = explicit[i:i + 500]
+                    marks = ",".join("?" * len(part))
+                    taken.update(r["id"] for r in conn.execute(
+                        f"SELECT id FROM appointments WHERE id IN ({marks})", part))
+            accepted = []
+            for n, row, _ in chunk:
+                app_id, doctor_id, _, date_str, _, duration, status, _, start_min, _ = row
+                if app_id in taken or app_id in seen_ids:
+                    report.rejected.append((n, "duplicate id"))
+                    continue
+                if status != "cancelled":
+                    day, start = divmod(start_min, MINUTES_PER_DAY)
+                    want = minute_mask(start, duration)
+                    if respect_hours and _day_hours_entry(doctor_id, date_str)[1] & want != want:
+                        report.rejected.append((n, "outside working hours"))
+                        continue
+                    mask = day_mask(doctor_id, day)
+                    if mask & want:
+                        report.rejected.append((n, "conflict"))
+                        continue
+                    busy[(doctor_id, day)] = mask | want
+                seen_ids.add(app_id)
+                touched.add((doctor_id, date_str))
+                accepted.append(row)
+            accepted.sort(key=lambda r: (r[1], r[3], r[4]))  # index-friendly insert order
+            conn.executemany("""
+                INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes,
+                                          start_min, end_min)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, accepted)
+            _commit(conn)
+            version = (current[0], conn.total_changes)
+            report.accepted += len(accepted)
+            # Cached doctor-days touched by the chunk reload from the DB on next use.
+            _evict_days(lambda key: key[0] == DB_PATH and key[1:] in touched)
+
+    conn.execute(f"PRAGMA cache_size = {IMPORT_CACHE_SIZE}")
+    try:
+        chunk: List[Tuple[int, tuple, bool]] = []
+        for n, rec in enumerate(records, start=1):
+            report.total = n
+            row, error = _parse_import_row(rec)
+            if error:
+                report.rejected.append((n, error))
+                continue
+            chunk.append((n, row, bool(rec.get("id"))))
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                flush(chunk)
+                chunk = []
+        if chunk:
+            flush(chunk)
+    finally:
+        conn.execute(f"PRAGMA cache_size = {PRAGMAS['cache_size']}")
+    return report
+
+
+def import_appointments_csv(source: Union[str, "os.PathLike", Iterable[str]],
+                            respect_hours: bool = False) -> ImportReport:
+    """import_appointments() over a CSV file path or open text stream with a header row."""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="", encoding="utf-8") as f:
+            return import_appointments(csv.DictReader(f), respect_hours)
+    return import_appointments(csv.DictReader(source), respect_hours)
+
+# --- Query plan checks ---
+# Marker for queries whose temp b-tree is intended, e.g. GROUP BY over a small
+# date range of summary rows; query_plan_scans() does not report those sorts.
+TEMP_SORT_OK = "/* temp-sort-ok */"
+# Marker for listings meant to read everything (get_all_*), which may walk a
+# whole index in order; any other SCAN, with or without an index, is reported.
+FULL_SCAN_OK = "/* full-scan-ok */"
+# A virtual table scan whose idxStr is non-empty used a constraint the module
+# indexes itself (FTS5: "M" for MATCH); an empty idxStr reads every row.
+_VIRTUAL_INDEX_LOOKUP = re.compile(r"VIRTUAL TABLE INDEX \d+:\S")
+
+def _page_queries_probe():
+    # First and later pages of every keyset listing, with each filter alone.
+    get_users_page()
+    get_users_page(("doctor", "probe", "probe"))
+    get_users_page(role="doctor")
+    get_users_page(("doctor", "probe", "probe"), role="doctor")
+    get_users_page(search="probe")
+    get_users_page(("doctor", "probe", "probe"), search="probe")
+    for page in (get_appointments_page, get_appointment_details_page):
+        page()
+        page(("2000-01-01", "09:00", "probe"))
+        page(statuses=["pending"])
+        page(("2000-01-01", "09:00", "probe"), statuses=["pending", "confirmed"])
+        page(statuses=APPOINTMENT_STATUSES)
+        page(start_date="2000-01-01", end_date="2000-12-31")
+        page(("2000-01-01", "09:00", "probe"), start_date="2000-01-01", statuses=["cancelled"])
+
+
+def _read_queries_probe():
+    # Call every read helper once with placeholder arguments; the SQL they issue
+    # is captured by the trace callback in query_plans().
+    get_user_by_email("probe@example.com")
+    get_user_by_id("probe")
+    get_all_users()
+    list_doctors(None)
+    list_doctors("probe")
+    get_appointments_by_doctor("probe")
+    get_appointments_by_doctor("probe", "2000-01-01", "2000-12-31")
+    get_appointments_by_patient("probe")
+    get_appointments_by_patient("probe", "2000-01-01", "2000-12-31")
+    get_appointments_on("probe", "2000-01-01")
+    get_appointments_on("probe", "2000-01-01", ("id", "status"), include_archive=True)
+    get_appointments_overlapping("2000-01-01", "09:00", "2000-01-02", "09:00")
+    get_appointments_overlapping("2000-01-01", "09:00", "2000-01-01", "17:00", "probe", ("id",), include_archive=True)
+    find_conflicts("probe", "2000-01-01", "09:00", 30)
+    get_appointments_by_doctor("probe", "2000-01-01", "2000-12-31", include_archive=True)
+    get_appointments_by_patient("probe", include_archive=True)
+    get_all_appointments()
+    get_all_appointments(include_archive=True)
+    get_weekly_availability("probe")
+    get_availability_exceptions("probe")
+    get_availability_exceptions("probe", "2000-01-01", "2000-12-31")
+    search_doctors("probe")
+    search_doctors("")
+    get_daily_stats("2000-01-01", "2000-12-31")
+    get_daily_stats("2000-01-01", "2000-12-31", "probe")
+    get_stats_by_day("2000-01-01", "2000-12-31")
+    get_stats_by_doctor("2000-01-01", "2000-12-31")
+    pending_appointment_ids("2000-01-01", "2000-12-31")
+    pending_appointment_ids("2000-01-01", "2000-12-31", "probe")
+    _page_queries_probe()
+    for _ in iter_appointment_chunks(start_date="2000-01-01", end_date="2000-12-31", statuses=["pending"]):
+        pass
+    for _ in iter_appointment_chunks(doctor_id="probe", start_date="2000-01-01"):
+        pass
+    for _ in iter_appointment_chunks(patient_id="probe", include_archive=True):
+        pass
+    get_appointment_details(patient_id="probe")
+    get_appointment_details(patient_id="probe", columns=("id", "date", "doctor_name"), include_archive=True)
+    get_appointment_details(doctor_id="probe", start_date="2000-01-01", end_date="2000-01-01",
+                            columns=("id", "time", "patient_name"), include_archive=True)
+    get_appointment_details(start_date="2000-01-01", end_date="2000-12-31", statuses=["pending"])
+    get_doctor_calendar("probe", "2000-01-01", "2000-01-31")
+    get_patient_calendar("probe", "2000-01-01", "2000-01-31")
+    get_patient_calendar("probe", "2000-01-01", "2000-01-31", include_archive=True)
+
+
+def query_plans(probe: Optional[Callable[[], None]] = None) -> List[Tuple[str, List[str]]]:
+    """
+    Run EXPLAIN QUERY PLAN for every SELECT the read helpers issue, or only
+    those issued by `probe`. Returns [(sql, [plan detail, ...]), ...].
+    """
+    conn = get_conn()
+    invalidate_user_cache()  # cached reads would issue no SQL
+    statements: List[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        (probe or _read_queries_probe)()
+    finally:
+        conn.set_trace_callback(None)
+
+    plans = []
+    seen = set()
+    for sql in statements:
+        sql = " ".join(sql.split())
+        if not sql.upper().startswith(("SELECT", "WITH")) or sql in seen:
+            continue
+        if "'doctors_fts_" in sql:
+            continue  # FTS5 reading its own shadow tables, not one of ours
+        seen.add(sql)
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        plans.append((sql, [r["detail"] for r in rows]))
+    return plans
+
+
+def query_plan_scans(probe: Optional[Callable[[], None]] = None) -> List[Tuple[str, str]]:
+    """
+    Return (sql, plan detail) for every plan step that reads a whole table or a
+    whole index, or sorts with a temp b-tree. An empty list means every query
+    narrows its reads with an index SEARCH. Listings marked FULL_SCAN_OK
+    (get_all_*) may walk an index in order; reading a subquery or CTE's own
+    output, and a virtual table the module serves from its own index (an FTS
+    MATCH), are allowed too.
+    """
+    bad = []
+    for sql, details in query_plans(probe):
+        derived = {d.split(" ", 1)[1] for d in details if d.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+        for detail in details:
+            full_scan = (detail.startswith("SCAN") and detail != "SCAN CONSTANT ROW"
+                         and detail[len("SCAN "):] not in derived
+                         and not _VIRTUAL_INDEX_LOOKUP.search(detail)
+                         and not ("INDEX" in detail and FULL_SCAN_OK in sql))
+            temp_sort = "TEMP B-TREE" in detail and TEMP_SORT_OK not in sql
+            if full_scan or temp_sort:
+                bad.append((sql, detail))
+    return bad
+
+
+# --- Query instrumentation ---
+# Every public function below is wrapped for per-function latency (see
+# query_stats.py; statements are timed by the connection itself). Generators
+# would only time their creation, so they rely on statement timings alone.
+_NOT_INSTRUMENTED = {"record_type", "record_factory", "get_conn", "close_conn", "close_all_conns",
+                     "query_plans", "query_plan_scans", "user_cache_stats", "transaction",
+                     "start_group_commit", "stop_group_commit", "group_commit_requested", "group_commit_stats"}
+for _name, _fn in list(globals().items()):
+    if (not _name.startswith("_") and _name not in _NOT_INSTRUMENTED and callable(_fn)
+            and getattr(_fn, "__module__", None) == __name__ and not isinstance(_fn, type)
+            and not inspect.isgeneratorfunction(_fn)):
+        globals()[_name] = query_stats.timed(_fn)
+del _name, _fn
@@ -1,11 +1,33 @@
 # doctor_ui.py
 import streamlit as st
-import pandas as pd
 from datetime import date
-from database import get_appointments_on, update_appointment_status, get_appointments_by_doctor
-from utils import generate_slots  # for future availability feature
-from streamlit.components.v1 import html
+from database import (
+    APPOINTMENT_STATUSES,
+    auto_schedule,
+    transaction,
+    export_appointments_df,
+    get_appointment_details,
+    get_doctor_calendar,
+    get_appointments_on,
+    update_appointment_status,
+    set_weekly_availability,
+    clear_weekly_availability,
+    get_weekly_availability,
+    set_availability_exception,
+    delete_availability_exception,
+    get_availability_exceptions,
+    pending_appointment_ids,
+)
+from calendar_ui import CALENDAR_VIEWS, calendar_range, pick_day, render_heatmap
+from export import EXPORT_FORMATS, export_appointments_file, parquet_available
+from photos import photo_bytes
+from utils import generate_slots
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DAY_VIEW_COLUMNS = ("id", "date", "time", "duration", "status", "notes", "patient_name", "patient_contact")
+
 def animate_card():
+    from streamlit.components.v1 import html
     html("""
     <script>
     const cards = document.querySelectorAll('.stDataFrame, .stExpander');
@@ -19,7 +41,9 @@ def animate_card():
     });
     </script>
     """, height=0)
-st.markdown("""
+
+def status_legend():
+    st.markdown("""
 <div style="display:flex; gap:1rem;">
     <div style="flex:1; background:#e8f7ee; border-radius:12px; padding:1rem; text-align:center; box-shadow:0 2px 6px rgba(0,0,0,0.1);">
         <h3>🟢 Confirmed</h3>
@@ -37,13 +61,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def doctor_dashboard(user):
+    import pandas as pd  # heavy; loaded on the first render, not at import
+
+    status_legend()
     st.header(f"Dr. {user['name']} — Dashboard")
     st.subheader("Your Profile")
 
     col1, col2 = st.columns([1, 3])
     with col1:
-        if user.get("photo_path"):
-            st.image(user["photo_path"], width=120)
+        photo = photo_bytes(user.get("photo_path"))
+        if photo:
+            st.image(photo, width=120)
         else:
             st.image("https://cdn-icons-png.flaticon.com/512/387/387561.png", width=100)
 
@@ -57,7 +85,8 @@ def doctor_dashboard(user):
     # --- Availability Section ---
     with st.expander("🕒 Manage Availability & Generate Slots"):
         with st.form("availability_form"):
-            st.write("Define your daily availability window and consultation duration.")
+            st.write("Define your weekly availability window and consultation duration.")
+            weekdays = st.multiselect("Days", WEEKDAYS, default=WEEKDAYS[:5])
             start = st.time_input("Start Time", key="doc_start")
             end = st.time_input("End Time", key="doc_end")
             duration = st.selectbox(
@@ -65,23 +94,114 @@ def doctor_dashboard(user):
                 [15, 20, 30, 45, 60],
                 index=2
             )
-            submitted = st.form_submit_button("💾 Save (demo only)")
+            submitted = st.form_submit_button("💾 Save Weekly Schedule")
             if submitted:
-                st.success("Availability saved for session — in production, store this in the database.")
+                start_str, end_str = start.strftime("%H:%M"), end.strftime("%H:%M")
+                slots = generate_slots(start_str, end_str, duration)
+                if not slots:
+                    st.error("End time must leave room for at least one consultation.")
+                else:
+                    with transaction():  # all seven days in one commit
+                        for i, day_name in enumerate(WEEKDAYS):
+                            if day_name in weekdays:
+                                set_weekly_availability(user["id"], i, start_str, end_str, duration)
+                            else:
+                                clear_weekly_availability(user["id"], i)
+                    st.success(f"Schedule saved — {len(slots)} slots per working day.")
+
+        with st.form("exception_form"):
+            st.write("Day off or special hours for a single date.")
+            exc_date = st.date_input("Date", value=date.today(), key="exc_date")
+            day_off = st.checkbox("Day off", value=True)
+            exc_start = st.time_input("Start Time", key="exc_start")
+            exc_end = st.time_input("End Time", key="exc_end")
+            exc_duration = st.selectbox(
+                "Consultation Duration (minutes)",
+                [15, 20, 30, 45, 60],
+                index=2,
+                key="exc_duration"
+            )
+            if st.form_submit_button("💾 Save Exception"):
+                exc_start_str, exc_end_str = exc_start.strftime("%H:%M"), exc_end.strftime("%H:%M")
+                if day_off:
+                    set_availability_exception(user["id"], exc_date.isoformat())
+                    st.success("Exception saved.")
+                elif not generate_slots(exc_start_str, exc_end_str, exc_duration):
+                    st.error("End time must be after the start time and leave room for at least one consultation.")
+                else:
+                    set_availability_exception(user["id"], exc_date.isoformat(),
+                                               exc_start_str, exc_end_str, exc_duration)
+                    st.success("Exception saved.")
+
+        weekly = get_weekly_availability(user["id"])
+        if weekly:
+            st.write("**Current weekly schedule**")
+            st.dataframe(pd.DataFrame(
+                [{"day": WEEKDAYS[w["weekday"]], "start": w["start_time"], "end": w["end_time"],
+                  "slot (min)": w["slot_minutes"]} for w in weekly]
+            ))
+        exceptions = get_availability_exceptions(user["id"], date.today().isoformat(), "9999-12-31")
+        for exc in exceptions:
+            label = f"{exc['start_time']}–{exc['end_time']}" if exc["start_time"] else "day off"
+            col_a, col_b = st.columns([3, 1])
+            col_a.write(f"📌 {exc['date']}: {label}")
+            if col_b.button("Remove", key=f"exc_del_{exc['date']}"):
+                delete_availability_exception(user["id"], exc["date"])
+                st.rerun()
+
+    st.markdown("---")
+    st.subheader("🗓️ Calendar")
+
+    # The whole week or month comes from one query; appointment rows are read
+    # only for the day picked below.
+    col_view, col_anchor = st.columns([1, 2])
+    view = col_view.radio("View", CALENDAR_VIEWS, horizontal=True, key="doc_cal_view")
+    anchor = col_anchor.date_input("Showing", value=date.today(), key="doc_cal_anchor")
+    cal_start, cal_end = calendar_range(anchor, view)
+    cal_days = {c["date"]: c for c in get_doctor_calendar(user["id"], cal_start.isoformat(), cal_end.isoformat())}
+
+    def day_label(d: str) -> str:
+        c = cal_days[d]
+        booked = c["pending"] + c["confirmed"]
+        if not c["working_minutes"]:
+            return f"off · {booked} booked" if booked else "off"
+        capacity = f"/{c['slots']}" if c["slots"] else ""
+        return f"{booked}{capacity} · {c['occupancy']:.0%}"
+
+    render_heatmap(cal_start, cal_end, lambda d: cal_days[d]["occupancy"], day_label)
+    working = sum(c["working_minutes"] for c in cal_days.values())
+    booked_minutes = sum(c["booked_minutes"] for c in cal_days.values())
+    col_booked, col_pending, col_capacity, col_free = st.columns(4)
+    col_booked.metric("Booked", sum(c["pending"] + c["confirmed"] for c in cal_days.values()))
+    col_pending.metric("Pending", sum(c["pending"] for c in cal_days.values()))
+    col_capacity.metric("Slots", sum(c["slots"] or 0 for c in cal_days.values()))
+    col_free.metric("Free hours", f"{sum(c['free_minutes'] for c in cal_days.values()) / 60:.1f}",
+                    f"{booked_minutes / working:.0%} occupied" if working else None, delta_color="off")
+
+    busy_days = [d for d, c in cal_days.items() if c["pending"] + c["confirmed"] + c["cancelled"]]
+    picked = pick_day("doc_cal_day", busy_days, {d: day_label(d) for d in busy_days})
+    if picked:
+        detail = get_appointment_details(doctor_id=user["id"], start_date=picked, end_date=picked,
+                                         columns=DAY_VIEW_COLUMNS, include_archive=picked < date.today().isoformat())
+        if detail:
+            st.dataframe(export_appointments_df(detail)[["time", "duration", "patient_name", "status", "notes"]])
+        else:
+            st.info("No appointments on this date.")
 
     st.markdown("---")
     st.subheader("📅 Appointments")
 
     d = st.date_input("Choose date", value=date.today())
-    rows = get_appointments_on(user["id"], d.isoformat())
+    # Past days may be partly archived; those rows are shown but not editable.
+    rows = get_appointment_details(doctor_id=user["id"], start_date=d.isoformat(), end_date=d.isoformat(),
+                                   columns=DAY_VIEW_COLUMNS, include_archive=d < date.today())
+    hot_ids = ({r["id"] for r in get_appointments_on(user["id"], d.isoformat(), columns=("id",))}
+               if d < date.today() else {r["id"] for r in rows})
 
     if not rows:
         st.info("No appointments on this date.")
     else:
-        df = pd.DataFrame(
-            [tuple(r) for r in rows],
-            columns=["id", "doctor_id", "patient_id", "date", "time", "duration", "status", "notes"]
-        )
+        df = export_appointments_df(rows)
 
         def status_label(s: str) -> str:
             if s == "confirmed":
@@ -92,15 +212,29 @@ def doctor_dashboard(user):
                 return "🔴 Cancelled"
 
         df["status_display"] = df["status"].apply(status_label)
-        st.dataframe(df[["date", "time", "duration", "status_display", "notes"]])
+        st.dataframe(df[["date", "time", "duration", "patient_name", "status_display", "notes"]])
+
+        if any(r["status"] == "pending" for r in rows):
+            if st.button("✅ Confirm all pending", key="confirm_all"):
+                # Confirm in place only: a clash stays pending for the doctor to sort out,
+                # rather than being moved without the patient being told.
+                result = auto_schedule(pending_ids=pending_appointment_ids(d.isoformat(), d.isoformat(), user["id"]),
+                                       same_doctor=True, keep_times=True)
+                st.session_state["confirm_all_result"] = (len(result.placed), len(result.unplaced))
+                st.rerun()
+        if "confirm_all_result" in st.session_state:
+            placed, unplaced = st.session_state.pop("confirm_all_result")
+            st.success(f"Confirmed {placed} appointment(s)." + (f" {unplaced} clash and stay pending." if unplaced else ""))
 
         for r in rows:
             aid = r["id"]
             astatus = r["status"]
             atime = r["time"]
+            if aid not in hot_ids:
+                continue
 
             with st.expander(f"Appointment {aid} — {atime} — {astatus.title()}"):
-                st.write(f"👤 **Patient ID:** {r['patient_id']}")
+                st.write(f"👤 **Patient:** {r['patient_name'] or '—'} ({r['patient_contact'] or '—'})")
                 st.write(f"📝 **Notes:** {r['notes'] or '—'}")
 
                 if astatus != "confirmed":
@@ -116,19 +250,25 @@ def doctor_dashboard(user):
     st.markdown("---")
     st.subheader("📤 Export Appointments")
 
-    all_rows = get_appointments_by_doctor(user["id"])
-    if all_rows:
-        df_all = pd.DataFrame(
-            [tuple(r) for r in all_rows],
-            columns=["id", "doctor_id", "patient_id", "date", "time", "duration", "status", "notes"]
-        )
-        csv = df_all.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            "⬇️ Download CSV",
-            data=csv,
-            file_name=f"appointments_doctor_{user['id']}.csv",
-            mime="text/csv"
-        )
-    else:
-        st.info("No appointments to export.")
-animate_card()
+    with st.form("export_form"):
+        exp_range = st.date_input("Date range (leave empty for all)", value=(), key="exp_range")
+        exp_status = st.multiselect("Status", list(APPOINTMENT_STATUSES), default=list(APPOINTMENT_STATUSES))
+        exp_fmt = st.selectbox("Format", EXPORT_FORMATS if parquet_available() else ("csv",))
+        exp_archive = st.checkbox("Include archived appointments")
+        prepared = st.form_submit_button("📦 Prepare export")
+    if prepared:
+        with export_appointments_file(
+            exp_fmt,
+            doctor_id=user["id"],
+            start_date=exp_range[0].isoformat() if len(exp_range) > 0 else None,
+            end_date=exp_range[-1].isoformat() if len(exp_range) > 0 else None,
+            statuses=exp_status,
+            include_archive=exp_archive,
+        ) as export_file:
+            st.download_button(
+                f"⬇️ Download {exp_fmt.upper()}",
+                data=export_file,
+                file_name=f"appointments_doctor_{user['id']}.{exp_fmt}",
+                mime="text/csv" if exp_fmt == "csv" else "application/octet-stream"
+            )
+    animate_card()
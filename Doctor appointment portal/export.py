@@ -0,0 +1,76 @@
+# export.py
+import csv
+import io
+import tempfile
+from typing import BinaryIO, TextIO
+
+from database import APPOINTMENT_COLUMNS, iter_appointment_chunks
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def write_appointments_csv(out: TextIO, **filters) -> int:
+    """
+    Stream appointments matching `filters` (see iter_appointment_chunks) into a
+    text file as CSV with a header row. Returns the number of rows written.
+    """
+    writer = csv.writer(out)
+    writer.writerow(APPOINTMENT_COLUMNS)
+    count = 0
+    for chunk in iter_appointment_chunks(**filters):
+        writer.writerows(chunk)
+        count += len(chunk)
+    return count
+
+
+def write_appointments_parquet(out, **filters) -> int:
+    """
+    Stream appointments into a Parquet file (path or binary file), one row group
+    per fetched chunk. Needs pyarrow. Returns the number of rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, pa.int64() if c == "duration" else pa.string()) for c in APPOINTMENT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for chunk in iter_appointment_chunks(**filters):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            count += len(chunk)
+    return count
+
+
+def export_appointments_file(fmt: str = "csv", **filters) -> BinaryIO:
+    """
+    Write an export to a temporary file on disk and return it rewound, ready to
+    hand to st.download_button. Rows are fetched and written one chunk at a
+    time, so building the file needs no more memory however large the history
+    is; serving it does, since st.download_button reads the whole file into
+    memory (Parquet files are several times smaller than CSV). The file is
+    deleted when closed; use the result as a context manager.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+    tmp = tempfile.TemporaryFile()
+    try:
+        if fmt == "csv":
+            text = io.TextIOWrapper(tmp, encoding="utf-8", newline="", write_through=True)
+            write_appointments_csv(text, **filters)
+            text.detach()
+        else:
+            write_appointments_parquet(tmp, **filters)
+    except BaseException:
+        tmp.close()
+        raise
+    tmp.seek(0)
+    return tmp
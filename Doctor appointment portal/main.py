@@ -1,13 +1,23 @@
 # main.py
 
-import streamlit as st
-from database import init_db
-from auth import register_user, login_user
-from doctor_ui import doctor_dashboard
-from patient_ui import patient_dashboard
-from admin_ui import admin_dashboard
-from sample_data import insert_samples
-import os
+import time
+_run_started = time.perf_counter()
+
+from startup import load, render_finished, timed
+with timed("import streamlit"):
+    import streamlit as st
+with timed("import bootstrap, auth"):
+    from bootstrap import bootstrap, sample_data_requested
+    from auth import register_user, login_user
+
+# Dashboards (and the pandas/numpy they use) are imported only when a user with
+# that role reaches one, so Home/Login/Signup never pay for them.
+DASHBOARDS = {
+    "doctor": ("doctor_ui", "doctor_dashboard"),
+    "patient": ("patient_ui", "patient_dashboard"),
+    "admin": ("admin_ui", "admin_dashboard"),
+}
+
 # Load custom CSS
 with open("styles.css") as f:
     st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
@@ -21,9 +31,9 @@ st.markdown("""
 st.set_page_config(page_title="Doctor Appointment Portal", layout="wide")
 st.title("🩺 Doctor Appointment Portal")
 
-# --- Initialize database and sample data ---
-init_db()
-insert_samples()
+# --- Migrate the database (and load sample data if requested), once per process ---
+with timed("bootstrap"):
+    bootstrap(load_samples=sample_data_requested())
 
 if "user" not in st.session_state:
     st.session_state.user = None
@@ -37,7 +47,8 @@ with st.sidebar:
 if menu == "Home":
     st.header("Welcome 👋")
     st.write("A lightweight **Doctor Appointment Portal** demo built with Streamlit + SQLite.")
-    st.info("Sample accounts:\n- **Doctor:** alice@example.com / password123\n- **Patient:** john@example.com / password123")
+    if sample_data_requested():
+        st.info("Sample accounts:\n- **Doctor:** alice@example.com / password123\n- **Patient:** john@example.com / password123")
 
 # --- SIGNUP ---
 elif menu == "Signup":
@@ -59,11 +70,8 @@ elif menu == "Signup":
     if st.button("Create Account"):
         photo_path = None
         if photo:
-            os.makedirs("data/photos", exist_ok=True)
-            save_path = os.path.join("data/photos", f"{os.urandom(4).hex()}_{photo.name}")
-            with open(save_path, "wb") as f:
-                f.write(photo.getbuffer())
-            photo_path = save_path
+            from photos import store_photo
+            photo_path = store_photo(photo.getvalue(), photo.name)
 
         success, msg = register_user(
             name, email, password, role,
@@ -110,11 +118,9 @@ if st.session_state.user:
         st.session_state.user = None
         st.rerun()
 
-    if role == "doctor":
-        doctor_dashboard(user)
-    elif role == "patient":
-        patient_dashboard(user)
-    elif role == "admin":
-        admin_dashboard(user)
+    if role in DASHBOARDS:
+        load(*DASHBOARDS[role])(user)
 else:
     st.info("Please login or signup to access dashboards.")
+
+render_finished(_run_started)
@@ -1,16 +1,25 @@
 # patient_ui.py
 import streamlit as st
-import pandas as pd
-from datetime import date
-from streamlit.components.v1 import html
+from datetime import date, datetime, timedelta
 from database import (
-    get_all_doctors,
+    DOCTOR_SEARCH_COLUMNS,
+    DOCTOR_SEARCH_LIMIT,
+    available_slots,
+    export_appointments_df,
+    search_doctors,
     book_appointment,
-    get_appointments_by_patient,
+    get_appointment_details,
+    get_patient_calendar,
     update_appointment_status,
 )
+from calendar_ui import CALENDAR_VIEWS, calendar_range, pick_day, render_heatmap
+
+MY_APPOINTMENTS_COLUMNS = ("id", "date", "time", "duration", "status", "notes",
+                           "doctor_name", "doctor_specialization", "doctor_contact")
+CALENDAR_FULL_DAY = 3  # appointments that colour a calendar day fully
 
 def animate_card():
+    from streamlit.components.v1 import html
     html("""
     <script>
     const cards = document.querySelectorAll('.stDataFrame, .stExpander');
@@ -25,43 +34,50 @@ def animate_card():
     </script>
     """, height=0)
 def patient_dashboard(user):
+    import pandas as pd  # heavy; loaded on the first render, not at import
+
     st.title("👩‍⚕️ Patient Dashboard")
     st.sidebar.header(f"Welcome, {user['name']}")
     st.markdown("---")
 
-    tabs = st.tabs(["📅 Book Appointment", "🗂 My Appointments"])
+    tabs = st.tabs(["📅 Book Appointment", "🗂 My Appointments", "🗓️ Calendar"])
 
     # --- Tab 1: Book Appointment ---
     with tabs[0]:
         st.subheader("Find a Doctor")
 
-        doctors = get_all_doctors()
-        if not doctors:
-            st.info("No doctors registered yet.")
-        else:
-            df = pd.DataFrame(
-                [tuple(d) for d in doctors],
-                columns=[
-                    "id",
-                    "name",
-                    "email",
-                    "password",
-                    "role",
-                    "specialization",
-                    "experience",
-                    "contact",
-                    "photo_path",
-                ],
+        with st.expander("⚡ First available slot"):
+            fa_spec = st.text_input("Specialization (optional)", key="fa_spec")
+            fa_range = st.date_input(
+                "Between", value=(date.today(), date.today() + timedelta(days=7)), key="fa_range"
             )
+            fa_duration = st.selectbox("Duration (minutes)", [15, 30, 45, 60], index=1, key="fa_duration")
+            if st.button("🔎 Find earliest slots", key="fa_search"):
+                if len(fa_range) != 2:
+                    st.warning("Pick a start and an end date.")
+                else:
+                    from slot_search import find_earliest_slots  # pulls in numpy
+                    slots = find_earliest_slots(
+                        fa_range[0].isoformat(),
+                        fa_range[1].isoformat(),
+                        fa_duration,
+                        fa_spec.strip() or None,
+                        not_before=datetime.now(),
+                    )
+                    if slots:
+                        st.dataframe(
+                            pd.DataFrame(slots)[["date", "time", "name", "specialization"]],
+                            use_container_width=True,
+                        )
+                    else:
+                        st.warning("No free slots in that range.")
 
-            search = st.text_input("🔍 Search doctor by name or specialization")
-            display_df = df
-            if search:
-                mask = (
-                    df["name"].str.contains(search, case=False, na=False)
-                    | df["specialization"].str.contains(search, case=False, na=False)
-                )
-                display_df = df[mask]
+        search = st.text_input("🔍 Search doctor by name, specialization or location")
+        doctors = search_doctors(search, limit=DOCTOR_SEARCH_LIMIT)
+        if not doctors and not search:
+            st.info("No doctors registered yet.")
+        else:
+            display_df = pd.DataFrame(doctors, columns=list(DOCTOR_SEARCH_COLUMNS))
 
             if display_df.empty:
                 st.warning("No matching doctors found.")
@@ -72,28 +88,43 @@ def patient_dashboard(user):
                 )
 
                 st.markdown("### 🗓️ Book Appointment")
-                doctor_name = st.selectbox("Select Doctor", display_df["name"].tolist())
-                selected_row = display_df[display_df["name"] == doctor_name].iloc[0]
+                doctor_idx = st.selectbox(
+                    "Select Doctor",
+                    range(len(display_df)),
+                    format_func=lambda i: f"{display_df['name'].iloc[i]} — {display_df['specialization'].iloc[i] or '—'}",
+                )
+                selected_row = display_df.iloc[doctor_idx]
 
                 appt_date = st.date_input("Select Date", value=date.today())
-                appt_time = st.time_input("Select Time")
                 duration = st.selectbox(
                     "Duration (minutes)", [15, 30, 45, 60], index=1
                 )
+                slots = available_slots(selected_row["id"], appt_date.isoformat(), duration)
+                if slots is None:
+                    # Doctor has not published a schedule: any time may be requested.
+                    appt_time = st.time_input("Select Time").strftime("%H:%M")
+                elif slots:
+                    appt_time = st.selectbox("Select Time", slots)
+                else:
+                    appt_time = None
+                    st.warning("No free slots with this doctor on that day.")
                 notes = st.text_area("Notes for Doctor")
 
-                if st.button("💬 Book Appointment"):
-                    success = book_appointment(
+                if st.button("💬 Book Appointment", disabled=appt_time is None):
+                    result = book_appointment(
                         selected_row["id"],
                         user["id"],
                         appt_date.isoformat(),
-                        appt_time.strftime("%H:%M"),
+                        appt_time,
                         duration,
                         "pending",
                         notes,
                     )
-                    if success:
+                    if result:
                         st.success("✅ Appointment booked successfully! Awaiting confirmation.")
+                    elif result.suggested_time:
+                        problem = "is taken" if result.reason == "conflict" else "is outside the doctor's hours"
+                        st.error(f"❌ That slot {problem} — nearest free time is {result.suggested_time}.")
                     else:
                         st.error("❌ Failed to book appointment — slot conflict or unavailable.")
 
@@ -101,23 +132,14 @@ def patient_dashboard(user):
     with tabs[1]:
         st.subheader("My Appointments")
 
-        rows = get_appointments_by_patient(user["id"])
-        if not rows:
+        show_history = st.checkbox("Include archived history", key="my_appts_history")
+        rows = get_appointment_details(patient_id=user["id"], columns=MY_APPOINTMENTS_COLUMNS)
+        listed = (get_appointment_details(patient_id=user["id"], columns=MY_APPOINTMENTS_COLUMNS, include_archive=True)
+                  if show_history else rows)
+        if not listed:
             st.info("No appointments found.")
         else:
-            df = pd.DataFrame(
-                [tuple(r) for r in rows],
-                columns=[
-                    "id",
-                    "doctor_id",
-                    "patient_id",
-                    "date",
-                    "time",
-                    "duration",
-                    "status",
-                    "notes",
-                ],
-            )
+            df = export_appointments_df(listed)
 
             df["status_icon"] = df["status"].apply(
                 lambda s: "🟢 Confirmed"
@@ -128,18 +150,59 @@ def patient_dashboard(user):
             )
 
             st.dataframe(
-                df[["date", "time", "duration", "status_icon", "notes"]],
+                df[["date", "time", "duration", "doctor_name", "doctor_specialization", "status_icon", "notes"]],
                 use_container_width=True,
             )
 
+            # Archived appointments are history: listed above, but not editable.
             for r in rows:
                 aid = r["id"]
                 with st.expander(f"Appointment {aid} — {r['date']} {r['time']}"):
-                    st.write(f"👨‍⚕️ **Doctor ID:** {r['doctor_id']}")
+                    st.write(f"👨‍⚕️ **Doctor:** {r['doctor_name'] or '—'} "
+                             f"({r['doctor_specialization'] or '—'}, {r['doctor_contact'] or '—'})")
                     st.write(f"📝 **Notes:** {r['notes'] or '—'}")
 
                     if r["status"] != "cancelled":
                         if st.button(f"❌ Cancel Appointment {aid}", key=f"cancel_{aid}"):
                             update_appointment_status(aid, "cancelled")
                             st.rerun()
-animate_card()
\ No newline at end of file
+
+    # --- Tab 3: Calendar ---
+    with tabs[2]:
+        st.subheader("My Calendar")
+
+        # One query per week or month; appointment rows only for the picked day.
+        col_view, col_anchor = st.columns([1, 2])
+        view = col_view.radio("View", CALENDAR_VIEWS, horizontal=True, key="pat_cal_view")
+        anchor = col_anchor.date_input("Showing", value=date.today(), key="pat_cal_anchor")
+        cal_start, cal_end = calendar_range(anchor, view)
+        history = cal_start < date.today()
+        cal_days = {r["date"]: r for r in get_patient_calendar(
+            user["id"], cal_start.isoformat(), cal_end.isoformat(), include_archive=history)}
+
+        def day_label(d: str) -> str:
+            r = cal_days.get(d)
+            if r is None:
+                return ""
+            active = r["pending"] + r["confirmed"]
+            return f"{active} booked" + (f", {r['cancelled']} cancelled" if r["cancelled"] else "")
+
+        render_heatmap(cal_start, cal_end,
+                       lambda d: (cal_days[d]["pending"] + cal_days[d]["confirmed"]) / CALENDAR_FULL_DAY
+                       if d in cal_days else None,
+                       day_label)
+        col_booked, col_pending, col_hours = st.columns(3)
+        col_booked.metric("Booked", sum(r["pending"] + r["confirmed"] for r in cal_days.values()))
+        col_pending.metric("Awaiting confirmation", sum(r["pending"] for r in cal_days.values()))
+        col_hours.metric("Hours booked", f"{sum(r['booked_minutes'] for r in cal_days.values()) / 60:.1f}")
+
+        picked = pick_day("pat_cal_day", list(cal_days), {d: day_label(d) for d in cal_days})
+        if picked:
+            detail = get_appointment_details(patient_id=user["id"], start_date=picked, end_date=picked,
+                                             columns=MY_APPOINTMENTS_COLUMNS, include_archive=history)
+            if detail:
+                st.dataframe(export_appointments_df(detail)[
+                    ["time", "duration", "doctor_name", "doctor_specialization", "status", "notes"]])
+            else:
+                st.info("No appointments on this date.")
+    animate_card()
\ No newline at end of file
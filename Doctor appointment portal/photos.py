@@ -0,0 +1,114 @@
+# photos.py
+import hashlib
+import io
+import os
+import re
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+# Content-addressed store: a photo lives at <PHOTO_DIR>/<aa>/<sha256>.<ext>, so
+# identical uploads share one file and a stored file never changes. That makes
+# read caching safe without any invalidation.
+PHOTO_DIR = "data/photos"
+THUMBNAIL_SIZE = 128  # square avatar edge in pixels, generated once at upload
+THUMBNAIL_SUFFIX = "_thumb"
+PHOTO_CACHE_ENTRIES = 256
+
+_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp"}
+_STORE_NAME = re.compile(r"[0-9a-f]{64}(%s)?\.\w+" % THUMBNAIL_SUFFIX)
+
+
+def _write_once(path: str, data: bytes) -> None:
+    """Write `data` to `path` unless it exists; a temp file + rename keeps readers from seeing partial files."""
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _make_thumbnail(data: bytes) -> Optional[tuple]:
+    """(bytes, extension) of a THUMBNAIL_SIZE square crop, or None without Pillow or for unreadable images."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img)
+            thumb = ImageOps.fit(img, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    out = io.BytesIO()
+    if thumb.mode in ("RGBA", "LA", "P"):
+        thumb.save(out, "PNG", optimize=True)
+        return out.getvalue(), ".png"
+    thumb.convert("RGB").save(out, "JPEG", quality=85, optimize=True)
+    return out.getvalue(), ".jpg"
+
+
+def store_photo(data: bytes, filename: str = "") -> str:
+    """
+    Save an uploaded photo and its thumbnail, returning the photo's store path
+    (the value for users.photo_path). Uploading the same bytes again returns
+    the existing path without writing anything.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in _EXTENSIONS:
+        ext = ".img"
+    folder = os.path.join(PHOTO_DIR, digest[:2])
+    path = os.path.join(folder, digest + ext)
+    _write_once(path, data)
+    if _find_thumbnail(path) is None:
+        thumb = _make_thumbnail(data)
+        if thumb is not None:
+            _write_once(os.path.join(folder, digest + THUMBNAIL_SUFFIX + thumb[1]), thumb[0])
+    return path
+
+
+def _find_thumbnail(photo_path: str) -> Optional[str]:
+    base = os.path.splitext(photo_path)[0] + THUMBNAIL_SUFFIX
+    for ext in (".jpg", ".png"):
+        if os.path.exists(base + ext):
+            return base + ext
+    return None
+
+
+def is_stored(path: str) -> bool:
+    """True for a path inside the content-addressed store."""
+    return _STORE_NAME.fullmatch(os.path.basename(path)) is not None
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+_read_thumbnail = lru_cache(maxsize=PHOTO_CACHE_ENTRIES)(_read_bytes)
+
+
+def photo_bytes(photo_path: Optional[str], thumbnail: bool = True) -> Optional[bytes]:
+    """
+    Bytes to hand to st.image for a users.photo_path: the thumbnail when one
+    exists, served from memory after the first read, else the original.
+    Originals are read uncached: they can be megabytes each, and without
+    Pillow there are no thumbnails, so caching them would keep up to
+    PHOTO_CACHE_ENTRIES full-size uploads in memory. Files outside the store
+    could be replaced and are never cached. Returns None for a missing photo.
+    """
+    if not photo_path or not os.path.exists(photo_path):
+        return None
+    if thumbnail and is_stored(photo_path):
+        thumb = _find_thumbnail(photo_path)
+        if thumb is not None:
+            return _read_thumbnail(thumb)
+    return _read_bytes(photo_path)
@@ -0,0 +1,316 @@
+# query_stats.py
+import bisect
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+# Latency instrumentation for the data layer. database.py opens every
+# connection with InstrumentedConnection, so each statement is timed from
+# execute to its last fetch, and wraps its public functions with `timed` for
+# per-function numbers. Recording is a few dict and list updates under a lock;
+# set_enabled(False) reduces both hooks to a single flag check.
+
+ENABLED = os.environ.get("PORTAL_QUERY_STATS", "1").strip().lower() not in ("0", "false", "no")
+SLOW_QUERY_MS = 100.0
+SLOW_LOG_SIZE = 200
+MAX_STATEMENTS = 500  # distinct statements tracked; later ones are counted under OTHER_STATEMENTS
+OTHER_STATEMENTS = "(other statements)"
+# Histogram bucket upper bounds in milliseconds; a final bucket catches the rest.
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with count, total, max and row totals."""
+    __slots__ = ("counts", "count", "total", "max", "rows")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+
+    def observe(self, ms: float, rows: int = 0) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.rows += rows
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, q: float) -> float:
+        """Upper bound (ms) of the bucket holding the q-th quantile; max for the last bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max,
+            "total_ms": self.total,
+            "rows": self.rows,
+            "buckets": dict(zip([f"<={b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], self.counts)),
+        }
+
+
+_lock = threading.Lock()
+_functions: Dict[str, LatencyHistogram] = {}
+_statements: Dict[str, LatencyHistogram] = {}
+_lock_waits: Dict[str, LatencyHistogram] = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_statement_keys: Dict[str, str] = {}
+_current = threading.local()  # name of the instrumented function running on this thread
+
+
+def set_enabled(flag: bool) -> None:
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def set_slow_threshold(ms: float) -> None:
+    global SLOW_QUERY_MS
+    SLOW_QUERY_MS = float(ms)
+
+
+def reset() -> None:
+    with _lock:
+        _functions.clear()
+        _statements.clear()
+        _lock_waits.clear()
+        _slow_log.clear()
+
+
+def _observe(table: Dict[str, LatencyHistogram], key: str, ms: float, rows: int = 0) -> None:
+    with _lock:
+        hist = table.get(key)
+        if hist is None:
+            if table is _statements and len(table) >= MAX_STATEMENTS:
+                key = OTHER_STATEMENTS
+                hist = table.get(key)
+            if hist is None:
+                hist = table[key] = LatencyHistogram()
+        hist.observe(ms, rows)
+
+
+def record_lock_wait(lock_name: str, seconds: float) -> None:
+    if ENABLED:
+        _observe(_lock_waits, lock_name, seconds * 1000)
+
+
+def _statement_key(sql: str) -> str:
+    # Statement texts are mostly module constants, so the whitespace-collapsed
+    # key is computed once per distinct text.
+    key = _statement_keys.get(sql)
+    if key is None:
+        key = " ".join(sql.split())
+        if len(_statement_keys) < MAX_STATEMENTS * 4:
+            _statement_keys[sql] = key
+    return key
+
+
+def _record_statement(conn: sqlite3.Connection, sql: str, params, seconds: float, rows: int,
+                      explain: bool = True) -> None:
+    ms = seconds * 1000
+    key = _statement_key(sql)
+    _observe(_statements, key, ms, rows)
+    if ms < SLOW_QUERY_MS:
+        return
+    plan: List[str] = []
+    if explain and key.split(" ", 1)[0].upper() in ("SELECT", "WITH"):
+        try:
+            cur = sqlite3.Connection.execute(conn, f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = [row[3] for row in sqlite3.Cursor.fetchall(cur)]
+        except sqlite3.Error:
+            pass
+    with _lock:
+        _slow_log.append({
+            "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(ms, 3),
+            "rows": rows,
+            "function": getattr(_current, "name", None),
+            "sql": key,
+            "plan": plan,
+        })
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times a statement from execute() through its fetches."""
+
+    _pending = None  # [sql, params, seconds so far, rows so far] until the result is consumed
+
+    def execute(self, sql, params=()):
+        if not ENABLED:
+            self._pending = None
+            return super().execute(sql, params)
+        started = time.perf_counter()
+        super().execute(sql, params)
+        elapsed = time.perf_counter() - started
+        if self.description is None:  # no result set: INSERT/UPDATE/DDL/BEGIN
+            self._pending = None
+            _record_statement(self.connection, sql, params, elapsed, max(self.rowcount, 0))
+        else:
+            self._pending = [sql, params, elapsed, 0]
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        if not ENABLED:
+            return super().executemany(sql, seq_of_params)
+        started = time.perf_counter()
+        super().executemany(sql, seq_of_params)
+        _record_statement(self.connection, sql, (), time.perf_counter() - started, max(self.rowcount, 0))
+        return self
+
+    def _finish(self, explain: bool = True) -> None:
+        pending, self._pending = self._pending, None
+        _record_statement(self.connection, pending[0], pending[1], pending[2], pending[3], explain)
+
+    def __next__(self):
+        if self._pending is None:
+            return super().__next__()
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._pending[2] += time.perf_counter() - started
+            self._finish()
+            raise
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += 1
+        return row
+
+    def fetchone(self):
+        if self._pending is None:
+            return super().fetchone()
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += row is not None
+        self._finish()
+        return row
+
+    def fetchall(self):
+        if self._pending is None:
+            return super().fetchall()
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        self._finish()
+        return rows
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        if self._pending is None:
+            return super().fetchmany(size)
+        started = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._pending[2] += time.perf_counter() - started
+        self._pending[3] += len(rows)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def close(self):
+        if self._pending is not None:
+            self._finish()  # early close: record what we have
+        super().close()
+
+    def __del__(self):
+        # Abandoned before the end: record what we have. No EXPLAIN here; a
+        # finalizer may run on any thread, mid-statement on the connection.
+        if self._pending is not None:
+            self._finish(explain=False)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including the conn.execute shortcuts) are InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+def timed(fn):
+    """Record fn's latency (and result length, for lists) under its name."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not ENABLED:
+            return fn(*args, **kwargs)
+        outer = getattr(_current, "name", None)
+        _current.name = name
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            _current.name = outer
+            elapsed = time.perf_counter() - started
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        _observe(_functions, name, elapsed * 1000, rows)
+        return result
+
+    return wrapper
+
+
+def snapshot() -> dict:
+    """Copy of everything recorded so far, as plain dicts, slowest totals first."""
+    with _lock:
+        def table(source):
+            rows = [{"name": key, **hist.to_dict()} for key, hist in source.items()]
+            return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+        return {
+            "enabled": ENABLED,
+            "slow_query_ms": SLOW_QUERY_MS,
+            "functions": table(_functions),
+            "statements": table(_statements),
+            "lock_waits": table(_lock_waits),
+            "slow_queries": list(reversed(_slow_log)),
+        }
+
+
+class TimedLock:
+    """Re-entrant lock that records how long callers wait when it is contended."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.RLock()
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        if self._lock.acquire(blocking=False):
+            return True
+        if not blocking:
+            return False
+        started = time.perf_counter()
+        acquired = self._lock.acquire(True, timeout)
+        record_lock_wait(self.name, time.perf_counter() - started)
+        return acquired
+
+    def release(self) -> None:
+        self._lock.release()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc) -> None:
+        self._lock.release()
@@ -10,5 +10,5 @@ def insert_samples():
     register_user("John Doe", "john@example.com", "password123", "patient", contact="N/A")
 
 if __name__ == "__main__":
-    insert_samples()
-    print("Inserted sample users (if not already present).")
+    from bootstrap import main
+    main(["--samples"])
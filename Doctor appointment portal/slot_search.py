@@ -0,0 +1,228 @@
+# slot_search.py
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from database import fetch_columns, get_conn
+from utils import MINUTES_PER_DAY, epoch_day, minutes_to_time_str, time_str_to_minutes
+
+
+def _date_range(start_date: str, end_date: str) -> List[str]:
+    first = date.fromisoformat(start_date)
+    last = date.fromisoformat(end_date)
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+# Doctor-day rows per NumPy pass. Each row costs about 15 KB of working arrays
+# at full-day width, so a pass stays near 30 MB however many doctors and days
+# are searched; blocks run day by day and stop once `limit` slots are found.
+SLOT_SEARCH_BLOCK_ROWS = 2048
+
+
+def _load_schedules(conn, doctor_ids: set, days: List[str]):
+    """Weekly templates by doctor and weekday, and date exceptions by (doctor, date), for the searched doctors."""
+    templates = {}
+    for row in conn.execute("SELECT * FROM availability").fetchall():
+        if row["doctor_id"] in doctor_ids:
+            templates.setdefault(row["doctor_id"], {})[row["weekday"]] = row
+    exceptions = {}
+    for row in conn.execute("SELECT * FROM availability_exceptions WHERE date BETWEEN ? AND ?",
+                            (days[0], days[-1])).fetchall():
+        if row["doctor_id"] in doctor_ids:
+            exceptions[(row["doctor_id"], row["date"])] = row
+    return templates, exceptions
+
+
+def _working_windows(templates, exceptions, doctors, days, default_lo: int, default_hi: int):
+    """
+    Per doctor-day [lo, hi) working minutes and slot grid (0 when the doctor has
+    no slot length), from the weekly templates and date exceptions (same rules
+    as database.get_day_hours). Doctors without a template get
+    [default_lo, default_hi).
+    """
+    weekdays = [date.fromisoformat(d).weekday() for d in days]
+    shape = (len(doctors), len(days))
+    lo = np.full(shape, default_lo, dtype=np.int32)
+    hi = np.full(shape, default_hi, dtype=np.int32)
+    grid = np.zeros(shape, dtype=np.int32)
+
+    def hours(row):
+        if not row or not row["start_time"] or not row["end_time"]:
+            return 0, 0, 0
+        return time_str_to_minutes(row["start_time"]), time_str_to_minutes(row["end_time"]), row["slot_minutes"] or 0
+
+    for i, doctor in enumerate(doctors):
+        by_weekday = templates.get(doctor["id"])
+        if by_weekday is not None:
+            for j, wd in enumerate(weekdays):
+                lo[i, j], hi[i, j], grid[i, j] = hours(by_weekday.get(wd))
+        for j, day in enumerate(days):
+            row = exceptions.get((doctor["id"], day))
+            if row is not None:
+                lo[i, j], hi[i, j], grid[i, j] = hours(row)
+    return lo.ravel(), hi.ravel(), grid.ravel()
+
+
+def _free_starts(lo, hi, grid, n_days: int, booked, duration: int, step: Optional[int],
+                 first_day: int, not_before: Optional[datetime]):
+    """
+    (row, minute of day) of every free start in one block of doctor-day rows
+    (doctor-major, n_days per doctor). `booked` holds (row, start, end) arrays
+    of the block's appointments in minutes of their day.
+    """
+    open_rows = hi - lo >= duration
+    if not open_rows.any():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    win_start = int(lo[open_rows].min())
+    width = int(hi[open_rows].max()) - win_start
+    slot_len, grid = grid, np.where(grid > 0, grid, step or duration)
+    n_rows = lo.size
+
+    # --- Occupancy: difference array per doctor-day row, then cumulative sum ---
+    diff = np.zeros((n_rows, width + 1), dtype=np.int16)
+    rows, starts, ends = booked
+    starts = np.clip(starts - win_start, 0, width)
+    ends = np.clip(ends - win_start, 0, width)
+    inside = ends > starts
+    np.add.at(diff, (rows[inside], starts[inside]), 1)
+    np.add.at(diff, (rows[inside], ends[inside]), -1)
+    busy = np.cumsum(diff[:, :width], axis=1) > 0
+    del diff
+
+    # --- Working hours: minutes outside each doctor-day's schedule count as busy ---
+    lo, hi = lo - win_start, hi - win_start
+    minute = np.arange(width, dtype=np.int32)
+    busy |= (minute[None, :] < lo[:, None]) | (minute[None, :] >= hi[:, None])
+
+    # --- Free-run test for every candidate start of every row at once ---
+    busy_prefix = np.zeros((n_rows, width + 1), dtype=np.uint16)
+    np.cumsum(busy, axis=1, out=busy_prefix[:, 1:])
+    del busy
+    # Candidate columns are the starts on any open row's grid; each row keeps its own below.
+    grids = {(int(a), int(g)) for a, g in zip(lo[open_rows], grid[open_rows])}
+    candidates = np.unique(np.concatenate([np.arange(a, width - duration + 1, g, dtype=np.int32)
+                                           for a, g in grids]))
+    offset = candidates[None, :] - lo[:, None]
+    # On the row's own slot grid, and (like generate_slots) a whole slot fits in the hours.
+    free = (offset >= 0) & (offset % grid[:, None] == 0) & (offset + slot_len[:, None] <= (hi - lo)[:, None])
+    del offset
+    free &= (busy_prefix[:, candidates + duration] - busy_prefix[:, candidates]) == 0
+
+    if not_before is not None:
+        day_numbers = first_day + np.arange(n_days)
+        cutoff_day = epoch_day(not_before.date().isoformat())
+        slot_min = (win_start + candidates)[None, :]
+        too_early = (day_numbers[:, None] < cutoff_day) | (
+            (day_numbers[:, None] == cutoff_day) & (slot_min < not_before.hour * 60 + not_before.minute))
+        free &= ~np.tile(too_early, (n_rows // n_days, 1))  # rows are doctor-major
+
+    row_hit, cand_hit = np.nonzero(free)
+    return row_hit, win_start + candidates[cand_hit]
+
+
+def find_earliest_slots(start_date: str, end_date: str, duration: int,
+                        specialization: Optional[str] = None,
+                        day_start: str = "09:00", day_end: str = "17:00",
+                        step: Optional[int] = None, limit: int = 10,
+                        per_doctor: Optional[int] = 1,
+                        not_before: Optional[datetime] = None) -> List[dict]:
+    """
+    Earliest free slots of `duration` minutes across all doctors (optionally one
+    specialization) between start_date and end_date inclusive ('YYYY-MM-DD').
+
+    Every doctor-day becomes one row of a minute-occupancy matrix spanning all
+    their working hours, filled from one appointments query per block of days
+    and narrowed to each doctor's own hours, so the doctor-days of a block
+    (at most SLOT_SEARCH_BLOCK_ROWS) are tested for free runs in one batched
+    NumPy pass. Doctors without a schedule are assumed to work
+    day_start–day_end. Candidate starts lie on each doctor-day's slot grid from
+    the start of their hours, as in database.available_slots; without a slot
+    length they are every `step` minutes (default: `duration`).
+    At most `per_doctor` slots are returned per doctor (None = no cap).
+    Returns dicts with doctor_id, name, specialization, date and time, earliest first.
+    """
+    conn = get_conn()
+    if specialization:
+        doctors = conn.execute("""
+            SELECT id, name, specialization FROM users
+            WHERE role = 'doctor' AND specialization = ? COLLATE NOCASE
+            ORDER BY name
+        """, (specialization,)).fetchall()
+    else:
+        doctors = conn.execute("""
+            SELECT id, name, specialization FROM users WHERE role = 'doctor' ORDER BY name
+        """).fetchall()
+    days = _date_range(start_date, end_date)
+    if not doctors or not days or limit <= 0:
+        return []
+    templates, exceptions = _load_schedules(conn, {d["id"] for d in doctors}, days)
+    default_lo, default_hi = time_str_to_minutes(day_start), time_str_to_minutes(day_end)
+    doc_index = {d["id"]: i for i, d in enumerate(doctors)}
+    # Blocks of whole days for every doctor, or one day for a slice of the doctors.
+    days_per_block = max(1, SLOT_SEARCH_BLOCK_ROWS // len(doctors))
+    docs_per_block = min(len(doctors), SLOT_SEARCH_BLOCK_ROWS)
+    taken = np.zeros(len(doctors), dtype=np.int64)  # slots returned per doctor so far
+    results = []
+
+    for d0 in range(0, len(days), days_per_block):
+        block_days = days[d0:d0 + days_per_block]
+        first_day = epoch_day(block_days[0])
+        # Integer start/end minutes come straight out of the start_min index.
+        found = fetch_columns("""
+            SELECT doctor_id, start_min, end_min FROM appointments
+            WHERE start_min >= ? AND start_min < ? AND status != 'cancelled'
+        """, (first_day * MINUTES_PER_DAY, (first_day + len(block_days)) * MINUTES_PER_DAY))
+        n_found = len(found["doctor_id"])
+        found_docs = np.fromiter((doc_index.get(d, -1) for d in found["doctor_id"]), dtype=np.int64,
+                                 count=n_found)
+        start_min = np.array(found["start_min"], dtype=np.int64)
+        end_min = np.array(found["end_min"], dtype=np.int64)
+        found_days, found_starts = np.divmod(start_min - first_day * MINUTES_PER_DAY, MINUTES_PER_DAY)
+        found_ends = found_starts + (end_min - start_min)
+
+        doc_hits, day_hits, minute_hits = [], [], []
+        for i0 in range(0, len(doctors), docs_per_block):
+            block_doctors = doctors[i0:i0 + docs_per_block]
+            lo, hi, grid = _working_windows(templates, exceptions, block_doctors, block_days,
+                                            default_lo, default_hi)
+            mine = (found_docs >= i0) & (found_docs < i0 + len(block_doctors))
+            booked = ((found_docs[mine] - i0) * len(block_days) + found_days[mine],
+                      found_starts[mine], found_ends[mine])
+            rows, minutes = _free_starts(lo, hi, grid, len(block_days), booked, duration, step,
+                                         first_day, not_before)
+            doc_hit, day_hit = np.divmod(rows, len(block_days))
+            doc_hits.append(doc_hit + i0)
+            day_hits.append(day_hit + d0)
+            minute_hits.append(minutes)
+        doc_hit, day_hit, minute_hit = (np.concatenate(a) for a in (doc_hits, day_hits, minute_hits))
+        if doc_hit.size == 0:
+            continue
+        order = np.lexsort((doc_hit, minute_hit, day_hit))  # by day, then minute, then doctor
+        doc_hit, day_hit, minute_hit = doc_hit[order], day_hit[order], minute_hit[order]
+
+        if per_doctor is not None:
+            # Rank of each hit within its doctor, in time order, after earlier blocks' slots.
+            by_doc = np.argsort(doc_hit, kind="stable")
+            sorted_docs = doc_hit[by_doc]
+            first = np.searchsorted(sorted_docs, sorted_docs, side="left")
+            rank = np.empty_like(by_doc)
+            rank[by_doc] = np.arange(by_doc.size) - first
+            mask = rank + taken[doc_hit] < per_doctor
+            doc_hit, day_hit, minute_hit = doc_hit[mask], day_hit[mask], minute_hit[mask]
+
+        room = limit - len(results)
+        doc_hit, day_hit, minute_hit = doc_hit[:room], day_hit[:room], minute_hit[:room]
+        np.add.at(taken, doc_hit, 1)
+        for di, dy, m in zip(doc_hit, day_hit, minute_hit):
+            doctor = doctors[int(di)]
+            results.append({
+                "doctor_id": doctor["id"],
+                "name": doctor["name"],
+                "specialization": doctor["specialization"],
+                "date": days[int(dy)],
+                "time": minutes_to_time_str(int(m)),
+            })
+        if len(results) >= limit:
+            break  # later blocks hold later days only
+    return results
@@ -0,0 +1,76 @@
+# startup.py
+import importlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# Set to 1/true/yes to time imports and the first page render; the report goes
+# to stderr once per process. For a per-module breakdown use `python -X importtime`.
+PROFILE_ENV = "PORTAL_PROFILE_STARTUP"
+PROFILE_ENABLED = os.environ.get(PROFILE_ENV, "").strip().lower() in ("1", "true", "yes")
+
+_process_start = time.perf_counter()
+_timings: List[Tuple[str, float]] = []
+_first_render_done = False
+
+
+@contextmanager
+def timed(label: str):
+    """
+    Record how long the block takes under `label`. A no-op unless profiling,
+    and after the first render, so Streamlit reruns add nothing.
+    """
+    if not PROFILE_ENABLED or _first_render_done:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.append((label, time.perf_counter() - started))
+
+
+def load(module_name: str, attr: str):
+    """
+    Import `module_name` on first use and return its `attr`. Only the first,
+    real import of a module is recorded; later calls hit sys.modules.
+    """
+    if module_name in sys.modules:
+        return getattr(sys.modules[module_name], attr)
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if PROFILE_ENABLED:
+        elapsed = time.perf_counter() - started
+        if _first_render_done:
+            # A dashboard first reached after login, on a later rerun.
+            print(f"Startup profile: import {module_name} {elapsed * 1000:.1f} ms", file=sys.stderr)
+        else:
+            _timings.append((f"import {module_name}", elapsed))
+    return getattr(module, attr)
+
+
+def render_finished(started: float) -> None:
+    """
+    Call at the end of each script run with the perf_counter() value taken at
+    its start. The first run of the process records its render time and
+    writes the report.
+    """
+    global _first_render_done
+    if _first_render_done:
+        return
+    _first_render_done = True
+    if not PROFILE_ENABLED:
+        return
+    now = time.perf_counter()
+    _timings.append(("first render", now - started))
+    _timings.append(("first import to first render", now - _process_start))
+    print(startup_report(), file=sys.stderr)
+
+
+def startup_report() -> str:
+    width = max((len(label) for label, _ in _timings), default=0)
+    lines = ["Startup profile:"]
+    lines += [f"  {label:<{width}}  {seconds * 1000:8.1f} ms" for label, seconds in _timings]
+    return "\n".join(lines)
@@ -0,0 +1,223 @@
+# synthetic_data.py
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, timedelta
+from typing import List, Optional
+
+import database
+from auth import hash_password
+from utils import minutes_to_time_str
+
+# Seeded generator for production-sized datasets. The same arguments always
+# produce the same rows (ids included), so benchmark runs are comparable.
+# Rows go in with executemany into bare tables; indexes, summaries and the
+# search index are built afterwards by the remaining migrations, which is far
+# faster than maintaining them row by row.
+
+SPECIALIZATIONS = (
+    ("General Practice", 30), ("Pediatrics", 12), ("Cardiology", 8), ("Dermatology", 8),
+    ("Orthopedics", 7), ("Gynecology", 7), ("Psychiatry", 6), ("Ophthalmology", 5),
+    ("ENT", 5), ("Neurology", 4), ("Gastroenterology", 4), ("Endocrinology", 3),
+    ("Urology", 3), ("Oncology", 2),
+)
+FIRST_NAMES = (
+    "Aisha", "Ali", "Amina", "Bilal", "Carlos", "Chen", "David", "Elena", "Fatima", "Hassan",
+    "Ines", "James", "Julia", "Kenji", "Layla", "Maria", "Mohammed", "Nadia", "Omar", "Priya",
+    "Rahul", "Sara", "Sofia", "Tariq", "Usman", "Wei", "Yusuf", "Zainab",
+)
+LAST_NAMES = (
+    "Ahmed", "Ali", "Brown", "Chaudhry", "Garcia", "Haddad", "Iqbal", "Johnson", "Khan", "Kim",
+    "Lopez", "Malik", "Nguyen", "Patel", "Qureshi", "Rossi", "Santos", "Shah", "Smith", "Tanaka",
+    "Wang", "Williams", "Yilmaz", "Zhang",
+)
+CITIES = (
+    "City Hospital", "Central Clinic", "North Medical Centre", "Lakeside Clinic",
+    "University Hospital", "Riverside Health", "Westgate Surgery", "Hillview Hospital",
+)
+DURATION_WEIGHTS = ((15, 20), (30, 50), (45, 15), (60, 15))
+DAY_START, DAY_END = 9 * 60, 17 * 60
+SATURDAY_SHARE = 0.35  # doctors who also work Saturday mornings
+SATURDAY_END = 13 * 60
+# (cancelled, pending) probabilities; the rest are confirmed.
+PAST_STATUS = (0.12, 0.03)
+FUTURE_STATUS = (0.05, 0.55)
+NOTES = (None, None, None, "Follow-up", "First visit", "Test results", "Prescription renewal")
+
+ANCHOR_DATE = "2025-06-02"  # "today" of the dataset; fixed so output is deterministic
+HISTORY_DAYS = 365
+FUTURE_DAYS = 60
+INSERT_CHUNK_ROWS = 50000
+DEFAULT_PASSWORD = "password123"
+
+
+def _uuid(rng: random.Random) -> str:
+    # uuid4-shaped text straight from the seeded generator; building uuid.UUID
+    # objects costs more than the rest of an appointment row.
+    h = f"{rng.getrandbits(128):032x}"
+    return f"{h[:8]}-{h[8:12]}-4{h[13:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _insert(conn: sqlite3.Connection, table: str, rows: List[tuple]) -> None:
+    marks = ", ".join("?" * len(rows[0]))
+    conn.executemany(f"INSERT INTO {table} VALUES ({marks})", rows)
+
+
+def generate_dataset(db_path: str, doctors: int = 100, patients: int = 5000, appointments: int = 50000,
+                     seed: int = 0, anchor: str = ANCHOR_DATE, overwrite: bool = False,
+                     progress=None) -> dict:
+    """
+    Build a fresh database at db_path with `doctors` doctors, `patients`
+    patients and about `appointments` appointments spread over HISTORY_DAYS
+    before and FUTURE_DAYS after `anchor`. No doctor is double-booked.
+
+    Load follows realistic shapes: doctor popularity is log-normal, weekdays
+    are busy, a share of doctors work Saturday mornings, and past bookings are
+    mostly confirmed while future ones are mostly pending. Every user's
+    password is DEFAULT_PASSWORD. `progress`, if given, is called with a short
+    message per phase. Returns row counts and the elapsed seconds.
+    """
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(db_path)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    report = progress or (lambda message: None)
+    started = time.perf_counter()
+    rng = random.Random(seed)
+
+    previous_path = database.DB_PATH
+    database.DB_PATH = db_path
+    try:
+        database.migrate(target=2)  # bare users/appointments/availability tables
+        database.close_all_conns()
+
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA cache_size = {database.IMPORT_CACHE_SIZE}")
+        password = hash_password(DEFAULT_PASSWORD)
+
+        # --- Users ---
+        report(f"users: {doctors} doctors, {patients} patients")
+        specs = [name for name, _ in SPECIALIZATIONS]
+        spec_weights = [weight for _, weight in SPECIALIZATIONS]
+        doctor_ids = [_uuid(rng) for _ in range(doctors)]
+        rows = [
+            (doctor_id, f"Dr {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+             f"doctor{i}@example.test", password, "doctor",
+             rng.choices(specs, spec_weights)[0], rng.randint(1, 40), rng.choice(CITIES), None)
+            for i, doctor_id in enumerate(doctor_ids)
+        ]
+        if rows:
+            _insert(conn, "users", rows)
+        patient_ids = []
+        for chunk_start in range(0, patients, INSERT_CHUNK_ROWS):
+            rows = []
+            for i in range(chunk_start, min(chunk_start + INSERT_CHUNK_ROWS, patients)):
+                patient_id = _uuid(rng)
+                patient_ids.append(patient_id)
+                rows.append((patient_id, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                             f"patient{i}@example.test", password, "patient", None, None,
+                             rng.choice(CITIES), None))
+            _insert(conn, "users", rows)
+
+        # --- Weekly schedules ---
+        saturday = [rng.random() < SATURDAY_SHARE for _ in doctor_ids]
+        rows = []
+        for doctor_id, works_saturday in zip(doctor_ids, saturday):
+            rows += [(doctor_id, weekday, "09:00", "17:00", 30) for weekday in range(5)]
+            if works_saturday:
+                rows.append((doctor_id, 5, "09:00", minutes_to_time_str(SATURDAY_END), 30))
+        if rows:
+            _insert(conn, "availability", rows)
+
+        # --- Appointments ---
+        anchor_day = date.fromisoformat(anchor)
+        days = [anchor_day + timedelta(days=offset) for offset in range(-HISTORY_DAYS, FUTURE_DAYS)]
+        day_strs = [d.isoformat() for d in days]
+        weekdays = [d.weekday() for d in days]
+        durations = [d for d, _ in DURATION_WEIGHTS]
+        duration_weights = [w for _, w in DURATION_WEIGHTS]
+        popularity = [rng.lognormvariate(0, 0.6) for _ in doctor_ids]
+        total_popularity = sum(popularity) or 1.0
+        weekday_count = sum(1 for wd in weekdays if wd < 5)
+        saturday_count = sum(1 for wd in weekdays if wd == 5)
+
+        n_patients = len(patient_ids)
+        made = 0
+        rows = []
+        report(f"appointments: ~{appointments} over {len(days)} days")
+        for d_index, doctor_id in enumerate(doctor_ids):
+            target = appointments * popularity[d_index] / total_popularity
+            # Saturday is a half day, so it carries half a weekday's share.
+            working_weight = weekday_count + (0.5 * saturday_count if saturday[d_index] else 0)
+            per_weekday = target / working_weight if working_weight else 0.0
+            carry = rng.random()  # error diffusion keeps the doctor's total on target
+            for day_str, wd, day in zip(day_strs, weekdays, days):
+                if wd == 6 or (wd == 5 and not saturday[d_index]):
+                    continue
+                carry += per_weekday * (0.5 if wd == 5 else 1.0)
+                count = int(carry)
+                if not count:
+                    continue
+                carry -= count
+                day_end = SATURDAY_END if wd == 5 else DAY_END
+                lengths = rng.choices(durations, duration_weights, k=count)
+                while sum(lengths) > day_end - DAY_START:
+                    lengths.pop()
+                # Spread the spare time as 15-minute gaps between the visits.
+                spare_units = (day_end - DAY_START - sum(lengths)) // 15
+                gaps = sorted(int(rng.random() * (spare_units + 1)) for _ in lengths)
+                cancelled, pending = PAST_STATUS if day < anchor_day else FUTURE_STATUS
+                start = DAY_START
+                for gap_units, length, prev in zip(gaps, lengths, [0] + gaps):
+                    start += (gap_units - prev) * 15
+                    roll = rng.random()
+                    status = "cancelled" if roll < cancelled else "pending" if roll < cancelled + pending else "confirmed"
+                    rows.append((_uuid(rng), doctor_id, patient_ids[int(rng.random() * n_patients)] if n_patients else "",
+                                 day_str, minutes_to_time_str(start), length, status, rng.choice(NOTES)))
+                    start += length
+                if len(rows) >= INSERT_CHUNK_ROWS:
+                    _insert(conn, "appointments", rows)
+                    made += len(rows)
+                    rows = []
+        if rows:
+            _insert(conn, "appointments", rows)
+            made += len(rows)
+        conn.commit()
+        conn.close()
+
+        report("indexes, daily stats and search index")
+        database.migrate()
+        database.close_all_conns()
+    finally:
+        database.DB_PATH = previous_path
+    return {
+        "doctors": doctors,
+        "patients": patients,
+        "appointments": made,
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic appointments database.")
+    parser.add_argument("db", help="output database file")
+    parser.add_argument("--doctors", type=int, default=100)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--appointments", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--anchor", default=ANCHOR_DATE, help="the dataset's 'today' (default: %(default)s)")
+    parser.add_argument("--overwrite", action="store_true", help="replace db if it exists")
+    args = parser.parse_args(argv)
+    summary = generate_dataset(args.db, args.doctors, args.patients, args.appointments, args.seed,
+                               args.anchor, args.overwrite, progress=print)
+    print(f"{args.db}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+# conftest.py
+import os
+import sys
+
+import pytest
+
+# The portal's modules live one directory up and import each other by bare name.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """database module pointed at a fresh, fully migrated file; caches start empty."""
+    previous = database.DB_PATH
+    database.DB_PATH = str(tmp_path / "appointments.db")
+    database.invalidate_user_cache()
+    database.reset_interval_index()
+    database.migrate()
+    try:
+        yield database
+    finally:
+        database.stop_group_commit()
+        database.close_all_conns()
+        database.invalidate_user_cache()
+        database.reset_interval_index()
+        database.DB_PATH = previous
@@ -0,0 +1,58 @@
+# test_api.py
+import asyncio
+import json
+
+import api
+
+
+def _exchange(requests):
+    """Send raw HTTP requests to a fresh BookingService; one (status, body) per request."""
+    async def run():
+        service = api.BookingService(workers=2)
+        await service.start()
+        server = await asyncio.start_server(service.serve_client, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        answers = []
+        try:
+            for raw in requests:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                writer.write(raw)
+                await writer.drain()
+                head = await reader.readuntil(b"\r\n\r\n")
+                status = int(head.split()[1])
+                length = int(next(line.split(b":")[1] for line in head.split(b"\r\n")
+                                  if line.lower().startswith(b"content-length")))
+                answers.append((status, json.loads(await reader.readexactly(length))))
+                writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.stop()
+        return answers
+
+    return asyncio.run(run())
+
+
+def _post(path, body: bytes, length=None):
+    length = len(body) if length is None else length
+    return (f"POST {path} HTTP/1.1\r\nContent-Length: {length}\r\nConnection: close\r\n\r\n").encode() + body
+
+
+def test_doctor_limit_is_clamped(db):
+    for i in range(api.MAX_DOCTORS_LIMIT + 5):
+        db.add_user(f"doc-{i}", f"Dr. {i}", f"doc{i}@example.com", "x", "doctor", "Cardiology", 5)
+    get = "GET /doctors?limit={} HTTP/1.1\r\nConnection: close\r\n\r\n"
+    (s1, few), (s2, many), (s3, huge) = _exchange([get.format(-1).encode(), get.format(0).encode(),
+                                                   get.format(10 ** 6).encode()])
+    assert (s1, s2, s3) == (200, 200, 200)
+    assert len(few) == 1 and len(many) == 1 and len(huge) == api.MAX_DOCTORS_LIMIT
+
+
+def test_malformed_requests_get_400(db):
+    answers = _exchange([
+        _post("/login", b"[1, 2]"),
+        _post("/login", b"{}", length="abc"),
+        _post("/login", b"{}", length=-5),
+    ])
+    assert [status for status, _ in answers] == [400, 400, 400]
+    assert answers[0][1]["error"] == "body must be a JSON object"
@@ -0,0 +1,74 @@
+# test_appointment_details.py
+import pytest
+
+SIDES = {"doctor": ("name", "specialization", "contact"), "patient": ("name", "contact")}
+
+
+@pytest.fixture
+def clinic(db):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology", 5, "555-0001")
+    db.add_user("doc-2", "Dr. Two", "two@example.com", "x", "doctor", "Neurology", 9)
+    db.add_user("pat-1", "Pat One", "p1@example.com", "x", "patient", contact="555-1001")
+    db.add_user("pat-2", "Pat Two", "p2@example.com", "x", "patient")
+    statuses = ("pending", "confirmed", "cancelled")
+    for n in range(12):
+        db.create_appointment(f"a{n:02d}", f"doc-{1 + n % 2}", f"pat-{1 + n % 3 % 2}",
+                              f"2031-03-{4 + n % 4:02d}", f"{9 + n % 3:02d}:00", 30, statuses[n % 3], f"n{n}")
+    # A row whose users are gone: the joined fields are empty, as lookups find nothing.
+    db.create_appointment("orphan", "doc-gone", "pat-gone", "2031-03-05", "12:00", 30)
+    return db
+
+
+def _looked_up(db, appointment):
+    """The display fields the dashboards built with one get_user_by_id() per side."""
+    row = {column: appointment[column] for column in db.APPOINTMENT_COLUMNS}
+    for side, fields in SIDES.items():
+        user = db.get_user_by_id(appointment[f"{side}_id"])
+        for field in fields:
+            row[f"{side}_{field}"] = user[field] if user else None
+    return row
+
+
+def _as_dicts(rows):
+    return [dict(row.items()) for row in rows]
+
+
+@pytest.mark.parametrize("filters", [{}, {"doctor_id": "doc-2"}, {"patient_id": "pat-1"},
+                                     {"start_date": "2031-03-05", "end_date": "2031-03-06"},
+                                     {"statuses": ["pending", "cancelled"]}])
+def test_details_match_per_row_lookups(clinic, filters):
+    plain = clinic.get_all_appointments()
+    expected = [_looked_up(clinic, a) for a in plain
+                if a["doctor_id"] == filters.get("doctor_id", a["doctor_id"])
+                and a["patient_id"] == filters.get("patient_id", a["patient_id"])
+                and filters.get("start_date", "") <= a["date"] <= filters.get("end_date", "9999")
+                and a["status"] in filters.get("statuses", [a["status"]])]
+    assert expected
+    assert _as_dicts(clinic.get_appointment_details(**filters)) == expected
+
+
+def test_selected_columns_join_only_what_they_need(clinic):
+    rows = clinic.get_appointment_details(patient_id="pat-2", columns=("id", "doctor_name"))
+    assert [r.keys() for r in rows] == [["id", "doctor_name"]] * len(rows)
+    assert [(r["id"], r["doctor_name"]) for r in rows] == [
+        (a["id"], clinic.get_user_by_id(a["doctor_id"])["name"])
+        for a in clinic.get_appointments_by_patient("pat-2")]
+    with pytest.raises(ValueError):
+        clinic.get_appointment_details(columns=("id", "password"))
+
+
+def test_detail_pages_match_per_row_lookups(clinic):
+    expected = [_looked_up(clinic, a) for a in clinic.get_all_appointments()]
+    rows, after = [], None
+    while True:
+        page, after = clinic.get_appointment_details_page(after, limit=5)
+        rows += _as_dicts(page)
+        if after is None:
+            break
+    by_key = sorted(expected, key=lambda r: (r["date"], r["time"], r["id"]))
+    assert rows == by_key
+
+
+def test_orphaned_appointment_has_empty_user_fields(clinic):
+    (row,) = [r for r in clinic.get_appointment_details() if r["id"] == "orphan"]
+    assert all(row[f"{side}_{field}"] is None for side, fields in SIDES.items() for field in fields)
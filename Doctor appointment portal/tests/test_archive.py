@@ -0,0 +1,106 @@
+# test_archive.py
+from datetime import date, timedelta
+
+import pytest
+
+ROWS = [  # id, doctor, day, time, duration, status
+    ("old-1", "doc-1", "2020-01-06", "09:00", 30, "confirmed"),
+    ("old-2", "doc-1", "2020-01-06", "09:30", 30, "cancelled"),
+    ("old-3", "doc-2", "2020-01-06", "09:00", 45, "confirmed"),
+    ("old-pending", "doc-1", "2020-01-07", "10:00", 30, "pending"),  # never settled: stays hot
+    ("old-4", "doc-1", "2020-02-03", "11:00", 30, "confirmed"),
+    ("cutoff", "doc-1", "2020-03-01", "09:00", 30, "confirmed"),  # on the cutoff: stays hot
+    ("recent", "doc-2", "2020-03-02", "09:00", 30, "cancelled"),
+]
+CUTOFF = "2020-03-01"
+ARCHIVED = {"old-1", "old-2", "old-3", "old-4"}
+
+
+@pytest.fixture
+def clinic(db, monkeypatch):
+    monkeypatch.setattr(db, "ARCHIVE_PAUSE_SECONDS", 0)
+    for doctor in ("doc-1", "doc-2"):
+        db.add_user(doctor, doctor, f"{doctor}@example.com", "x", "doctor", "Cardiology")
+    db.add_user("pat-1", "Pat", "pat@example.com", "x", "patient")
+    for appointment_id, doctor, day, time, duration, status in ROWS:
+        db.create_appointment(appointment_id, doctor, "pat-1", day, time, duration, status, "note")
+    return db
+
+
+def _rows(db, table):
+    return {r["id"]: tuple(r) for r in db.get_conn().execute(f"SELECT * FROM {table}")}
+
+
+def test_settled_rows_before_the_cutoff_move_unchanged(clinic):
+    before = _rows(clinic, "appointments")
+    assert clinic.archive_appointments(CUTOFF) == len(ARCHIVED)
+    assert _rows(clinic, "appointments_archive") == {k: v for k, v in before.items() if k in ARCHIVED}
+    assert _rows(clinic, "appointments") == {k: v for k, v in before.items() if k not in ARCHIVED}
+    assert clinic.archive_stats() == {"hot": len(ROWS) - len(ARCHIVED), "archived": len(ARCHIVED),
+                                      "archived_from": "2020-01-06", "archived_to": "2020-02-03"}
+    assert clinic.archive_appointments(CUTOFF) == 0
+
+
+def test_batches_move_the_oldest_rows_first(clinic):
+    assert clinic.archive_appointments(CUTOFF, batch_rows=1, max_batches=2) == 2
+    assert set(_rows(clinic, "appointments_archive")) == {"old-1", "old-3"}  # 2020-01-06 09:00, by id
+    assert clinic.archive_appointments(CUTOFF, batch_rows=1) == 2
+    assert set(_rows(clinic, "appointments_archive")) == ARCHIVED
+
+
+def test_cutoff_may_not_be_in_the_future(clinic):
+    with pytest.raises(ValueError):
+        clinic.archive_appointments((date.today() + timedelta(days=1)).isoformat())
+
+
+def test_default_cutoff_keeps_recent_history(clinic):
+    recent = (date.today() - timedelta(days=clinic.ARCHIVE_AFTER_DAYS - 1)).isoformat()
+    clinic.create_appointment("last-month", "doc-1", "pat-1", recent, "09:00", 30, "confirmed")
+    assert clinic.archive_appointments() == len(ARCHIVED) + 2  # "cutoff" and "recent" are old enough too
+    assert "last-month" in _rows(clinic, "appointments")
+
+
+READS = {
+    "by doctor": lambda db, archive: db.get_appointments_by_doctor("doc-1", include_archive=archive),
+    "by doctor in range": lambda db, archive: db.get_appointments_by_doctor(
+        "doc-1", "2020-01-01", "2020-01-31", ("id", "status"), include_archive=archive),
+    "by patient": lambda db, archive: db.get_appointments_by_patient("pat-1", include_archive=archive),
+    "on a day": lambda db, archive: db.get_appointments_on("doc-1", "2020-01-06", ("id",), include_archive=archive),
+    "overlapping": lambda db, archive: db.get_appointments_overlapping(
+        "2020-01-06", "09:15", "2020-01-06", "10:00", columns=("id", "start_min"), include_archive=archive),
+    "all": lambda db, archive: db.get_all_appointments(("id", "date"), include_archive=archive),
+    "details": lambda db, archive: db.get_appointment_details(
+        patient_id="pat-1", columns=("id", "date", "time", "doctor_name"), include_archive=archive),
+    "chunks": lambda db, archive: [row for chunk in db.iter_appointment_chunks(
+        patient_id="pat-1", chunk_size=2, include_archive=archive) for row in chunk],
+}
+
+
+def _project(rows, like):
+    # A merged read also selects its sort columns; compare only what was asked for.
+    keys = like[0].keys() if like and hasattr(like[0], "keys") else None
+    return [tuple(r[k] for k in keys) if keys else tuple(r) for r in rows]
+
+
+@pytest.mark.parametrize("read", READS.values(), ids=READS.keys())
+def test_include_archive_reads_through_in_order(clinic, read):
+    before = read(clinic, False)
+    assert before
+    clinic.archive_appointments(CUTOFF)
+    assert _project(read(clinic, True), before) == _project(before, before)
+    assert _project(read(clinic, False), before) == [row for row in _project(before, before)
+                                                     if row[0] not in ARCHIVED]
+
+
+def test_patient_calendar_reads_through(clinic):
+    before = clinic.get_patient_calendar("pat-1", "2020-01-01", "2020-03-02", include_archive=True)
+    clinic.archive_appointments(CUTOFF)
+    assert clinic.get_patient_calendar("pat-1", "2020-01-01", "2020-03-02", include_archive=True) == before
+    hot_only = clinic.get_patient_calendar("pat-1", "2020-01-01", "2020-03-02")
+    assert [r["date"] for r in hot_only] == ["2020-01-07", "2020-03-01", "2020-03-02"]
+
+
+def test_doctor_calendar_still_counts_archived_days(clinic):
+    before = clinic.get_doctor_calendar("doc-1", "2020-01-01", "2020-02-29")
+    clinic.archive_appointments(CUTOFF)
+    assert clinic.get_doctor_calendar("doc-1", "2020-01-01", "2020-02-29") == before
@@ -0,0 +1,111 @@
+# test_booking.py
+import sqlite3
+import threading
+import uuid
+
+import pytest
+
+from utils import epoch_minute, minute_mask
+
+DAY = "2031-03-04"
+
+
+@pytest.fixture
+def people(db):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("pat-1", "Pat One", "pat1@example.com", "x", "patient")
+    db.add_user("pat-2", "Pat Two", "pat2@example.com", "x", "patient")
+    return "doc-1", "pat-1", "pat-2"
+
+
+def test_second_booking_of_a_slot_is_a_conflict(db, people):
+    doctor, first, second = people
+    assert db.book_appointment(doctor, first, DAY, "10:00", 30)
+    result = db.book_appointment(doctor, second, DAY, "10:15", 30)
+    assert not result.ok and result.reason == "conflict"
+    assert result.suggested_time == "10:30"
+
+
+def test_booking_made_by_another_process_is_not_overlapped(db, people):
+    doctor, first, second = people
+    db.get_day_intervals(doctor, DAY)  # cached as empty
+    other = sqlite3.connect(db.DB_PATH)  # stands in for a second portal process
+    start = epoch_minute(DAY, "10:00")
+    other.execute("""
+        INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status, notes,
+                                  start_min, end_min)
+        VALUES (?, ?, ?, ?, '10:00', 30, 'pending', '', ?, ?)
+    """, (str(uuid.uuid4()), doctor, first, DAY, start, start + 30))
+    other.commit()
+    other.close()
+
+    result = db.book_appointment(doctor, second, DAY, "10:00", 30)
+    assert not result.ok and result.reason == "conflict"
+    assert result.suggested_time in ("09:30", "10:30")
+    assert len(db.get_day_intervals(doctor, DAY)) == 1  # reloaded after the rejection
+
+
+@pytest.mark.parametrize("day, time, duration", [
+    (DAY, "10:00", 0),
+    (DAY, "10:00", -30),
+    (DAY, "23:45", 30),  # runs past midnight
+    (DAY, "24:00", 15),
+    (DAY, "10:75", 15),
+    (DAY, "ten", 15),
+    ("2031-02-30", "10:00", 15),
+])
+def test_malformed_bookings_are_rejected_as_invalid(db, people, day, time, duration):
+    doctor, first, second = people
+    assert db.book_appointment(doctor, first, DAY, "10:00", 30)
+    result = db.book_appointment(doctor, second, day, time, duration)
+    assert not result.ok and result.reason == "invalid"
+
+
+def test_reads_do_not_wait_for_the_write_lock(db, people):
+    doctor, first, _ = people
+    assert db.book_appointment(doctor, first, DAY, "10:00", 30)
+    db.reset_interval_index()
+    held, done = threading.Event(), threading.Event()
+
+    def writer():
+        with db._write_lock:
+            held.set()
+            done.wait(5)
+
+    t = threading.Thread(target=writer)
+    t.start()
+    held.wait(5)
+    try:
+        free = db.get_free_mask(doctor, DAY)  # cold: loads the day while the lock is held
+    finally:
+        done.set()
+        t.join()
+    assert not free & minute_mask(600, 30)
+    assert free & minute_mask(630, 30) == minute_mask(630, 30)
+
+
+def test_nested_transaction_rolls_back_everything_and_evicts_caches(db, people):
+    doctor, first, _ = people
+    assert db.get_day_hours(doctor, DAY) == db.UNRESTRICTED_HOURS
+    assert len(db.get_day_intervals(doctor, DAY)) == 0  # cached before the unit
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            assert db.book_appointment(doctor, first, DAY, "10:00", 30)
+            with db.transaction():  # joins the outer unit
+                db.add_user("pat-9", "Pat Nine", "pat9@example.com", "x", "patient")
+                db.set_weekly_availability(doctor, 1, "12:00", "13:00", 30)
+            assert len(db.get_day_intervals(doctor, DAY)) == 1
+            assert db.get_day_hours(doctor, DAY) == (720, 780, 30)
+            raise RuntimeError("abort")
+    assert db.get_user_by_id("pat-9") is None
+    assert db.get_conn().execute("SELECT COUNT(*) FROM appointments").fetchone()[0] == 0
+    assert len(db.get_day_intervals(doctor, DAY)) == 0
+    assert db.get_day_hours(doctor, DAY) == db.UNRESTRICTED_HOURS
+
+
+def test_committed_transaction_keeps_caches_current(db, people):
+    doctor, first, second = people
+    with db.transaction():
+        assert db.book_appointment(doctor, first, DAY, "10:00", 30)
+        assert not db.book_appointment(doctor, second, DAY, "10:00", 30)
+    assert len(db.get_day_intervals(doctor, DAY)) == 1
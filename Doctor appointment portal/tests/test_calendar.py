@@ -0,0 +1,67 @@
+# test_calendar.py
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def clinic(db):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology")
+    db.add_user("pat-1", "Pat", "pat@example.com", "x", "patient")
+    for n, day in enumerate(["2032-02-27", "2032-02-28", "2032-02-29", "2032-03-01", "2032-03-02"]):
+        db.create_appointment(f"a{n}", "doc-1", "pat-1", day, "10:00", 30, "confirmed")
+    return db
+
+
+def _days(start, end):
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    return [(first + timedelta(days=n)).isoformat() for n in range((last - first).days + 1)]
+
+
+@pytest.mark.parametrize("start, end", [("2032-02-28", "2032-03-01"),  # across a leap day
+                                        ("2032-03-01", "2032-03-01"),
+                                        ("2031-12-30", "2032-01-02")])
+def test_doctor_calendar_has_every_date_once(clinic, start, end):
+    assert [d["date"] for d in clinic.get_doctor_calendar("doc-1", start, end)] == _days(start, end)
+
+
+def test_range_bounds_are_inclusive(clinic):
+    doctor = {d["date"]: d["confirmed"] for d in clinic.get_doctor_calendar("doc-1", "2032-02-28", "2032-03-01")}
+    assert doctor == {"2032-02-28": 1, "2032-02-29": 1, "2032-03-01": 1}
+    patient = clinic.get_patient_calendar("pat-1", "2032-02-28", "2032-03-01")
+    assert [(d["date"], d["appointments"]) for d in patient] == [
+        ("2032-02-28", 1), ("2032-02-29", 1), ("2032-03-01", 1)]
+    archived = clinic.get_patient_calendar("pat-1", "2032-02-28", "2032-03-01", include_archive=True)
+    assert archived == patient
+
+
+@pytest.mark.parametrize("calendar", ["get_doctor_calendar", "get_patient_calendar"])
+def test_range_length_is_limited(clinic, calendar):
+    read = getattr(clinic, calendar)
+    who = "doc-1" if calendar == "get_doctor_calendar" else "pat-1"
+    start = date(2032, 1, 1)
+    read(who, start.isoformat(), (start + timedelta(days=clinic.CALENDAR_MAX_DAYS - 1)).isoformat())
+    for end in ((start + timedelta(days=clinic.CALENDAR_MAX_DAYS)).isoformat(),  # one day too many
+                (start - timedelta(days=1)).isoformat()):  # ends before it starts
+        with pytest.raises(ValueError):
+            read(who, start.isoformat(), end)
+
+
+def test_longest_range_lists_every_day(clinic):
+    end = (date(2032, 1, 1) + timedelta(days=clinic.CALENDAR_MAX_DAYS - 1)).isoformat()
+    calendar = clinic.get_doctor_calendar("doc-1", "2032-01-01", end)
+    assert len(calendar) == clinic.CALENDAR_MAX_DAYS
+    assert calendar[-1]["date"] == end
+
+
+def test_working_hours_follow_weekday_and_exceptions(clinic):
+    clinic.set_weekly_availability("doc-1", 0, "09:00", "12:00", 30)  # Mondays only
+    clinic.set_availability_exception("doc-1", "2032-03-02", "14:00", "15:00", 20)  # a Tuesday
+    clinic.set_availability_exception("doc-1", "2032-03-08")  # a Monday off
+    calendar = {d["date"]: d for d in clinic.get_doctor_calendar("doc-1", "2032-03-01", "2032-03-08")}
+    assert (calendar["2032-03-01"]["working_minutes"], calendar["2032-03-01"]["slots"]) == (180, 6)
+    assert calendar["2032-03-01"]["occupancy"] == pytest.approx(30 / 180)
+    assert (calendar["2032-03-02"]["working_minutes"], calendar["2032-03-02"]["slots"]) == (60, 3)
+    assert calendar["2032-03-02"]["free_minutes"] == 30
+    assert calendar["2032-03-03"]["working_minutes"] == 0 and calendar["2032-03-03"]["occupancy"] is None
+    assert calendar["2032-03-08"]["working_minutes"] == 0
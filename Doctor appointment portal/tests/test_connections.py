@@ -0,0 +1,61 @@
+# test_connections.py
+import sqlite3
+import threading
+
+import pytest
+
+
+def _run(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    return thread
+
+
+def test_connection_of_a_finished_thread_is_closed_when_its_ident_is_reused(db):
+    # CPython hands new threads the idents of finished ones; the registry must
+    # close a dead thread's connection, not replace it under the shared ident.
+    for _ in range(50):
+        opened, reused = [], []
+        dead = _run(lambda: opened.append(db.get_conn()))  # exits without close_conn()
+        _run(lambda: None)
+
+        def reuse():
+            if threading.get_ident() == dead.ident:
+                reused.append(db.get_conn())
+        _run(reuse)
+        if reused:
+            break
+    else:
+        pytest.skip("no thread ident was reused")
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
+    assert dead not in db._all_conns
+
+
+def test_connections_of_finished_threads_are_pruned(db):
+    finished = []
+    for _ in range(5):
+        _run(lambda: finished.append(db.get_conn()))
+    for conn in finished[:-1]:  # each open prunes those of threads finished before it
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+    assert sum(not thread.is_alive() for thread in db._all_conns) == 1
+    assert db._all_conns[threading.current_thread()] is db.get_conn()
+
+
+def test_close_conn_unregisters_the_calling_thread(db):
+    conn = db.get_conn()
+    db.close_conn()
+    assert threading.current_thread() not in db._all_conns
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    assert db.get_conn() is not conn
+
+
+def test_close_all_conns_makes_every_thread_reopen(db):
+    conn = db.get_conn()
+    db.close_all_conns()
+    assert db._all_conns == {}
+    assert db.get_conn() is not conn
+    assert db.get_conn().execute("SELECT 1").fetchone()[0] == 1
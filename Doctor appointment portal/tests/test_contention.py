@@ -0,0 +1,129 @@
+# test_contention.py
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+THREADS = 200
+DAY, SLOT = "2031-03-05", "11:00"
+PORTAL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Books the slot from a second process once a line arrives on stdin, and prints
+# whether it got it.
+OTHER_PROCESS = """
+import sys
+import database
+database.DB_PATH = sys.argv[1]
+sys.stdin.readline()
+print(database.book_appointment("doc-1", "pat-x", sys.argv[2], sys.argv[3], 30).ok)
+"""
+
+
+@pytest.fixture
+def people(db):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology", 5)
+    for i in range(THREADS):
+        db.add_user(f"pat-{i}", f"Patient {i}", f"pat{i}@example.com", "x", "patient")
+    db.add_user("pat-x", "Patient X", "patx@example.com", "x", "patient")
+
+
+def test_one_slot_is_booked_exactly_once(db, people):
+    other = subprocess.Popen([sys.executable, "-c", OTHER_PROCESS, db.DB_PATH, DAY, SLOT],
+                             cwd=PORTAL_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    barrier = threading.Barrier(THREADS + 1)
+    results = [None] * THREADS
+
+    def book(i):
+        db.get_conn()  # open the connection before the race starts
+        barrier.wait()
+        results[i] = db.book_appointment("doc-1", f"pat-{i}", DAY, SLOT, 30)
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    other.stdin.write("go\n")
+    other.stdin.flush()
+    for t in threads:
+        t.join()
+    other_ok = other.communicate(timeout=30)[0].strip() == "True"
+    elapsed = time.perf_counter() - started
+
+    winners = sum(1 for r in results if r.ok) + other_ok
+    assert winners == 1
+    assert all(r.reason == "conflict" for r in results if not r.ok)
+    assert len(db.find_conflicts("doc-1", DAY, SLOT, 30)) == 1
+    print(f"\n{THREADS + 1} bookings of one slot in {elapsed * 1000:.0f} ms "
+          f"({(THREADS + 1) / elapsed:.0f} bookings/sec), 1 accepted")
+
+
+def _patient(n):
+    return (f"gc-{n}", f"Group {n}", f"gc{n}@example.com", "x", "patient")
+
+
+def test_group_with_a_failing_write_commits_the_others(db):
+    writer = db.GroupCommitWriter()
+    futures = [writer.submit(db.add_user, *_patient(n)) for n in range(5)]
+    futures.insert(2, writer.submit(db.add_user, "gc-dup", "Dup", "gc0@example.com", "x", "patient"))
+    writer.start()  # everything is already queued, so it all lands in one group
+    writer.stop()
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[2].result(timeout=5)
+    assert all(f.result(timeout=5) is None for i, f in enumerate(futures) if i != 2)
+    assert writer.stats["groups"] == 1 and writer.stats["failed_writes"] == 1
+    assert db.get_user_by_id("gc-dup") is None
+    assert all(db.get_user_by_id(f"gc-{n}") for n in range(5))
+
+
+def test_stop_commits_everything_already_submitted(db):
+    writer = db.start_group_commit()
+    futures = [writer.submit(db.add_user, *_patient(n)) for n in range(300)]
+    db.stop_group_commit()
+    assert all(f.done() for f in futures)
+    assert db.get_conn().execute("SELECT COUNT(*) FROM users").fetchone()[0] == 300
+    assert db.group_commit_stats() is None
+
+
+def test_grouped_writes_go_through_the_writer(db):
+    db.start_group_commit()
+    db.add_user(*_patient(1))
+    assert db.group_commit_stats()["writes"] == 1
+    db.stop_group_commit()
+    assert db.get_user_by_id("gc-1")
+
+
+def test_busy_database_fails_every_write_in_the_group(db, monkeypatch):
+    monkeypatch.setitem(db.PRAGMAS, "busy_timeout", 50)
+    other = sqlite3.connect(db.DB_PATH)
+    other.execute("BEGIN IMMEDIATE")  # another process holds the write lock
+    writer = db.GroupCommitWriter()
+    futures = [writer.submit(db.add_user, *_patient(n)) for n in range(3)]
+    writer.start()
+    try:
+        for f in futures:
+            with pytest.raises(sqlite3.OperationalError):
+                f.result(timeout=5)
+    finally:
+        other.rollback()
+        other.close()
+        writer.stop()
+
+
+def test_failing_savepoint_fails_the_whole_group(db):
+    def release_early():
+        db.get_conn().execute("RELEASE group_write")  # the writer's own RELEASE then fails
+
+    writer = db.GroupCommitWriter()
+    futures = [writer.submit(db.add_user, *_patient(0)), writer.submit(release_early),
+               writer.submit(db.add_user, *_patient(1))]
+    writer.start()
+    writer.stop()
+    for f in futures:
+        with pytest.raises(sqlite3.OperationalError):
+            f.result(timeout=5)
+    assert db.get_user_by_id("gc-0") is None and db.get_user_by_id("gc-1") is None
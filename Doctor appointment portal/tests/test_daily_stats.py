@@ -0,0 +1,86 @@
+# test_daily_stats.py
+import pytest
+
+COUNTS = ("booked_minutes", "pending", "confirmed", "cancelled")
+RECOUNT = """
+    SELECT doctor_id, date,
+           SUM(CASE WHEN status != 'cancelled' THEN duration ELSE 0 END) AS booked_minutes,
+           SUM(status = 'pending') AS pending, SUM(status = 'confirmed') AS confirmed,
+           SUM(status = 'cancelled') AS cancelled
+    FROM (SELECT doctor_id, date, duration, status FROM appointments
+          UNION ALL SELECT doctor_id, date, duration, status FROM appointments_archive)
+    GROUP BY doctor_id, date
+"""
+
+
+def _assert_stats_match_a_recount(db):
+    conn = db.get_conn()
+    expected = {(r["doctor_id"], r["date"]): tuple(r[c] for c in COUNTS) for r in conn.execute(RECOUNT)}
+    # Rows whose appointments have all gone stay behind with zero counts.
+    stored = {(r["doctor_id"], r["date"]): tuple(r[c] for c in COUNTS)
+              for r in db.get_daily_stats("0000-01-01", "9999-12-31") if any(r[c] for c in COUNTS)}
+    assert stored == expected
+    by_day = {r["date"]: tuple(r[c] for c in COUNTS) for r in db.get_stats_by_day("0000-01-01", "9999-12-31")}
+    for day in {d for _, d in expected}:
+        assert by_day[day] == tuple(sum(v[i] for (_, d), v in expected.items() if d == day) for i in range(4))
+    return stored
+
+
+@pytest.fixture
+def clinic(db):
+    for doctor in ("doc-1", "doc-2"):
+        db.add_user(doctor, doctor, f"{doctor}@example.com", "x", "doctor", "Cardiology")
+    db.add_user("pat-1", "Pat", "pat@example.com", "x", "patient")
+    for n, (doctor, day, time, duration, status) in enumerate([
+            ("doc-1", "2020-01-06", "09:00", 30, "pending"),
+            ("doc-1", "2020-01-06", "09:30", 45, "confirmed"),
+            ("doc-1", "2020-01-06", "11:00", 15, "cancelled"),
+            ("doc-2", "2020-01-06", "09:00", 60, "confirmed"),
+            ("doc-1", "2020-01-07", "10:00", 30, "pending"),
+            ("doc-2", "2031-03-04", "10:00", 20, "confirmed")]):
+        db.create_appointment(f"a{n}", doctor, "pat-1", day, time, duration, status)
+    return db
+
+
+def test_inserts_are_counted(clinic):
+    stored = _assert_stats_match_a_recount(clinic)
+    assert stored[("doc-1", "2020-01-06")] == (75, 1, 1, 1)
+
+    results = clinic.book_appointments([("doc-2", "pat-1", "2031-03-04", "11:00", 30, "pending", ""),
+                                        ("doc-2", "pat-1", "2031-03-04", "11:00", 30, "pending", "")])
+    assert [r.ok for r in results] == [True, False]  # a rejected booking adds nothing
+    assert _assert_stats_match_a_recount(clinic)[("doc-2", "2031-03-04")] == (50, 1, 1, 0)
+
+
+@pytest.mark.parametrize("status", ["pending", "confirmed", "cancelled"])
+def test_status_changes_move_counts(clinic, status):
+    for appointment_id in ("a0", "a1", "a2"):
+        clinic.update_appointment_status(appointment_id, status)
+    stored = _assert_stats_match_a_recount(clinic)
+    minutes = 0 if status == "cancelled" else 90
+    assert stored[("doc-1", "2020-01-06")] == (minutes,) + tuple(3 * (s == status) for s in COUNTS[1:])
+
+
+def test_moving_an_appointment_moves_its_counts(clinic):
+    conn = clinic.get_conn()
+    with conn:
+        conn.execute("UPDATE appointments SET doctor_id = 'doc-2', date = '2020-01-08' WHERE id = 'a1'")
+        conn.execute("UPDATE appointments SET duration = 90 WHERE id = 'a0'")
+    stored = _assert_stats_match_a_recount(clinic)
+    assert stored[("doc-1", "2020-01-06")] == (90, 1, 0, 1)
+    assert stored[("doc-2", "2020-01-08")] == (45, 0, 1, 0)
+
+
+def test_deletes_are_subtracted(clinic):
+    for appointment_id in ("a4", "a1", "a2"):
+        clinic.delete_appointment(appointment_id)
+    stored = _assert_stats_match_a_recount(clinic)
+    assert ("doc-1", "2020-01-07") not in stored
+    assert stored[("doc-1", "2020-01-06")] == (30, 1, 0, 0)
+
+
+def test_archiving_keeps_the_totals(clinic):
+    before = _assert_stats_match_a_recount(clinic)
+    assert clinic.archive_appointments("2021-01-01", batch_rows=2) == 3  # settled rows only
+    assert clinic.archive_stats()["archived"] == 3
+    assert _assert_stats_match_a_recount(clinic) == before
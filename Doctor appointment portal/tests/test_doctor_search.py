@@ -0,0 +1,88 @@
+# test_doctor_search.py
+import pytest
+
+
+@pytest.fixture
+def fts(db):
+    if not db.FTS_ENABLED:
+        pytest.skip("this SQLite build has no FTS5")
+    return db
+
+
+def _ids(rows):
+    return [r["id"] for r in rows]
+
+
+def _write(db, sql, params=()):
+    # Raw writes stand in for another process; the read cache cannot see them.
+    conn = db.get_conn()
+    with conn:
+        conn.execute(sql, params)
+    db.invalidate_user_cache()
+
+
+def _indexed_terms(db):
+    # The index's own vocabulary: external content means a plain SELECT on
+    # doctors_fts would read users, not what was indexed.
+    conn = db.get_conn()
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.doctor_terms USING fts5vocab(main, doctors_fts, row)")
+    return {r[0]: r[1] for r in conn.execute("SELECT term, doc FROM temp.doctor_terms")}
+
+
+def test_inserted_doctors_are_found_by_word_prefixes(fts):
+    fts.add_user("d1", "Ana Cardoso", "ana@example.com", "x", "doctor", "Cardiology", 3, "555-0101")
+    fts.add_user("p1", "Carla Patient", "carla@example.com", "x", "patient")
+    assert _ids(fts.search_doctors("card")) == ["d1"]
+    assert _ids(fts.search_doctors("an cardio")) == ["d1"]  # every word must match
+    assert _ids(fts.search_doctors("ana neurology")) == []
+    assert _ids(fts.search_doctors("carla")) == []  # patients are not indexed
+    assert _ids(fts.search_doctors("0101")) == ["d1"]
+    assert set(_indexed_terms(fts)) == {"ana", "cardoso", "cardiology", "555", "0101"}
+
+
+def test_updates_and_deletes_keep_the_index_in_step(fts):
+    fts.add_user("d1", "Ana Cardoso", "ana@example.com", "x", "doctor", "Cardiology")
+    fts.add_user("d2", "Ben Brown", "ben@example.com", "x", "patient")
+    assert _ids(fts.search_doctors("ana")) == ["d1"]
+
+    _write(fts, "UPDATE users SET name = 'Beatriz Cardoso', specialization = 'Neurology' WHERE id = 'd1'")
+    assert _ids(fts.search_doctors("ana")) == []
+    assert _ids(fts.search_doctors("cardiology")) == []
+    assert _ids(fts.search_doctors("beatriz neuro")) == ["d1"]
+
+    _write(fts, "UPDATE users SET role = 'doctor', specialization = 'Dermatology' WHERE id = 'd2'")
+    assert _ids(fts.search_doctors("derm")) == ["d2"]
+    assert _indexed_terms(fts) == {"beatriz": 1, "cardoso": 1, "neurology": 1, "ben": 1, "brown": 1,
+                                   "dermatology": 1}
+    _write(fts, "UPDATE users SET role = 'patient' WHERE id = 'd1'")
+    assert _ids(fts.search_doctors("beatriz")) == []
+
+    _write(fts, "UPDATE users SET email = 'benb@example.com' WHERE id = 'd2'")  # not an indexed column
+    assert _ids(fts.search_doctors("ben")) == ["d2"]
+    _write(fts, "DELETE FROM users WHERE id = 'd2'")
+    assert _ids(fts.search_doctors("ben")) == []
+    assert _indexed_terms(fts) == {}
+
+
+def test_name_hits_rank_above_specialization_and_contact(fts):
+    fts.add_user("contact", "Zed Zulu", "z@example.com", "x", "doctor", "Oncology", 1, "ask for Heart desk")
+    fts.add_user("special", "Yan Young", "y@example.com", "x", "doctor", "Heart surgery", 1)
+    fts.add_user("name", "Heart Hughes", "h@example.com", "x", "doctor", "Oncology", 1)
+    assert _ids(fts.search_doctors("heart")) == ["name", "special", "contact"]
+    assert _ids(fts.list_doctors("heart")) == ["name", "special", "contact"]
+    assert _ids(fts.search_doctors("heart", limit=2)) == ["name", "special"]
+
+
+def test_query_words_are_literal_and_accents_are_ignored(fts):
+    fts.add_user("d1", "José Or", "jose@example.com", "x", "doctor", "Pediatrics")
+    assert _ids(fts.search_doctors("jose")) == ["d1"]
+    assert _ids(fts.search_doctors("OR")) == ["d1"]
+    assert _ids(fts.search_doctors('pedi"* (')) == ["d1"]
+
+
+def test_empty_query_lists_doctors_by_name(fts):
+    fts.add_user("d2", "Bea", "b@example.com", "x", "doctor")
+    fts.add_user("d1", "Al", "a@example.com", "x", "doctor")
+    fts.add_user("p1", "Aaron", "p@example.com", "x", "patient")
+    assert _ids(fts.search_doctors("")) == ["d1", "d2"]
+    assert _ids(fts.search_doctors("  !! ")) == ["d1", "d2"]
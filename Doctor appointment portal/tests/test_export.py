@@ -0,0 +1,16 @@
+# test_export.py
+import csv
+import io
+
+from export import export_appointments_file
+
+
+def test_csv_export_round_trips_and_closes(db):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("pat-1", "Pat One", "pat1@example.com", "x", "patient")
+    for time in ("09:00", "09:30", "10:00"):
+        assert db.book_appointment("doc-1", "pat-1", "2031-03-07", time, 30)
+    with export_appointments_file("csv", doctor_id="doc-1") as f:
+        rows = list(csv.DictReader(io.TextIOWrapper(f, encoding="utf-8", newline="")))
+    assert f.closed
+    assert [r["time"] for r in rows] == ["09:00", "09:30", "10:00"]
@@ -0,0 +1,36 @@
+# test_import.py
+import sqlite3
+
+DAY = "2031-03-06"
+
+
+def _row(n, time, patient="pat-1"):
+    return {"id": f"imp-{n}", "doctor_id": "doc-1", "patient_id": patient, "date": DAY,
+            "time": time, "duration": 30}
+
+
+def test_import_commits_each_chunk_and_sees_writes_in_between(db, monkeypatch):
+    db.add_user("doc-1", "Dr. One", "one@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("pat-1", "Pat One", "pat1@example.com", "x", "patient")
+    db.add_user("pat-2", "Pat Two", "pat2@example.com", "x", "patient")
+    monkeypatch.setattr(db, "IMPORT_CHUNK_ROWS", 2)
+    lock_free = []
+
+    def records():
+        yield _row(1, "09:00")
+        yield _row(2, "09:30")
+        # The first chunk is committed and the lock released: another process
+        # can both see it and book in between chunks.
+        other = sqlite3.connect(db.DB_PATH)
+        lock_free.append(other.execute("SELECT COUNT(*) FROM appointments").fetchone()[0])
+        other.close()
+        assert db.book_appointment("doc-1", "pat-2", DAY, "10:00", 30)
+        yield _row(3, "10:00")  # now a conflict
+        yield _row(4, "10:30")
+        yield _row(5, "09:00")  # conflicts with the first chunk
+
+    report = db.import_appointments(records())
+    assert lock_free == [2]
+    assert report.total == 5 and report.accepted == 3
+    assert report.status_of(3) == "conflict" and report.status_of(5) == "conflict"
+    assert len(db.get_day_intervals("doc-1", DAY)) == 4
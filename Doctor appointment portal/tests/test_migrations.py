@@ -0,0 +1,161 @@
+# test_migrations.py
+import sqlite3
+
+import pytest
+
+import photos
+from utils import epoch_minute
+
+
+def _baseline_rows(db, rows):
+    conn = db.get_conn()
+    with conn:
+        conn.executemany("""
+            INSERT INTO appointments (id, doctor_id, patient_id, date, time, duration, status)
+            VALUES (?, 'doc-1', 'pat-1', ?, ?, ?, 'pending')
+        """, rows)
+
+
+def test_backfill_fills_a_baseline_database_once(db, tmp_path, monkeypatch):
+    db.close_all_conns()
+    db.DB_PATH = str(tmp_path / "baseline.db")
+    db.migrate(target=7)  # before start_min/end_min existed
+    _baseline_rows(db, [("a1", "2031-03-04", "09:00", 30), ("a2", "2031-03-04", "09:30", 45),
+                        ("bad", "not a date", "09:00", 30), ("a3", "2031-03-05", "23:30", 30),
+                        ("a4", "2031-03-06", "10:00", 15)])
+    monkeypatch.setattr(db, "BACKFILL_BATCH_ROWS", 2)  # several batches, one straddling the bad row
+
+    assert db.migrate() == [8, 9, 10]
+
+    conn = db.get_conn()
+    rows = {r["id"]: r for r in conn.execute("SELECT id, date, time, duration, start_min, end_min FROM appointments")}
+    assert rows["bad"]["start_min"] is None and rows["bad"]["end_min"] is None
+    for aid in ("a1", "a2", "a3", "a4"):
+        r = rows[aid]
+        assert r["start_min"] == epoch_minute(r["date"], r["time"])
+        assert r["end_min"] == r["start_min"] + r["duration"]
+
+    # Recorded as applied: a later migrate() does not walk the table again.
+    with conn:
+        conn.execute("UPDATE appointments SET start_min = NULL, end_min = NULL WHERE id = 'a1'")
+    assert db.migrate() == []
+    assert conn.execute("SELECT start_min FROM appointments WHERE id = 'a1'").fetchone()[0] is None
+
+
+def test_backfill_counts_only_rows_it_could_fill(db, tmp_path, monkeypatch):
+    db.close_all_conns()
+    db.DB_PATH = str(tmp_path / "baseline.db")
+    db.migrate(target=7)
+    _baseline_rows(db, [("a1", "2031-03-04", "09:00", 30), ("bad", "2031-13-40", "9h", 30),
+                        ("a2", "2031-03-04", "10:00", 30)])
+    db.migrate(target=8)
+    monkeypatch.setattr(db, "BACKFILL_BATCH_ROWS", 2)
+    assert db._backfill_minute_columns(db.get_conn()) == 2
+    assert db._backfill_minute_columns(db.get_conn()) == 0
+
+
+# The schema init_db() created before migrations existed: no schema_version.
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL, password TEXT NOT NULL,
+        role TEXT NOT NULL, specialization TEXT, experience INTEGER, contact TEXT, photo_path TEXT
+    );
+    CREATE TABLE appointments (
+        id TEXT PRIMARY KEY, doctor_id TEXT NOT NULL, patient_id TEXT NOT NULL, date TEXT NOT NULL,
+        time TEXT NOT NULL, duration INTEGER NOT NULL, status TEXT NOT NULL, notes TEXT,
+        FOREIGN KEY(doctor_id) REFERENCES users(id), FOREIGN KEY(patient_id) REFERENCES users(id)
+    );
+"""
+
+
+@pytest.fixture
+def baseline(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(photos, "PHOTO_DIR", str(tmp_path / "store"))
+    legacy_photo = tmp_path / "legacy" / "1a2b_portrait.png"
+    legacy_photo.parent.mkdir()
+    legacy_photo.write_bytes(b"not really a png")
+
+    path = str(tmp_path / "baseline.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO users VALUES (?, ?, ?, 'x', ?, ?, NULL, NULL, ?)", [
+        ("d1", "Ana Cardoso", "ana@example.com", "doctor", "Cardiology", str(legacy_photo)),
+        ("p1", "Pat", "pat@example.com", "patient", None, None),
+    ])
+    conn.executemany("INSERT INTO appointments VALUES (?, 'd1', 'p1', ?, ?, ?, ?, '')", [
+        ("a1", "2020-01-06", "09:00", 30, "confirmed"),
+        ("a2", "2020-01-06", "09:30", 30, "cancelled"),
+        ("a3", "2031-03-04", "10:00", 45, "pending"),
+    ])
+    conn.commit()
+    conn.close()
+    db.close_all_conns()
+    db.DB_PATH = path
+    return db
+
+
+def _schema(db):
+    return sorted(tuple(r) for r in db.get_conn().execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"))
+
+
+def test_baseline_database_upgrades_in_place(baseline):
+    db = baseline
+    assert db.schema_version() == 0
+    assert db.migrate() == [version for version, _, _ in db.MIGRATIONS]
+    assert db.schema_version() == db.MIGRATIONS[-1][0] and db.pending_migrations() == []
+
+    conn = db.get_conn()
+    names = {r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(db.INDEXES) | set(db.ARCHIVE_INDEXES) | set(db.MINUTE_INDEXES) <= names
+    assert not names & set(db.OBSOLETE_INDEXES)
+
+    assert [r["id"] for r in db.get_all_appointments()] == ["a1", "a2", "a3"]
+    assert conn.execute("SELECT COUNT(*) FROM appointments WHERE start_min IS NULL").fetchone()[0] == 0
+    stats = {r["date"]: (r["booked_minutes"], r["confirmed"], r["cancelled"])
+             for r in db.get_daily_stats("2000-01-01", "2099-12-31", "d1")}
+    assert stats == {"2020-01-06": (30, 1, 1), "2031-03-04": (45, 0, 0)}
+    if db.FTS_ENABLED:
+        assert [r["id"] for r in db.search_doctors("cardio")] == ["d1"]
+
+    photo = db.get_user_by_id("d1")["photo_path"]
+    assert photos.is_stored(photo) and photos.photo_bytes(photo, thumbnail=False) == b"not really a png"
+    assert db.query_plan_scans() == []
+
+
+def test_migrating_twice_changes_nothing(baseline):
+    db = baseline
+    db.migrate()
+    schema = _schema(db)
+    versions = db.get_conn().execute("SELECT * FROM schema_version ORDER BY version").fetchall()
+    stats = db.get_daily_stats("2000-01-01", "2099-12-31")
+
+    assert db.migrate() == []
+    assert _schema(db) == schema
+    assert db.get_conn().execute("SELECT * FROM schema_version ORDER BY version").fetchall() == versions
+    assert db.get_daily_stats("2000-01-01", "2099-12-31") == stats
+
+
+def test_every_step_can_run_again(baseline):
+    # Steps are idempotent, so a database whose schema_version was lost, or
+    # one a step already half-upgraded, can rerun them.
+    db = baseline
+    db.migrate()
+    schema = _schema(db)
+    stats = db.get_daily_stats("2000-01-01", "2099-12-31")
+    conn = db.get_conn()
+    with conn:
+        conn.execute("DELETE FROM schema_version")
+    assert db.migrate() == [version for version, _, _ in db.MIGRATIONS]
+    assert _schema(db) == schema
+    assert db.get_daily_stats("2000-01-01", "2099-12-31") == stats
+    if db.FTS_ENABLED:
+        assert [r["id"] for r in db.search_doctors("ana")] == ["d1"]  # indexed once, not twice
+
+
+def test_target_stops_at_a_version(baseline):
+    db = baseline
+    assert db.migrate(target=3) == [1, 2, 3]
+    assert [v for v, _ in db.pending_migrations()] == [v for v, _, _ in db.MIGRATIONS[3:]]
+    assert db.migrate(target=3) == []
+    assert db.migrate()[0] == 4
@@ -0,0 +1,83 @@
+# test_pagination.py
+import pytest
+
+STATUSES = ("pending", "confirmed", "cancelled")
+
+
+def _all_pages(page, limit, **filters):
+    rows, after, pages = [], None, 0
+    while True:
+        chunk, after = page(after, limit, **filters)
+        assert len(chunk) <= limit
+        rows += chunk
+        pages += 1
+        if after is None:
+            return rows, pages
+        assert chunk, "a page with a cursor after it must not be empty"
+
+
+@pytest.fixture
+def clinic(db):
+    # Every user shares a name with others of the same role, and many
+    # appointments share a (date, time), so pages break inside ties.
+    for n in range(7):
+        db.add_user(f"doc-{n}", "Dr. Same", f"doc{n}@example.com", "x", "doctor", "Cardiology", 5)
+        db.add_user(f"pat-{n}", "Pat Same" if n % 2 else "Pat Other", f"pat{n}@example.com", "x", "patient")
+    db.add_user("adm-0", "Admin", "admin@example.com", "x", "admin")
+    for n in range(40):
+        day = f"2031-03-{4 + n % 3:02d}"
+        db.create_appointment(f"a-{n:02d}", f"doc-{n % 7}", f"pat-{n % 5}", day, "09:00" if n % 4 else "10:00",
+                              30, STATUSES[n % 3])
+    return db
+
+
+@pytest.mark.parametrize("limit", [1, 3, 7, 50])
+@pytest.mark.parametrize("filters", [{}, {"role": "doctor"}, {"role": "patient"}, {"search": "same"},
+                                     {"role": "patient", "search": "pat1"}])
+def test_user_pages_cover_every_row_once(clinic, limit, filters):
+    rows, _ = _all_pages(clinic.get_users_page, limit, **filters)
+    keys = [(r["role"], r["name"], r["id"]) for r in rows]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+
+    role, search = filters.get("role"), (filters.get("search") or "").lower()
+    expected = [u for u in clinic.get_all_users()
+                if (not role or u["role"] == role)
+                and (search in u["name"].lower() or search in u["email"].lower())]
+    assert sorted(r["id"] for r in rows) == sorted(u["id"] for u in expected)
+
+
+@pytest.mark.parametrize("page_name", ["get_appointments_page", "get_appointment_details_page"])
+@pytest.mark.parametrize("limit", [1, 4, 9, 100])
+@pytest.mark.parametrize("filters", [{}, {"statuses": ["pending"]}, {"statuses": ["confirmed", "cancelled"]},
+                                     {"statuses": list(STATUSES)},
+                                     {"start_date": "2031-03-05", "end_date": "2031-03-05"},
+                                     {"start_date": "2031-03-05", "statuses": ["cancelled", "pending"]}])
+def test_appointment_pages_cover_every_row_once(clinic, page_name, limit, filters):
+    rows, pages = _all_pages(getattr(clinic, page_name), limit, **filters)
+    keys = [(r["date"], r["time"], r["id"]) for r in rows]
+    assert keys == sorted(keys) and len(set(keys)) == len(keys)
+
+    statuses = filters.get("statuses") or STATUSES
+    expected = [a for a in clinic.get_all_appointments()
+                if a["status"] in statuses
+                and filters.get("start_date", "") <= a["date"] <= filters.get("end_date", "9999")]
+    assert sorted(r["id"] for r in rows) == sorted(a["id"] for a in expected)
+    assert pages == max(1, -(-len(expected) // limit))
+
+
+def test_exact_multiple_of_the_page_size_has_no_empty_last_page(clinic):
+    rows, after = clinic.get_appointments_page(limit=40)
+    assert len(rows) == 40 and after is None
+    rows, after = clinic.get_appointments_page(limit=20)
+    assert len(rows) == 20 and after is not None
+    rows, after = clinic.get_appointments_page(after, limit=20)
+    assert len(rows) == 20 and after is None
+
+
+def test_rows_inserted_before_the_cursor_do_not_shift_later_pages(clinic):
+    first, after = clinic.get_appointments_page(limit=10)
+    clinic.create_appointment("a-early", "doc-0", "pat-0", "2031-03-01", "09:00", 30)
+    second, _ = clinic.get_appointments_page(after, limit=10)
+    everything, _ = _all_pages(clinic.get_appointments_page, 100)
+    ids = [r["id"] for r in everything if r["id"] != "a-early"]
+    assert [r["id"] for r in first + second] == ids[:20]
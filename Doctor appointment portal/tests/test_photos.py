@@ -0,0 +1,13 @@
+# test_photos.py
+import photos
+
+
+def test_originals_are_served_uncached(tmp_path, monkeypatch):
+    monkeypatch.setattr(photos, "PHOTO_DIR", str(tmp_path))
+    photos._read_thumbnail.cache_clear()
+    data = b"not really an image" * 1000  # no thumbnail, with or without Pillow
+    path = photos.store_photo(data, "avatar.png")
+    assert photos.photo_bytes(path) == data
+    assert photos.photo_bytes(path, thumbnail=False) == data
+    assert photos._read_thumbnail.cache_info().currsize == 0
+    assert photos.store_photo(data, "again.png") == path  # identical upload, same file
@@ -0,0 +1,38 @@
+# test_query_plans.py
+from synthetic_data import generate_dataset
+
+
+def _assert_pages_seek(db):
+    # Every keyset page, first or later, filtered or not, starts from an index
+    # SEARCH and reads rows in index order: no walk from the start of an index.
+    plans = db.query_plans(db._page_queries_probe)
+    assert plans
+    for sql, details in plans:
+        reads = [d for d in details if d.startswith(("SCAN", "SEARCH"))]
+        assert reads and all(d.startswith("SEARCH") for d in reads), (sql, details)
+        assert not any("TEMP B-TREE" in d for d in details), (sql, details)
+
+
+def test_fresh_database_has_no_full_scans(db):
+    assert db.query_plan_scans() == []
+    _assert_pages_seek(db)
+
+
+def test_populated_database_has_no_full_scans(db, tmp_path):
+    # With statistics from real rows the planner may pick differently than on
+    # empty tables; every hot query must still use an index.
+    path = str(tmp_path / "populated.db")
+    generate_dataset(path, doctors=20, patients=200, appointments=3000, seed=1)
+    db.close_all_conns()
+    db.DB_PATH = path
+    db.migrate()
+    db.get_conn().execute("ANALYZE")
+    assert db.query_plan_scans() == []
+    _assert_pages_seek(db)
+
+
+def test_unmarked_index_walk_is_reported(db):
+    conn = db.get_conn()
+    walk = "SELECT * FROM appointments ORDER BY date, time, id"
+    assert db.query_plan_scans(lambda: conn.execute(walk).fetchall()) != []
+    assert db.query_plan_scans(lambda: conn.execute(walk.replace("*", db.FULL_SCAN_OK + " *")).fetchall()) == []
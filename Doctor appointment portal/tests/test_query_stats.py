@@ -0,0 +1,39 @@
+# test_query_stats.py
+import sqlite3
+
+import pytest
+
+import query_stats
+
+
+@pytest.fixture
+def conn():
+    query_stats.reset()
+    threshold = query_stats.SLOW_QUERY_MS
+    conn = sqlite3.connect(":memory:", factory=query_stats.InstrumentedConnection)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(50)])
+    yield conn
+    conn.close()
+    query_stats.set_slow_threshold(threshold)
+    query_stats.reset()
+
+
+def _statement(sql):
+    return next(s for s in query_stats.snapshot()["statements"] if s["name"] == sql)
+
+
+def test_iterated_cursor_records_its_rows(conn):
+    assert sum(1 for _ in conn.execute("SELECT x FROM t")) == 50
+    stats = _statement("SELECT x FROM t")
+    assert stats["calls"] == 1 and stats["rows"] == 50
+
+
+def test_abandoned_cursor_is_recorded_without_a_plan(conn):
+    query_stats.set_slow_threshold(0)
+    cur = conn.execute("SELECT x FROM t WHERE x < 10")
+    next(cur)
+    del cur
+    assert _statement("SELECT x FROM t WHERE x < 10")["rows"] == 1
+    slow = [s for s in query_stats.snapshot()["slow_queries"] if s["sql"] == "SELECT x FROM t WHERE x < 10"]
+    assert slow and slow[0]["plan"] == []
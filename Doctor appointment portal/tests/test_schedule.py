@@ -0,0 +1,107 @@
+# test_schedule.py
+import pytest
+
+from utils import minute_mask, time_str_to_minutes
+
+DAY = "2031-03-04"  # a Tuesday
+
+
+@pytest.fixture
+def clinic(db):
+    for doctor in ("doc-a", "doc-b"):
+        db.add_user(doctor, doctor, f"{doctor}@example.com", "x", "doctor", "Cardiology", 5)
+        db.set_weekly_availability(doctor, 1, "09:00", "12:00", 30)
+    for n in range(1, 4):
+        db.add_user(f"pat-{n}", f"Patient {n}", f"pat{n}@example.com", "x", "patient")
+
+
+def _pending(db, app_id, doctor, patient, time, duration=30):
+    db.create_appointment(app_id, doctor, patient, DAY, time, duration, "pending")
+    return app_id
+
+
+def _placed(report):
+    return {p["key"]: p for p in report.placed}
+
+
+def _assert_no_overlaps(db):
+    rows = db.get_conn().execute(
+        "SELECT doctor_id, patient_id, start_min, end_min FROM appointments WHERE status != 'cancelled'").fetchall()
+    for who in ("doctor_id", "patient_id"):
+        taken = {}
+        for r in rows:
+            want = minute_mask(r["start_min"] % 1440, r["end_min"] - r["start_min"])
+            assert not taken.get(r[who], 0) & want, f"{who} {r[who]} double-booked"
+            taken[r[who]] = taken.get(r[who], 0) | want
+
+
+def test_requests_and_moves_land_inside_doctor_hours(db, clinic):
+    late = _pending(db, "late", "doc-a", "pat-1", "20:00")
+    report = db.auto_schedule([db.ScheduleRequest("pat-2", "cardiology", DAY, duration=45)],
+                              pending_ids=[late], same_doctor=True)
+    placed = _placed(report)
+    assert placed["late"]["doctor_id"] == "doc-a" and placed["late"]["moved"]
+    for key, duration in (("late", 30), (0, 45)):
+        start = time_str_to_minutes(placed[key]["time"])
+        assert 9 * 60 <= start and start + duration <= 12 * 60
+    assert report.unplaced == []
+    _assert_no_overlaps(db)
+
+
+def test_same_doctor_never_switches_doctor(db, clinic):
+    for time in ("09:00", "09:30", "10:00", "10:30", "11:00", "11:30"):  # doc-a's day is full
+        assert db.book_appointment("doc-a", "pat-3", DAY, time, 30, "confirmed")
+    clash = _pending(db, "clash", "doc-a", "pat-1", "10:00")
+    kept = db.auto_schedule(pending_ids=[clash], same_doctor=True)
+    assert kept.placed == [] and kept.unplaced == [("clash", "no free slot")]
+    moved = db.auto_schedule(pending_ids=[clash])
+    assert _placed(moved)["clash"]["doctor_id"] == "doc-b"
+    _assert_no_overlaps(db)
+
+
+def test_pending_rows_that_clash_with_each_other(db, clinic):
+    first = _pending(db, "first", "doc-a", "pat-1", "10:00")
+    second = _pending(db, "second", "doc-a", "pat-2", "10:15")
+    report = db.auto_schedule(pending_ids=[first, second], same_doctor=True)
+    placed = _placed(report)
+    assert placed["first"]["time"] == "10:00" and not placed["first"]["moved"]
+    assert placed["second"]["time"] in ("09:30", "10:30") and placed["second"]["moved"]
+    _assert_no_overlaps(db)
+
+
+def test_patient_is_never_booked_twice_at_once(db, clinic):
+    assert db.book_appointment("doc-b", "pat-1", DAY, "10:00", 30, "confirmed")
+    mine = _pending(db, "mine", "doc-a", "pat-1", "10:00")
+    kept = db.auto_schedule(pending_ids=[mine], same_doctor=True, keep_times=True)
+    assert kept.unplaced == [("mine", "clashes where booked")]
+    report = db.auto_schedule([db.ScheduleRequest("pat-1", "cardiology", DAY, window_start="10:00",
+                                                  window_end="10:30")], pending_ids=[mine], same_doctor=True)
+    placed = _placed(report)
+    assert placed["mine"]["time"] in ("09:30", "10:30")
+    assert report.unplaced == [(0, "no free slot")]  # 10:00-10:30 is the patient's own booking
+    _assert_no_overlaps(db)
+
+
+def test_keep_times_confirms_in_place_only(db, clinic):
+    ok = _pending(db, "ok", "doc-a", "pat-1", "09:00")
+    late = _pending(db, "late", "doc-a", "pat-2", "20:00")
+    report = db.auto_schedule(pending_ids=[ok, late], same_doctor=True, keep_times=True)
+    assert [(p["key"], p["time"], p["moved"]) for p in report.placed] == [("ok", "09:00", False)]
+    assert report.unplaced == [("late", "clashes where booked")]
+    status = db.get_conn().execute("SELECT status, time FROM appointments WHERE id = 'late'").fetchone()
+    assert tuple(status) == ("pending", "20:00")
+
+
+def test_unplaced_reasons(db, clinic):
+    done = _pending(db, "done", "doc-a", "pat-1", "09:00")
+    db.update_appointment_status(done, "confirmed")
+    report = db.auto_schedule(
+        [db.ScheduleRequest("pat-1", "dermatology", DAY),
+         db.ScheduleRequest("pat-1", "cardiology", "not a date"),
+         db.ScheduleRequest("pat-1", "cardiology", DAY, duration=0)],
+        pending_ids=["missing", done])
+    reasons = dict(report.unplaced)
+    assert reasons["missing"] == "not found" and reasons["done"] == "not pending"
+    assert reasons[0] == "no doctor with that specialization"
+    assert reasons[1].startswith("invalid") and reasons[2].startswith("invalid")
+    assert report.placed == []
@@ -0,0 +1,57 @@
+# test_slot_search.py
+import pytest
+
+pytest.importorskip("numpy")
+
+import slot_search  # noqa: E402
+from slot_search import find_earliest_slots  # noqa: E402
+
+MONDAY, TUESDAY = "2031-03-03", "2031-03-04"
+
+
+@pytest.fixture
+def doctors(db):
+    db.add_user("doc-a", "Dr. A", "a@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("doc-b", "Dr. B", "b@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("doc-c", "Dr. C", "c@example.com", "x", "doctor", "Cardiology", 5)
+    db.add_user("pat-1", "Pat One", "pat1@example.com", "x", "patient")
+    for weekday in (0, 1):
+        db.set_weekly_availability("doc-a", weekday, "09:15", "17:00", 30)
+        db.set_weekly_availability("doc-b", weekday, "07:00", "12:00", 20)
+    db.set_availability_exception("doc-b", TUESDAY, "18:10", "20:00", 25)
+    assert db.book_appointment("doc-a", "pat-1", MONDAY, "09:15", 30)
+    assert db.book_appointment("doc-b", "pat-1", MONDAY, "07:00", 45)
+    return ["doc-a", "doc-b", "doc-c"]
+
+
+def _found(duration):
+    slots = find_earliest_slots(MONDAY, TUESDAY, duration, per_doctor=None, limit=10000)
+    found = {}
+    for s in slots:
+        found.setdefault((s["doctor_id"], s["date"]), []).append(s["time"])
+    return found
+
+
+@pytest.mark.parametrize("duration", [15, 30, 45])
+def test_scheduled_doctors_match_available_slots(db, doctors, duration):
+    found = _found(duration)
+    for doctor_id in ("doc-a", "doc-b"):
+        for day in (MONDAY, TUESDAY):
+            assert found.get((doctor_id, day), []) == db.available_slots(doctor_id, day, duration)
+
+
+def test_own_hours_are_searched_outside_the_default_window(db, doctors):
+    found = _found(30)
+    assert found[("doc-a", TUESDAY)][0] == "09:15"
+    assert found[("doc-b", MONDAY)][0] == "08:00"
+    assert found[("doc-b", TUESDAY)] == ["18:10", "18:35", "19:00", "19:25"]
+    assert found[("doc-c", MONDAY)][0] == "09:00" and found[("doc-c", MONDAY)][-1] == "16:30"
+
+
+@pytest.mark.parametrize("block_rows", [1, 2, 5])
+@pytest.mark.parametrize("per_doctor, limit", [(None, 10000), (1, 10), (2, 3), (None, 7)])
+def test_blocks_of_any_size_give_the_same_slots(db, doctors, monkeypatch, block_rows, per_doctor, limit):
+    # Blocks split the days, and the doctors of a day when one day is too many rows.
+    whole = find_earliest_slots(MONDAY, TUESDAY, 30, per_doctor=per_doctor, limit=limit)
+    monkeypatch.setattr(slot_search, "SLOT_SEARCH_BLOCK_ROWS", block_rows)
+    assert find_earliest_slots(MONDAY, TUESDAY, 30, per_doctor=per_doctor, limit=limit) == whole
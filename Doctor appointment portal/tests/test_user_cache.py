@@ -0,0 +1,114 @@
+# test_user_cache.py
+import pytest
+
+
+def _misses(db):
+    return db.user_cache_stats()["misses"]
+
+
+@pytest.fixture
+def doctor(db):
+    db.add_user("d1", "Ana Cardoso", "ana@example.com", "x", "doctor", "Cardiology")
+    return db
+
+
+def test_repeated_reads_are_served_from_the_cache(doctor):
+    db = doctor
+    reads = (lambda: db.get_user_by_id("d1"), lambda: db.get_user_by_email("ana@example.com"),
+             db.get_all_doctors, lambda: db.search_doctors("card"))
+    first = [read() for read in reads]
+    misses = _misses(db)
+    assert [read() for read in reads] == first
+    assert _misses(db) == misses
+    assert db.user_cache_stats()["hits"] >= len(reads)
+
+
+def test_add_user_invalidates_every_cached_read(doctor):
+    db = doctor
+    assert db.get_user_by_id("d2") is None
+    assert db.get_user_by_email("bo@example.com") is None
+    assert [r["id"] for r in db.get_all_doctors()] == ["d1"]
+    assert [r["id"] for r in db.search_doctors("card")] == ["d1"]
+    generation = db.user_cache_stats()["generation"]
+
+    db.add_user("d2", "Bo Carter", "bo@example.com", "x", "doctor", "Cardiology")
+
+    assert db.user_cache_stats()["generation"] > generation
+    assert db.get_user_by_id("d2")["name"] == "Bo Carter"
+    assert db.get_user_by_email("bo@example.com")["id"] == "d2"
+    assert sorted(r["id"] for r in db.get_all_doctors()) == ["d1", "d2"]
+    assert sorted(r["id"] for r in db.search_doctors("card")) == ["d1", "d2"]
+
+
+def test_transaction_invalidates_on_commit_and_caches_nothing_it_read(doctor):
+    db = doctor
+    assert db.get_user_by_id("d2") is None  # cached as absent
+    with db.transaction():
+        db.add_user("d2", "Bo Carter", "bo@example.com", "x", "doctor")
+        assert db.get_user_by_id("d2")["id"] == "d2"  # the unit sees its own row
+    assert db.get_user_by_id("d2")["id"] == "d2"
+
+
+def test_rolled_back_user_is_not_left_in_the_cache(doctor):
+    db = doctor
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.add_user("d2", "Bo Carter", "bo@example.com", "x", "doctor")
+            assert db.get_user_by_email("bo@example.com") is not None
+            raise RuntimeError("abort")
+    assert db.get_user_by_id("d2") is None
+    assert db.get_user_by_email("bo@example.com") is None
+    assert [r["id"] for r in db.get_all_doctors()] == ["d1"]
+
+
+def test_grouped_add_user_invalidates_after_the_group_commits(doctor):
+    db = doctor
+    assert [r["id"] for r in db.get_all_doctors()] == ["d1"]
+    db.start_group_commit()
+    db.add_user("d2", "Bo Carter", "bo@example.com", "x", "doctor")
+    assert sorted(r["id"] for r in db.get_all_doctors()) == ["d1", "d2"]
+
+
+def test_load_racing_a_write_is_not_cached(doctor):
+    db = doctor
+
+    def load():
+        db.invalidate_user_cache()  # a write commits while the read is in flight
+        return "stale"
+
+    assert db._cached_user_read(("probe",), load) == "stale"
+    assert db._cached_user_read(("probe",), lambda: "fresh") == "fresh"
+
+
+def test_entries_expire_after_the_ttl(doctor, monkeypatch):
+    db = doctor
+    monkeypatch.setattr(db, "USER_CACHE_TTL_SECONDS", 0.0)
+    db.get_user_by_id("d1")
+    misses = _misses(db)
+    db.get_user_by_id("d1")
+    assert _misses(db) == misses + 1
+
+
+def test_cache_is_bounded_and_keyed_by_database(doctor, tmp_path, monkeypatch):
+    db = doctor
+    monkeypatch.setattr(db, "USER_CACHE_MAX_ENTRIES", 3)
+    for n in range(10):
+        db.get_user_by_id(f"missing-{n}")
+    assert db.user_cache_stats()["entries"] == 3
+
+    first, other = db.DB_PATH, str(tmp_path / "other.db")
+    db.close_all_conns()
+    db.DB_PATH = other
+    db.migrate()
+    db.close_all_conns()
+    db.DB_PATH = first
+    assert db.get_user_by_id("d1") is not None
+    db.close_all_conns()
+    db.DB_PATH = other
+    assert db.get_user_by_id("d1") is None
+
+
+def test_callers_cannot_change_cached_lists(doctor):
+    db = doctor
+    db.get_all_doctors().clear()
+    assert [r["id"] for r in db.get_all_doctors()] == ["d1"]
@@ -1,6 +1,8 @@
 # utils.py
-from datetime import time
-from typing import List
+from bisect import bisect_left
+from datetime import date
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 
 def minutes_to_time_str(minutes: int) -> str:
@@ -32,26 +34,191 @@ def overlaps(existing_start_min: int, existing_duration: int, new_start_min: int
     return not (new_end <= existing_start_min or new_start_min >= existing_end)
 
 
+def time_str_to_minutes(time_str: str) -> int:
+    h, m = map(int, time_str.split(":"))
+    return h * 60 + m
+
+
+MINUTES_PER_DAY = 24 * 60
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def epoch_day(date_str: str) -> int:
+    """Days from 1970-01-01 to a 'YYYY-MM-DD' date."""
+    return date.fromisoformat(date_str).toordinal() - EPOCH_ORDINAL
+
+
+def epoch_day_to_date(day: int) -> str:
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+
+def epoch_minute(date_str: str, time_str: str) -> int:
+    """Minutes from 1970-01-01 00:00 to date_str time_str; matches appointments.start_min."""
+    return epoch_day(date_str) * MINUTES_PER_DAY + time_str_to_minutes(time_str)
+
+
+def minute_mask(start: int, duration: int) -> int:
+    """Bitmap with one bit per minute of [start, start + duration) set (bit 0 = 00:00)."""
+    return ((1 << duration) - 1) << start
+
+
+def fit_starts(free: int, duration: int) -> int:
+    """Bitmap of the minutes s at which [s, s + duration) lies wholly inside `free`."""
+    fits, span = free, 1
+    while span < duration:  # doubling: fits covers `span` minutes, grow it by up to span
+        step = min(span, duration - span)
+        fits &= fits >> step
+        span += step
+    return fits
+
+
+@lru_cache(maxsize=256)
+def grid_mask(start: int, end: int, step: int) -> int:
+    """Bitmap with bits start, start + step, ... below end set."""
+    mask = 0
+    for minute in range(start, end, max(step, 1)):
+        mask |= 1 << minute
+    return mask
+
+
+def _row_interval(row, position: int):
+    # Accept mapping-style rows (records, dicts) as well as plain tuples in table
+    # column order: (id, doctor_id, patient_id, date, time, duration, status, notes[, start_min, end_min]).
+    # Returns (id, start minute of day, duration, status); rows that carry
+    # start_min need no string parsing.
+    if hasattr(row, "keys"):
+        start_min = row.get("start_min")
+        start = start_min % MINUTES_PER_DAY if start_min is not None else time_str_to_minutes(row["time"])
+        return row.get("id", str(position)), start, int(row["duration"]), row["status"]
+    start = row[8] % MINUTES_PER_DAY if len(row) > 8 and row[8] is not None else time_str_to_minutes(row[4])
+    return row[0], start, int(row[5]), row[6]
+
+
+class DayIntervals:
+    """
+    Non-cancelled appointments of one doctor on one day as integer-minute
+    intervals, kept sorted by start so conflict checks are a bisect plus a
+    look at the few neighbours that can reach the probe. A minute bitmap of the
+    busy time is maintained alongside for constant-time slot tests.
+    """
+    __slots__ = ("_keys", "_ends", "_by_id", "_max_duration", "_busy")
+
+    def __init__(self):
+        self._keys: List[Tuple[int, str]] = []  # (start, id), sorted
+        self._ends: List[int] = []  # end minute, aligned with _keys
+        self._by_id: Dict[str, int] = {}  # id -> start
+        self._max_duration = 0  # high-water mark; bounds how far back to look
+        self._busy = 0  # bit per minute covered by any interval
+
+    @classmethod
+    def from_minutes(cls, rows) -> "DayIntervals":
+        """From (id, start minute of day, duration) tuples of non-cancelled appointments."""
+        day = cls()
+        for app_id, start, duration in rows:
+            day.add(app_id, start, duration)
+        return day
+
+    @classmethod
+    def from_rows(cls, rows) -> "DayIntervals":
+        day = cls()
+        for i, row in enumerate(rows):
+            app_id, start, duration, status = _row_interval(row, i)
+            if status != 'cancelled':
+                day.add(app_id, start, duration)
+        return day
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, app_id: str) -> bool:
+        return app_id in self._by_id
+
+    def copy(self) -> "DayIntervals":
+        day = DayIntervals()
+        day._keys, day._ends, day._by_id = list(self._keys), list(self._ends), dict(self._by_id)
+        day._max_duration, day._busy = self._max_duration, self._busy
+        return day
+
+    def add(self, app_id: str, start: int, duration: int) -> None:
+        if app_id in self._by_id:
+            self.remove(app_id)
+        i = bisect_left(self._keys, (start, app_id))
+        self._keys.insert(i, (start, app_id))
+        self._ends.insert(i, start + duration)
+        self._by_id[app_id] = start
+        self._max_duration = max(self._max_duration, duration)
+        self._busy |= minute_mask(start, duration)
+
+    def remove(self, app_id: str) -> bool:
+        start = self._by_id.pop(app_id, None)
+        if start is None:
+            return False
+        i = bisect_left(self._keys, (start, app_id))
+        del self._keys[i]
+        del self._ends[i]
+        # Intervals may overlap, so clearing bits needs the remaining intervals.
+        self._busy = 0
+        for (s, _), e in zip(self._keys, self._ends):
+            self._busy |= minute_mask(s, e - s)
+        return True
+
+    @property
+    def busy_mask(self) -> int:
+        return self._busy
+
+    def conflicts(self, start: int, duration: int) -> List[str]:
+        """Ids of appointments overlapping [start, start + duration)."""
+        end = start + duration
+        # Only intervals starting in (start - max_duration, end) can overlap.
+        lo = bisect_left(self._keys, (start - self._max_duration + 1, ""))
+        hi = bisect_left(self._keys, (end, ""))
+        return [self._keys[j][1] for j in range(lo, hi) if self._ends[j] > start]
+
+    def is_free(self, start: int, duration: int) -> bool:
+        return not self._busy & minute_mask(start, duration)
+
+    def nearest_free(self, wanted: int, duration: int, lo: int = 0, hi: int = 24 * 60) -> Optional[int]:
+        """Closest start to `wanted` in [lo, hi - duration] that is free, or None."""
+        last = hi - duration
+        # The optimum is the wanted time itself, a window edge, or flush against a busy block.
+        candidates = {wanted, lo, last}
+        for (start, _), end in zip(self._keys, self._ends):
+            candidates.add(start - duration)
+            candidates.add(end)
+        best = None
+        for c in sorted(candidates, key=lambda c: (abs(c - wanted), c)):
+            if lo <= c <= last and self.is_free(c, duration):
+                best = c
+                break
+        return best
+
+
 def can_book(doctor_appointments, new_time_str: str, new_duration: int) -> bool:
     """
-    doctor_appointments: iterable of rows where columns include 'time','duration','status'.
+    doctor_appointments: a DayIntervals, or an iterable of rows where columns
+    include 'time','duration','status'.
     new_time_str: 'HH:MM'
     """
-    nh, nm = map(int, new_time_str.split(":"))
-    new_start = nh * 60 + nm
-    for row in doctor_appointments:
-        # row could be a sqlite3.Row -> mapping access or tuple -> index access; we assume mapping first
-        try:
-            ex_time = row["time"]
-            ex_dur = int(row["duration"])
-            ex_status = row["status"]
-        except Exception:
-            # fallback for tuple-like row: columns are (id, doctor_id, patient_id, date, time, duration, status, notes)
-            ex_time = row[4]
-            ex_dur = int(row[5])
-            ex_status = row[6]
-        ex_h, ex_m = map(int, ex_time.split(":"))
-        ex_start = ex_h * 60 + ex_m
+    new_start = time_str_to_minutes(new_time_str)
+    if isinstance(doctor_appointments, DayIntervals):
+        return doctor_appointments.is_free(new_start, new_duration)
+    for i, row in enumerate(doctor_appointments):
+        _, ex_start, ex_dur, ex_status = _row_interval(row, i)
         if ex_status != 'cancelled' and overlaps(ex_start, ex_dur, new_start, new_duration):
             return False
     return True
+
+
+def nearest_free_slot(doctor_appointments, new_time_str: str, new_duration: int,
+                      day_start: str = "00:00", day_end: str = "24:00") -> Optional[str]:
+    """
+    Closest start time to new_time_str (either direction) at which a new_duration
+    appointment fits between day_start and day_end without overlapping any
+    non-cancelled appointment. Returns 'HH:MM' or None if the day is full.
+    """
+    day = doctor_appointments
+    if not isinstance(day, DayIntervals):
+        day = DayIntervals.from_rows(doctor_appointments)
+    best = day.nearest_free(time_str_to_minutes(new_time_str), new_duration,
+                            time_str_to_minutes(day_start), time_str_to_minutes(day_end))
+    return minutes_to_time_str(best) if best is not None else None